@@ -1,11 +1,179 @@
-from django.contrib import admin
-from .models import Field, Subfield, User, Problem, Project, Post, CollaborationRequest
+import json
+
+from django import forms
+from django.contrib import admin, messages
+from django.http import Http404, HttpResponse
+from django.shortcuts import get_object_or_404, redirect, render
+from django.urls import path
+
+from .imports import ImportFileError, detect_format, open_text, run_import
+from .models import (
+    Field, Subfield, User, Problem, Project, Post, CollaborationRequest, Task,
+    ArchivedCollaborationRequest, SubfieldRollup, InstitutionRollup, ProfileCapture,
+)
+from .tasks import enqueue
+
+
+class ImportForm(forms.Form):
+    file = forms.FileField(help_text='.csv or .jsonl, optionally gzipped')
+    dry_run = forms.BooleanField(required=False, help_text='Validate only, write nothing')
+
+
+class ImportAdmin(admin.ModelAdmin):
+    """Adds an "Import" button that bulk-upserts an uploaded file (core/imports.py)"""
+    change_list_template = 'admin/core/import_change_list.html'
+    import_kind = None
+
+    def get_urls(self):
+        info = self.model._meta.app_label, self.model._meta.model_name
+        return [
+            path('import/', self.admin_site.admin_view(self.import_view), name='%s_%s_import' % info),
+        ] + super().get_urls()
+
+    def import_view(self, request):
+        if not self.has_add_permission(request) or not self.has_change_permission(request):
+            return redirect('admin:index')
+        form = ImportForm(request.POST or None, request.FILES or None)
+        report = None
+        if request.method == 'POST' and form.is_valid():
+            upload = form.cleaned_data['file']
+            try:
+                report = run_import(
+                    self.import_kind,
+                    open_text(upload.file, upload.name),
+                    detect_format(upload.name),
+                    dry_run=form.cleaned_data['dry_run'],
+                )
+            except ImportFileError as error:
+                messages.error(request, str(error))
+            else:
+                messages.success(request, report.summary())
+        context = {
+            **self.admin_site.each_context(request),
+            'opts': self.model._meta,
+            'title': f'Import {self.model._meta.verbose_name_plural}',
+            'form': form,
+            'report': report,
+        }
+        return render(request, 'admin/core/import_form.html', context)
+
+
+@admin.action(description='Delete selected %(verbose_name_plural)s in the background')
+def purge_in_background(modeladmin, request, queryset):
+    """Queue a batched purge (core/deletion.py) instead of collecting every related row here"""
+    ids = list(queryset.values_list('id', flat=True))
+    enqueue('purge_objects', model=modeladmin.model._meta.label, ids=ids)
+    modeladmin.message_user(request, f'Queued the deletion of {len(ids)} {modeladmin.model._meta.verbose_name_plural}.')
+
+
+@admin.register(User)
+class UserAdmin(ImportAdmin):
+    import_kind = 'users'
+    search_fields = ['name', 'email']
+    actions = [purge_in_background]
+
+
+@admin.register(Problem)
+class ProblemAdmin(ImportAdmin):
+    import_kind = 'problems'
+    search_fields = ['name']
+
+
+@admin.register(Project)
+class ProjectAdmin(admin.ModelAdmin):
+    actions = [purge_in_background]
 
 
 admin.site.register(Field)
-admin.site.register(Subfield)
-admin.site.register(User)
-admin.site.register(Problem)
-admin.site.register(Project)
-admin.site.register(Post)
-admin.site.register(CollaborationRequest)
\ No newline at end of file
+admin.site.register(Task)
+admin.site.register(SubfieldRollup)
+admin.site.register(InstitutionRollup)
+
+
+# __str__ of these reads related rows: join them into the change list query
+
+@admin.register(Subfield)
+class SubfieldAdmin(admin.ModelAdmin):
+    list_select_related = ['field']
+
+
+@admin.register(Post)
+class PostAdmin(admin.ModelAdmin):
+    list_select_related = ['author']
+    actions = [purge_in_background]
+
+
+@admin.register(CollaborationRequest, ArchivedCollaborationRequest)
+class CollaborationRequestAdmin(admin.ModelAdmin):
+    list_select_related = ['sender', 'receiver']
+
+
+@admin.register(ProfileCapture)
+class ProfileCaptureAdmin(admin.ModelAdmin):
+    """Staff request profiles (core/profiling.py): read-only, with the SQL timeline and downloads"""
+    change_form_template = 'admin/core/profile_capture.html'
+    list_display = ['created_at', 'method', 'path', 'staff_user', 'mode', 'status_code', 'duration_ms', 'query_count', 'query_ms']
+    list_filter = ['mode']
+    search_fields = ['path']
+    fields = ['created_at', 'method', 'path', 'staff_user', 'mode', 'status_code', 'duration_ms', 'query_count', 'query_ms']
+    readonly_fields = fields
+
+    # kind -> (file extension, content type)
+    DOWNLOADS = {
+        'pstats': ('prof', 'application/octet-stream'),
+        'collapsed': ('collapsed', 'text/plain; charset=utf-8'),
+        'summary': ('json', 'application/json'),
+    }
+
+    def get_queryset(self, request):
+        # The profiler output is only read by the downloads
+        return super().get_queryset(request).defer('pstats', 'collapsed')
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def get_urls(self):
+        info = self.model._meta.app_label, self.model._meta.model_name
+        return [
+            path('<int:capture_id>/download/<str:kind>/', self.admin_site.admin_view(self.download_view), name='%s_%s_download' % info),
+        ] + super().get_urls()
+
+    def change_view(self, request, object_id, form_url='', extra_context=None):
+        capture = self.get_object(request, object_id)
+        if capture is not None:
+            # Each query as a bar: offset and length as a share of the request
+            total = max(capture.duration_ms, 0.001)
+            extra_context = {
+                **(extra_context or {}),
+                'timeline': [
+                    {
+                        **query,
+                        'left': round(min(query['start_ms'] / total, 1) * 100, 2),
+                        'width': round(max(min(query['duration_ms'] / total, 1) * 100, 0.2), 2),
+                    }
+                    for query in capture.summary.get('queries', [])
+                ],
+            }
+        return super().change_view(request, object_id, form_url, extra_context)
+
+    def download_view(self, request, capture_id, kind):
+        if not self.has_view_permission(request):
+            return redirect('admin:index')
+        if kind not in self.DOWNLOADS:
+            raise Http404
+        capture = get_object_or_404(ProfileCapture, id=capture_id)
+        extension, content_type = self.DOWNLOADS[kind]
+        if kind == 'pstats':
+            if capture.pstats is None:
+                raise Http404('No cProfile stats: this capture was sampled only')
+            content = bytes(capture.pstats)
+        elif kind == 'collapsed':
+            content = capture.collapsed
+        else:
+            content = json.dumps(capture.summary, indent=2)
+        response = HttpResponse(content, content_type=content_type)
+        response['Content-Disposition'] = f'attachment; filename="profile-{capture.id}.{extension}"'
+        return response
@@ -0,0 +1,437 @@
+"""
+READ-ONLY JSON API (v1)
+=======================
+Versioned JSON endpoints for posts, projects (and open projects only),
+problems, users and notifications, used by the mobile client and integrations instead of
+scraping the HTML pages. Notifications include the archived (accepted /
+rejected) requests, like the notifications page.
+
+QUERY PARAMETERS:
+- ?fields=id,content,author.name  -> sparse fieldset (dotted names follow FKs)
+- ?limit=20                       -> page size (max 100)
+- ?cursor=<opaque>                -> next page, taken from the "next" link
+
+Every request is answered with values(), so rows come back as plain dicts
+and no model instances are built. Requested FK fields (author.name,
+subfield.field, ...) become JOINs in that same query, which is what
+select_related would do for us. Many-to-many fields (project collaborators)
+are fetched with ONE extra IN query on the junction table, which is what
+prefetch_related would do. Counts (open-projects collaborator_count) are
+correlated subqueries in the SELECT list, run for the page's rows only.
+A resource with an archive table (notifications) runs the same keyset
+query on both tables and merges the two pages by the cursor ordering.
+"""
+import base64
+import heapq
+import json
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from django.http import JsonResponse
+from django.utils.dateparse import parse_datetime
+
+from .models import User, Post, Project, Problem, CollaborationRequest, ArchivedCollaborationRequest
+from .routers import replica_reads
+
+API_VERSION = 'v1'
+DEFAULT_PAGE_SIZE = 20
+MAX_PAGE_SIZE = 100
+
+
+class ApiError(Exception):
+    """Raised for bad client input; rendered as a 400 JSON response"""
+
+
+# ==============================================================================
+# RESOURCE DEFINITIONS
+# ==============================================================================
+
+class Resource:
+    """
+    Describes how one model is exposed through the API.
+
+    fields:   public name -> ORM lookup path used in values()
+    m2m:      public name -> (m2m field name, {sub field -> path on target})
+    default:  fields returned when ?fields= is not given
+    ordering: cursor ordering, newest first; the last entry must be unique
+    filters:  query parameter -> ORM lookup
+    scope:    Q every row must match (e.g. open projects only)
+    computed: public name -> expression, annotated only when requested
+    ids_first: page the ids alone (an index-only keyset query), then read
+              those rows with their JOINs and computed fields
+    archive:  model with the same columns holding older rows (core/archive.py),
+              read alongside `model`
+    """
+
+    def __init__(self, model, fields, default, ordering, m2m=None, filters=None, scope=None, computed=None,
+                 ids_first=False, archive=None):
+        self.model = model
+        self.models = [model, archive] if archive else [model]
+        self.fields = fields
+        self.m2m = m2m or {}
+        self.default = default
+        self.ordering = ordering
+        self.filters = filters or {}
+        self.scope = scope or Q()
+        self.computed = computed or {}
+        self.ids_first = ids_first
+
+    def plan(self, requested):
+        """Split requested public names into values() paths and m2m lookups"""
+        names = requested or self.default
+        paths = {}
+        m2m = {}
+        for name in names:
+            if name in self.fields:
+                paths[name] = self.fields[name]
+                continue
+            if name in self.computed:
+                paths[name] = name
+                continue
+            head, _, sub = name.partition('.')
+            if head in self.m2m:
+                relation, sub_fields = self.m2m[head]
+                sub = sub or 'id'
+                if sub not in sub_fields:
+                    raise ApiError(f'Unknown field: {name}')
+                m2m.setdefault(head, (relation, {}))[1][sub] = sub_fields[sub]
+                continue
+            raise ApiError(f'Unknown field: {name}')
+        return paths, m2m
+
+
+RESOURCES = {
+    'posts': Resource(
+        model=Post,
+        fields={
+            'id': 'id',
+            'content': 'content',
+            'created_at': 'created_at',
+            'view_count': 'view_count',
+            'interest_count': 'interest_count',
+            'author.id': 'author_id',
+            'author.name': 'author__name',
+            'author.institution': 'author__institution',
+        },
+        default=['id', 'content', 'created_at', 'author.id', 'author.name'],
+        ordering=['created_at', 'id'],
+        filters={'author': 'author_id'},
+    ),
+    'projects': Resource(
+        model=Project,
+        fields={
+            'id': 'id',
+            'title': 'title',
+            'description': 'description',
+            'vacancy_status': 'vacancy_status',
+            'created_at': 'created_at',
+            'view_count': 'view_count',
+            'interest_count': 'interest_count',
+            'owner.id': 'owner_id',
+            'owner.name': 'owner__name',
+            'field': 'field__name',
+            'subfield.id': 'subfield_id',
+            'subfield.name': 'subfield__name',
+        },
+        m2m={
+            'collaborators': ('collaborators', {'id': 'id', 'name': 'name', 'institution': 'institution'}),
+        },
+        default=['id', 'title', 'vacancy_status', 'created_at', 'owner.id', 'field', 'subfield.id'],
+        ordering=['created_at', 'id'],
+        filters={'owner': 'owner_id', 'field': 'field__name', 'subfield': 'subfield_id'},
+    ),
+    # Discovery list: projects accepting collaborators, newest first
+    'open-projects': Resource(
+        model=Project,
+        fields={
+            'id': 'id',
+            'title': 'title',
+            'description': 'description',
+            'created_at': 'created_at',
+            'view_count': 'view_count',
+            'interest_count': 'interest_count',
+            'owner.id': 'owner_id',
+            'owner.name': 'owner__name',
+            'owner.institution': 'owner__institution',
+            'field': 'field__name',
+            'subfield.id': 'subfield_id',
+            'subfield.name': 'subfield__name',
+        },
+        computed={'collaborator_count': Project.collaborator_count()},
+        default=['id', 'title', 'created_at', 'owner.id', 'owner.name', 'field', 'subfield.id',
+                 'subfield.name', 'collaborator_count'],
+        ordering=['created_at', 'id'],
+        filters={'field': 'field__name', 'subfield': 'subfield_id'},
+        scope=Project.OPEN,
+        ids_first=True,
+    ),
+    'problems': Resource(
+        model=Problem,
+        fields={
+            'id': 'id',
+            'name': 'name',
+            'description': 'description',
+            'severity': 'severity',
+            'current_work': 'current_work',
+            'done_work': 'done_work',
+            'gaps': 'gaps',
+            'subfield.id': 'subfield_id',
+            'subfield.name': 'subfield__name',
+            'subfield.field': 'subfield__field__name',
+        },
+        default=['id', 'name', 'severity', 'subfield.id'],
+        ordering=['id'],
+        filters={'subfield': 'subfield_id', 'field': 'subfield__field__name', 'severity': 'severity'},
+    ),
+    'users': Resource(
+        model=User,
+        fields={
+            'id': 'id',
+            'name': 'name',
+            'user_type': 'user_type',
+            'institution': 'institution',
+            'country': 'country',
+            'field': 'field',
+            'rating': 'rating',
+        },
+        default=['id', 'name', 'user_type', 'institution', 'country'],
+        ordering=['id'],
+        filters={'user_type': 'user_type', 'country': 'country', 'institution': 'institution'},
+    ),
+    'notifications': Resource(
+        model=CollaborationRequest,
+        fields={
+            'id': 'id',
+            'status': 'status',
+            'created_at': 'created_at',
+            'sender.id': 'sender_id',
+            'sender.name': 'sender__name',
+            'sender.institution': 'sender__institution',
+            'project.id': 'project_id',
+            'project.title': 'project__title',
+            'post.id': 'post_id',
+            'post.content': 'post__content',
+        },
+        default=['id', 'status', 'created_at', 'sender.id', 'sender.name', 'project.id', 'post.id'],
+        ordering=['created_at', 'id'],
+        filters={'status': 'status'},
+        archive=ArchivedCollaborationRequest,
+    ),
+}
+
+
+# ==============================================================================
+# CURSOR PAGINATION
+# ==============================================================================
+# The cursor is the ordering values of the last row on the page, so the next
+# page is a keyset (seek) query: WHERE (created_at, id) < (<c>, <id>).
+# Unlike OFFSET, its cost does not grow with the page number.
+
+def encode_cursor(values):
+    raw = json.dumps([v.isoformat() if hasattr(v, 'isoformat') else v for v in values])
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor, ordering):
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode()))
+    except (ValueError, TypeError):
+        raise ApiError('Invalid cursor')
+    if not isinstance(values, list) or len(values) != len(ordering):
+        raise ApiError('Invalid cursor')
+    return [cursor_value(name, value) for name, value in zip(ordering, values)]
+
+
+def cursor_value(name, value):
+    """One cursor value, checked against its ordering column: *_at a datetime, else an integer id"""
+    if name.endswith('_at'):
+        try:
+            parsed = parse_datetime(value) if isinstance(value, str) else None
+        except ValueError:
+            parsed = None
+        if parsed is None:
+            raise ApiError('Invalid cursor')
+        return parsed
+    if type(value) is not int:
+        raise ApiError('Invalid cursor')
+    return value
+
+
+def seek(queryset, ordering, values):
+    """Filter to rows strictly after the cursor in descending order"""
+    condition = Q()
+    for i, name in enumerate(ordering):
+        step = Q(**{f'{name}__lt': values[i]})
+        for prev, value in zip(ordering[:i], values[:i]):
+            step &= Q(**{prev: value})
+        condition |= step
+    return queryset.filter(condition)
+
+
+# ==============================================================================
+# QUERY EXECUTION & SERIALIZATION
+# ==============================================================================
+
+def parse_fields(request):
+    raw = request.GET.get('fields')
+    if not raw:
+        return None
+    return [name.strip() for name in raw.split(',') if name.strip()]
+
+
+def parse_limit(request):
+    try:
+        limit = int(request.GET.get('limit', DEFAULT_PAGE_SIZE))
+    except ValueError:
+        raise ApiError('limit must be an integer')
+    return max(1, min(limit, MAX_PAGE_SIZE))
+
+
+def nest(row, paths):
+    """Turn {'author.name': 'X'} style rows into {'author': {'name': 'X'}}"""
+    item = {}
+    for name, path in paths.items():
+        target = item
+        parts = name.split('.')
+        for part in parts[:-1]:
+            target = target.setdefault(part, {})
+        target[parts[-1]] = row[path]
+    return item
+
+
+def attach_m2m(resource, items, ids, m2m):
+    """Load every requested M2M relation with one query per relation"""
+    for name, (relation, sub_fields) in m2m.items():
+        through = getattr(resource.model, relation).through
+        source = resource.model._meta.model_name + '_id'
+        target = getattr(resource.model, relation).field.m2m_reverse_field_name()
+        lookups = {sub: f'{target}__{path}' for sub, path in sub_fields.items()}
+        grouped = {pk: [] for pk in ids}
+        rows = through.objects.filter(**{f'{source}__in': ids}).values(source, *lookups.values())
+        for row in rows:
+            grouped[row[source]].append({sub: row[lookup] for sub, lookup in lookups.items()})
+        for item, pk in zip(items, ids):
+            item[name] = grouped[pk]
+
+
+def base_querysets(request, name, resource):
+    """One filtered queryset per table of the resource (hot table first)"""
+    return [base_queryset(request, name, resource, model) for model in resource.models]
+
+
+def base_queryset(request, name, resource, model):
+    queryset = model.objects.filter(resource.scope)
+    if name == 'notifications':
+        queryset = queryset.filter(receiver_id=request.session.get('user_id'))
+    for param, lookup in resource.filters.items():
+        value = request.GET.get(param)
+        if value:
+            try:
+                queryset = queryset.filter(**{lookup: value})
+            except (ValueError, TypeError, ValidationError):
+                raise ApiError(f'Invalid value for {param}: {value}')
+    return queryset
+
+
+def fetch(resource, querysets, fields, limit=None):
+    """Run the planned values() query on each queryset and return (items, rows), merged in order"""
+    paths, m2m = resource.plan(fields)
+    columns = set(paths.values()) | set(resource.ordering) | {'id'}
+    ordering = [f'-{name}' for name in resource.ordering]
+    computed = {name: expr for name, expr in resource.computed.items() if name in columns}
+    pages = []
+    for queryset in querysets:
+        if resource.ids_first:
+            ids = queryset.order_by(*ordering).values_list('id', flat=True)
+            queryset = queryset.model.objects.filter(id__in=list(ids[:limit] if limit else ids))
+        queryset = queryset.annotate(**computed).order_by(*ordering).values(*columns)
+        pages.append(list(queryset[:limit] if limit else queryset))
+    rows = pages[0]
+    if len(pages) > 1:
+        # Each page is already in cursor order: take the first `limit` of both
+        key = lambda row: [row[name] for name in resource.ordering]
+        rows = list(heapq.merge(*pages, key=key, reverse=True))[:limit]
+    items = [nest(row, paths) for row in rows]
+    if m2m and rows:
+        attach_m2m(resource, items, [row['id'] for row in rows], m2m)
+    return items, rows
+
+
+def api_error(message, status=400):
+    return JsonResponse({'error': message}, status=status)
+
+
+# ==============================================================================
+# VIEWS
+# ==============================================================================
+
+@replica_reads
+def api_list_view(request, resource_name):
+    """List a resource with sparse fields and cursor pagination"""
+    # SQL (posts, ?fields=id,author.name):
+    #      SELECT post.id, post.created_at, user.name
+    #      FROM post JOIN user ON post.author_id = user.id
+    #      WHERE (post.created_at, post.id) < (<cursor>)
+    #      ORDER BY post.created_at DESC, post.id DESC
+    #      LIMIT <limit + 1>;
+    # SQL (open-projects, ids_first):
+    #      SELECT id FROM project WHERE vacancy_status IN (TRUE) AND (created_at, id) < (<cursor>)
+    #      ORDER BY created_at DESC, id DESC LIMIT <limit + 1>;
+    #      SELECT project.id, ..., (SELECT COUNT(*) FROM core_project_collaborators
+    #                               WHERE project_id = project.id) AS collaborator_count
+    #      FROM project JOIN ... WHERE project.id IN (<page ids>) ORDER BY created_at DESC, id DESC;
+    # SQL (notifications): the keyset query on collaboration_request and on
+    #      collaboration_request_archive (WHERE receiver_id = <user>), merged
+
+    if not request.session.get('user_id'):
+        return api_error('Authentication required', status=401)
+
+    resource = RESOURCES.get(resource_name)
+    if resource is None:
+        return api_error(f'Unknown resource: {resource_name}', status=404)
+
+    try:
+        limit = parse_limit(request)
+        querysets = base_querysets(request, resource_name, resource)
+        cursor = request.GET.get('cursor')
+        if cursor:
+            values = decode_cursor(cursor, resource.ordering)
+            querysets = [seek(queryset, resource.ordering, values) for queryset in querysets]
+        items, rows = fetch(resource, querysets, parse_fields(request), limit=limit + 1)
+    except ApiError as exc:
+        return api_error(str(exc))
+
+    next_url = None
+    if len(rows) > limit:
+        items = items[:limit]
+        last = rows[limit - 1]
+        query = request.GET.copy()
+        query['cursor'] = encode_cursor([last[name] for name in resource.ordering])
+        next_url = f'{request.path}?{query.urlencode()}'
+
+    return JsonResponse({'version': API_VERSION, 'data': items, 'next': next_url})
+
+
+@replica_reads
+def api_detail_view(request, resource_name, pk):
+    """Return a single object with the same sparse fieldset rules"""
+    # SQL: SELECT <requested columns> FROM <table> [JOIN ...] WHERE id = <pk>;
+    #      (notifications: the same on collaboration_request_archive)
+
+    if not request.session.get('user_id'):
+        return api_error('Authentication required', status=401)
+
+    resource = RESOURCES.get(resource_name)
+    if resource is None:
+        return api_error(f'Unknown resource: {resource_name}', status=404)
+
+    try:
+        querysets = [queryset.filter(id=pk) for queryset in base_querysets(request, resource_name, resource)]
+        items, rows = fetch(resource, querysets, parse_fields(request), limit=1)
+    except ApiError as exc:
+        return api_error(str(exc))
+
+    if not items:
+        return api_error('Not found', status=404)
+    return JsonResponse({'version': API_VERSION, 'data': items[0]})
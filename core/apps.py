@@ -3,3 +3,13 @@ from django.apps import AppConfig
 
 class CoreConfig(AppConfig):
     name = 'core'
+
+    def ready(self):
+        # Connect signal handlers (resource version bumps)
+        from . import signals  # noqa: F401
+        # Register background task handlers defined outside core/tasks.py
+        from . import archive, counters, deletion  # noqa: F401
+
+        # Lazy-load checks, active only while STRICT_LOADING is set
+        from .strict import install
+        install()
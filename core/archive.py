@@ -0,0 +1,149 @@
+"""
+COLLABORATION REQUEST ARCHIVAL
+==============================
+Accepted and rejected requests are only ever read as history, yet they sit
+next to the pending rows that feed_view and notifications_view query on
+every page load. archive_resolved() moves resolved requests older than
+COLLABORATION_ARCHIVE_AFTER_DAYS into collaboration_request_archive, so the
+hot table (and its indexes) only grows with pending work.
+
+- Works in batches of `batch_size` rows, one short transaction each:
+  INSERT INTO archive ... ; DELETE FROM collaboration_request WHERE id IN (...)
+- Resumable: rows are taken in id order and each batch commits on its own,
+  so an interrupted run just continues where it stopped.
+- A row whose id is already in the archive (ids reused after the newest
+  rows were archived) is left in the hot table and reported, never
+  deleted: only the ids a batch copied are removed.
+- history() / iter_history() read both tables, so users still see their
+  full history; already_requested() checks both before a new request.
+"""
+import logging
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+
+from .models import CollaborationRequest, ArchivedCollaborationRequest
+from .streaming import keyset_rows, merged
+from .tasks import task, enqueue
+
+logger = logging.getLogger(__name__)
+
+RESOLVED_STATUSES = ['accepted', 'rejected']
+
+ARCHIVED_COLUMNS = ['id', 'sender_id', 'receiver_id', 'project_id', 'post_id', 'status', 'created_at']
+
+
+def archive_cutoff(older_than_days=None):
+    if older_than_days is None:
+        older_than_days = getattr(settings, 'COLLABORATION_ARCHIVE_AFTER_DAYS', 90)
+    return timezone.now() - timedelta(days=older_than_days)
+
+
+def archive_batch(cutoff, batch_size, after_id=0):
+    """Move one batch of rows with id > after_id; returns (rows archived, last id read or None)"""
+    # SQL: SELECT id, sender_id, receiver_id, project_id, post_id, status, created_at
+    #      FROM collaboration_request
+    #      WHERE status IN ('accepted', 'rejected') AND created_at < <cutoff> AND id > <after_id>
+    #      ORDER BY id LIMIT <batch_size>
+    #      FOR UPDATE SKIP LOCKED;
+    # SQL: SELECT id FROM collaboration_request_archive WHERE id IN (<batch ids>);
+    # SQL: INSERT INTO collaboration_request_archive (...) VALUES (...), ...;
+    # SQL: DELETE FROM collaboration_request WHERE id IN (<copied ids>);
+    with transaction.atomic():
+        rows = list(
+            CollaborationRequest.objects.filter(
+                status__in=RESOLVED_STATUSES,
+                created_at__lt=cutoff,
+                id__gt=after_id,
+            ).order_by('id').select_for_update(skip_locked=True).values(*ARCHIVED_COLUMNS)[:batch_size]
+        )
+        if not rows:
+            return 0, None
+
+        taken = set(ArchivedCollaborationRequest.objects.filter(id__in=[row['id'] for row in rows])
+                    .values_list('id', flat=True))
+        if taken:
+            logger.warning('Not archiving requests %s: their ids are already in the archive', sorted(taken))
+        rows_to_copy = [row for row in rows if row['id'] not in taken]
+        archived_at = timezone.now()
+        ArchivedCollaborationRequest.objects.bulk_create(
+            [ArchivedCollaborationRequest(archived_at=archived_at, **row) for row in rows_to_copy]
+        )
+
+        # Plain DELETE: the rows are only moving, so nothing visible changes
+        # and the per-row delete signals (version bumps) aren't needed
+        ids = [row['id'] for row in rows_to_copy]
+        if ids:
+            placeholders = ', '.join(['%s'] * len(ids))
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    f'DELETE FROM {CollaborationRequest._meta.db_table} WHERE id IN ({placeholders})',
+                    ids,
+                )
+    return len(ids), rows[-1]['id']
+
+
+def archive_resolved(older_than_days=None, batch_size=1000, max_batches=None, pause=0.0, log=None):
+    """Archive resolved requests in batches; returns the total archived"""
+    cutoff = archive_cutoff(older_than_days)
+    total = batches = 0
+    last_id = 0
+    while max_batches is None or batches < max_batches:
+        moved, last_id = archive_batch(cutoff, batch_size, after_id=last_id)
+        if last_id is None:
+            break
+        total += moved
+        batches += 1
+        if log:
+            log(f'batch {batches}: archived {moved} requests ({total} total)')
+        if pause:
+            time.sleep(pause)
+    return total
+
+
+def iter_history(receiver_id, status, chunk_size=None):
+    """
+    Requests with the given status for a user, newest first, from the hot
+    table and the archive - read in keyset chunks and merged as they come
+    """
+    # SQL: SELECT cr.*, sender.*, project.*, post.* FROM collaboration_request cr ...
+    #      WHERE cr.receiver_id = <receiver_id> AND cr.status = <status>
+    #      ORDER BY cr.created_at DESC, cr.id DESC LIMIT <chunk_size>;   (per chunk)
+    # SQL: (Same query on collaboration_request_archive)
+    streams = [
+        keyset_rows(
+            model.objects.filter(receiver_id=receiver_id, status=status)
+            .select_related('sender', 'project', 'post'),
+            ['-created_at', '-id'],
+            chunk_size,
+        )
+        for model in (CollaborationRequest, ArchivedCollaborationRequest)
+    ]
+    return merged(*streams, key='created_at', reverse=True)
+
+
+def history(receiver_id, status):
+    """Requests with the given status for a user, from the hot table and the archive"""
+    return list(iter_history(receiver_id, status))
+
+
+def already_requested(**lookups):
+    """Whether a request matching these lookups exists, pending, resolved or archived"""
+    # SQL: SELECT 1 FROM collaboration_request WHERE <lookups> LIMIT 1;
+    # SQL: SELECT 1 FROM collaboration_request_archive WHERE <lookups> LIMIT 1;   -- if none
+    return any(
+        model.objects.filter(**lookups).exists()
+        for model in (CollaborationRequest, ArchivedCollaborationRequest)
+    )
+
+
+@task('archive_collaboration_requests', atomic=False)
+def archive_collaboration_requests(older_than_days=None, batch_size=1000, max_batches=50):
+    """Queue-friendly entry point: archive a bounded amount, re-queue if more remain"""
+    moved = archive_resolved(older_than_days, batch_size, max_batches)
+    if moved >= batch_size * max_batches:
+        enqueue('archive_collaboration_requests', older_than_days=older_than_days,
+                batch_size=batch_size, max_batches=max_batches)
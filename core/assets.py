@@ -0,0 +1,146 @@
+"""
+STATIC ASSET PIPELINE
+=====================
+`manage.py collectstatic` copies every static file into STATIC_ROOT,
+writes a content-hashed copy of each (app.css -> app.3f2a1b9c0d4e.css,
+via ManifestStaticFilesStorage) and, for text assets, pre-compressed
+variants next to it (app.3f2a1b9c0d4e.css.gz / .br). {% static %} in
+templates then points at the hashed name.
+
+StaticAssetMiddleware serves those files straight from the Django app:
+- picks the .br or .gz variant the browser accepts (no compression work
+  per request)
+- hashed names get `Cache-Control: public, max-age=31536000, immutable`:
+  their content never changes under that name, so a repeat page view
+  doesn't even revalidate them
+- anything else under STATIC_URL gets a short max-age
+
+Brotli variants need the optional `brotli` package; without it only gzip
+files are written. With DEBUG on the middleware is disabled and runserver
+serves the source files as usual.
+"""
+import gzip
+import mimetypes
+import os
+
+from django.conf import settings
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage, staticfiles_storage
+from django.core.exceptions import MiddlewareNotUsed
+from django.http import FileResponse, HttpResponseNotModified
+from django.utils._os import safe_join
+from django.utils.http import http_date, parse_http_date_safe
+
+try:
+    import brotli
+except ImportError:  # optional dependency
+    brotli = None
+
+COMPRESSIBLE_EXTENSIONS = {'.css', '.js', '.mjs', '.svg', '.json', '.map', '.txt', '.html', '.xml', '.ico'}
+
+# Below this size the compressed file saves less than the headers cost
+MIN_COMPRESS_SIZE = 256
+
+IMMUTABLE = 'public, max-age=31536000, immutable'
+SHORT_LIVED = 'public, max-age=300'
+
+
+# ==============================================================================
+# STORAGE (collectstatic)
+# ==============================================================================
+
+def compress_file(path):
+    """Write path.gz (and path.br) next to path; returns the encodings written"""
+    with open(path, 'rb') as source:
+        data = source.read()
+    written = []
+    variants = [('gzip', '.gz', lambda raw: gzip.compress(raw, compresslevel=9, mtime=0))]
+    if brotli is not None:
+        variants.append(('br', '.br', lambda raw: brotli.compress(raw, quality=11)))
+    for encoding, suffix, compress in variants:
+        compressed = compress(data)
+        # Not worth serving if it barely shrinks
+        if len(compressed) >= len(data) * 0.95:
+            continue
+        with open(path + suffix, 'wb') as target:
+            target.write(compressed)
+        written.append(encoding)
+    return written
+
+
+class CompressedManifestStaticFilesStorage(ManifestStaticFilesStorage):
+    """Hashed file names plus pre-compressed .gz/.br variants of text assets"""
+
+    def post_process(self, paths, dry_run=False, **options):
+        yield from super().post_process(paths, dry_run, **options)
+        if dry_run:
+            return
+        names = set(paths) | set(self.hashed_files.values())
+        for name in sorted(names):
+            if os.path.splitext(name)[1].lower() not in COMPRESSIBLE_EXTENSIONS:
+                continue
+            path = self.path(name)
+            if os.path.isfile(path) and os.path.getsize(path) >= MIN_COMPRESS_SIZE:
+                compress_file(path)
+
+
+# ==============================================================================
+# MIDDLEWARE
+# ==============================================================================
+
+class StaticAssetMiddleware:
+    """Serve STATIC_ROOT files with pre-compressed variants and far-future caching"""
+
+    # Preferred first
+    ENCODINGS = [('br', '.br'), ('gzip', '.gz')]
+
+    def __init__(self, get_response):
+        if settings.DEBUG or not getattr(settings, 'STATIC_ROOT', None):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.root = str(settings.STATIC_ROOT)
+        self.prefix = '/' + settings.STATIC_URL.lstrip('/')
+        # Names whose content is pinned by their hash, from staticfiles.json
+        self.hashed_names = set(getattr(staticfiles_storage, 'hashed_files', {}).values())
+
+    def __call__(self, request):
+        if request.method in ('GET', 'HEAD') and request.path.startswith(self.prefix):
+            response = self.serve(request, request.path[len(self.prefix):])
+            if response is not None:
+                return response
+        return self.get_response(request)
+
+    def serve(self, request, name):
+        try:
+            path = safe_join(self.root, name)
+        except ValueError:  # ../ outside STATIC_ROOT
+            return None
+        if not os.path.isfile(path):
+            return None
+
+        stat = os.stat(path)
+        if name not in self.hashed_names:
+            # Not fingerprinted: let the browser revalidate now and then
+            since = parse_http_date_safe(request.headers.get('If-Modified-Since', ''))
+            if since is not None and int(stat.st_mtime) <= since:
+                return HttpResponseNotModified()
+
+        content_type, _ = mimetypes.guess_type(path)
+        encoding, served_path = self.negotiate(request, path)
+        response = FileResponse(open(served_path, 'rb'), content_type=content_type or 'application/octet-stream')
+        if encoding:
+            response['Content-Encoding'] = encoding
+        if os.path.splitext(path)[1].lower() in COMPRESSIBLE_EXTENSIONS:
+            response['Vary'] = 'Accept-Encoding'
+        response['Cache-Control'] = IMMUTABLE if name in self.hashed_names else SHORT_LIVED
+        response['Last-Modified'] = http_date(stat.st_mtime)
+        return response
+
+    def negotiate(self, request, path):
+        accepted = {
+            part.split(';')[0].strip().lower()
+            for part in request.headers.get('Accept-Encoding', '').split(',')
+        }
+        for encoding, suffix in self.ENCODINGS:
+            if encoding in accepted and os.path.isfile(path + suffix):
+                return encoding, path + suffix
+        return None, path
@@ -0,0 +1,223 @@
+"""
+ENGAGEMENT COUNTERS
+===================
+View and interest counts of posts and projects (post.view_count,
+project.interest_count, ...) without an UPDATE of the row on every view:
+
+    counters.incr(Project, 'view_count', project.id)
+
+1. Increments add up in a dict in this process: a lock, no query.
+2. Once COUNTER_FLUSH_SECONDS have passed since the last flush, or
+   COUNTER_MAX_PENDING rows have increments waiting, the next increment
+   swaps the buffer out and queues it as one 'flush_counters' task (one
+   INSERT into `task`, see core/tasks.py). In web processes a background
+   thread also flushes a buffer that is due with no increment coming, and
+   the buffer is flushed once more when the process exits
+   (flush_in_background(), called by research_fb/wsgi.py and asgi.py).
+3. The worker merges every queued flush, from all processes, and adds
+   them with one statement per table and chunk of rows:
+
+       UPDATE post
+       SET view_count = view_count + CASE WHEN id = 7 THEN 41 WHEN id = 9 THEN 3 ELSE 0 END,
+           interest_count = interest_count + CASE WHEN id = 7 THEN 1 ELSE 0 END
+       WHERE id IN (7, 9);
+
+A popular post gets one row update per flush, from the worker, instead
+of one per view from every request thread - its row never has a queue of
+writers waiting on its lock. Flushes lock rows in id order, so two of
+them can't deadlock.
+
+4. Each chunk then bumps the version keys of the cached pages showing its
+   counts (core/versions.py): 'feed' for posts, the owners' 'profile:<id>'
+   for projects, so conditional GETs stop answering 304 with old counts.
+
+LOSS BOUND: a process that is killed loses its buffer only - at most
+COUNTER_FLUSH_SECONDS of increments and never more than COUNTER_MAX_PENDING
+rows; one that exits cleanly (a deploy, a recycled worker) loses nothing.
+Outside the web entry points (management commands, tests) there is no
+thread or exit hook: an idle buffer waits for the next increment. The
+counts are for display: they lag by up to one flush, and a page answered
+304 (core/versions.py) keeps the counts it had.
+
+Buffered / flushed totals for this process: stats() (at /ops/counters/).
+"""
+import atexit
+import logging
+import threading
+import time
+
+from django.apps import apps
+from django.conf import settings
+from django.db import connections, transaction
+from django.db.models import Case, F, Value, When
+
+from .models import Post, Project
+from .tasks import task, enqueue
+from .versions import bump
+
+logger = logging.getLogger(__name__)
+
+# Rows per UPDATE ... CASE statement
+FLUSH_CHUNK_SIZE = 500
+
+_buffer = {}             # (model label, pk) -> {field: increment}
+_lock = threading.Lock()
+_last_flush = time.monotonic()
+_stats = {'increments': 0, 'flushes': 0, 'flushed_rows': 0}
+_background = False      # set by flush_in_background()
+_flusher = None          # its thread, started by the first increment of each process
+
+
+def flush_seconds():
+    return getattr(settings, 'COUNTER_FLUSH_SECONDS', 10)
+
+
+def max_pending():
+    return getattr(settings, 'COUNTER_MAX_PENDING', 1000)
+
+
+def incr(model, field, pk, amount=1):
+    """Add `amount` to model.field of row pk, at the next flush"""
+    key = (model._meta.label, pk)
+    with _lock:
+        increments = _buffer.setdefault(key, {})
+        increments[field] = increments.get(field, 0) + amount
+        _stats['increments'] += 1
+        due = len(_buffer) >= max_pending() or time.monotonic() - _last_flush >= flush_seconds()
+        if _background and (_flusher is None or not _flusher.is_alive()):
+            start_flusher()
+    # Queued from inside a transaction, the task (and every other request's
+    # increments with it) would be dropped if it rolled back
+    if due and not transaction.get_connection().in_atomic_block:
+        flush()
+
+
+def counted(rows, field, unless=None):
+    """Yield rows, counting one `field` for each (e.g. a feed impression), except where unless(row)"""
+    for row in rows:
+        if unless is None or not unless(row):
+            incr(type(row), field, row.pk)
+        yield row
+
+
+def flush():
+    """Queue this process's buffered increments for the database; returns the rows queued"""
+    global _buffer, _last_flush
+    with _lock:
+        buffer, _buffer = _buffer, {}
+        _last_flush = time.monotonic()
+    if not buffer:
+        return 0
+
+    # JSON payload: {model label: {field: {pk: increment}}}
+    counts = {}
+    for (label, pk), increments in buffer.items():
+        for field, amount in increments.items():
+            counts.setdefault(label, {}).setdefault(field, {})[str(pk)] = amount
+    enqueue('flush_counters', counts=counts)
+    with _lock:
+        _stats['flushes'] += 1
+        _stats['flushed_rows'] += len(buffer)
+    return len(buffer)
+
+
+# ==============================================================================
+# BACKGROUND FLUSH (web processes)
+# ==============================================================================
+
+def flush_in_background():
+    """Flush due buffers from a thread of this process, and the buffer at exit"""
+    global _background
+    _background = True
+    atexit.register(flush_at_exit)
+
+
+def start_flusher():
+    # Called with _lock held. Started on the first increment rather than at
+    # import: a server that forks its workers after loading the app would
+    # otherwise leave the thread in the parent only
+    global _flusher
+    _flusher = threading.Thread(target=flush_periodically, name='counter-flush', daemon=True)
+    _flusher.start()
+
+
+def flush_periodically():
+    while True:
+        with _lock:
+            wait = _last_flush + flush_seconds() - time.monotonic()
+            due = wait <= 0 and bool(_buffer)
+        if not due:
+            time.sleep(wait if wait > 0 else flush_seconds())
+            continue
+        try:
+            flush()
+        except Exception:
+            logger.exception('Flushing the engagement counters failed; their increments are lost')
+        finally:
+            # This thread's connection would otherwise sit idle until the next flush
+            connections.close_all()
+
+
+def flush_at_exit():
+    try:
+        flush()
+    except Exception:
+        logger.exception('Flushing the engagement counters at exit failed; their increments are lost')
+
+
+def stats():
+    """Increments counted, flushes queued and rows still buffered, this process"""
+    with _lock:
+        return {
+            **_stats,
+            'pending_rows': len(_buffer),
+            'seconds_since_flush': round(time.monotonic() - _last_flush, 1),
+        }
+
+
+# ==============================================================================
+# TASK HANDLER
+# ==============================================================================
+
+def page_keys(model, pks):
+    """Version keys of the conditional-GET pages that show these rows' counts"""
+    # SQL: SELECT DISTINCT owner_id FROM project WHERE id IN (<pks>);
+    if model is Post:
+        return ['feed']
+    if model is Project:
+        owner_ids = Project.objects.filter(pk__in=pks).values_list('owner_id', flat=True).distinct()
+        return [f'profile:{owner_id}' for owner_id in owner_ids]
+    return []
+
+
+@task('flush_counters', batch=True)
+def flush_counters(payloads):
+    """Add queued increments: one UPDATE ... CASE per table and chunk of rows"""
+    # SQL: UPDATE <table>
+    #      SET <field> = <field> + CASE WHEN id = <pk> THEN <n> ... ELSE 0 END, ...
+    #      WHERE id IN (<chunk of pks>);
+    # SQL: UPDATE resource_version SET version = version + 1 ... WHERE key IN (<page keys>);
+    merged = {}
+    for payload in payloads:
+        for label, fields in payload['counts'].items():
+            rows = merged.setdefault(label, {})
+            for field, increments in fields.items():
+                for pk, amount in increments.items():
+                    row = rows.setdefault(int(pk), {})
+                    row[field] = row.get(field, 0) + amount
+
+    for label, rows in merged.items():
+        model = apps.get_model(label)
+        ids = sorted(rows)
+        for start in range(0, len(ids), FLUSH_CHUNK_SIZE):
+            chunk = ids[start:start + FLUSH_CHUNK_SIZE]
+            fields = sorted({field for pk in chunk for field in rows[pk]})
+            model.objects.filter(pk__in=chunk).update(**{
+                field: F(field) + Case(
+                    *[When(pk=pk, then=Value(rows[pk][field])) for pk in chunk if field in rows[pk]],
+                    default=Value(0),
+                    output_field=model._meta.get_field(field),
+                )
+                for field in fields
+            })
+            bump(*page_keys(model, chunk))
@@ -0,0 +1,172 @@
+"""
+NEAR-DUPLICATE POST DETECTION (MinHash + LSH)
+=============================================
+Reposted "looking for collaborators" messages are flagged when they are
+written, so the feed can show the original once instead of every copy.
+
+HOW:
+1. A post's content becomes a set of word 3-grams ("shingles").
+2. Its MinHash signature is NUM_PERM minimum hash values of that set; two
+   signatures agree in a position with probability equal to the Jaccard
+   similarity of the two sets.
+3. The signature is cut into BANDS bands of ROWS values; each band is
+   hashed to one 64-bit key and stored in post_lsh_band. Posts sharing any
+   key are candidates - a WHERE key IN (<BANDS keys>) index lookup, so the
+   cost grows with the number of candidates, not with the number of posts.
+4. Candidates are confirmed with the exact Jaccard similarity of their
+   shingles (>= DEDUP_THRESHOLD). The new post then points at the
+   original (Post.duplicate_of).
+5. Only originals get bands. A copy is found through its original's, so
+   indexing the copies too would only grow the buckets of the most
+   reposted text - the very buckets every new copy is looked up in.
+
+With 16 bands of 4 rows, a post 80% similar to an earlier one becomes a
+candidate 99.9% of the time; 30% similar posts do only ~12% of the time,
+and the exact check then rejects them.
+
+Existing posts are indexed with `manage.py dedup_posts`.
+"""
+import hashlib
+import random
+import re
+
+from django.conf import settings
+from django.db import transaction
+
+from .models import Post, PostBand
+
+NUM_PERM = 64
+BANDS = 16
+ROWS = NUM_PERM // BANDS
+SHINGLE_SIZE = 3
+
+# Candidates examined per new post (most recent first)
+MAX_CANDIDATES = 50
+
+# Universal hashing h(x) = (a*x + b) mod p; fixed seed so signatures are
+# stable across processes and deploys
+MERSENNE_PRIME = (1 << 61) - 1
+_rng = random.Random(20240901)
+PERMUTATIONS = [
+    (_rng.randrange(1, MERSENNE_PRIME), _rng.randrange(0, MERSENNE_PRIME))
+    for _ in range(NUM_PERM)
+]
+
+WORD_RE = re.compile(r'[a-z0-9]+')
+
+
+def _hash64(text):
+    return int.from_bytes(hashlib.blake2b(text.encode(), digest_size=8).digest(), 'big')
+
+
+def shingles(content):
+    """Set of word n-grams of the normalized content (lowercase, punctuation dropped)"""
+    words = WORD_RE.findall(content.lower())
+    if len(words) < SHINGLE_SIZE:
+        return {' '.join(words)} if words else set()
+    return {' '.join(words[i:i + SHINGLE_SIZE]) for i in range(len(words) - SHINGLE_SIZE + 1)}
+
+
+def signature(shingle_set):
+    hashes = [_hash64(shingle) % MERSENNE_PRIME for shingle in shingle_set]
+    return [min((a * h + b) % MERSENNE_PRIME for h in hashes) for a, b in PERMUTATIONS]
+
+
+def band_keys(sig):
+    """One signed 64-bit key per band (fits a BIGINT column)"""
+    keys = []
+    for band in range(BANDS):
+        rows = ','.join(str(value) for value in sig[band * ROWS:(band + 1) * ROWS])
+        digest = hashlib.blake2b(f'{band}:{rows}'.encode(), digest_size=8).digest()
+        keys.append(int.from_bytes(digest, 'big', signed=True))
+    return keys
+
+
+def jaccard(a, b):
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+
+def find_original(post_id, keys, shingle_set):
+    """Id of the earlier post this content duplicates, or None"""
+    # SQL: SELECT DISTINCT post_id FROM post_lsh_band
+    #      WHERE key IN (<band keys>) AND post_id < <post_id>
+    #      ORDER BY post_id DESC LIMIT 50;
+    # SQL: SELECT id, content, duplicate_of_id FROM post WHERE id IN (<candidates>);
+    threshold = getattr(settings, 'DEDUP_THRESHOLD', 0.8)
+    candidate_ids = list(
+        PostBand.objects.filter(key__in=keys, post_id__lt=post_id)
+        .values_list('post_id', flat=True)
+        .distinct()
+        .order_by('-post_id')[:MAX_CANDIDATES]
+    )
+    if not candidate_ids:
+        return None
+
+    best_id, best_score = None, threshold
+    for candidate_id, content, duplicate_of_id in Post.objects.filter(
+        id__in=candidate_ids
+    ).values_list('id', 'content', 'duplicate_of_id'):
+        score = jaccard(shingle_set, shingles(content))
+        if score >= best_score:
+            # Point at the original, never at another copy
+            best_id, best_score = duplicate_of_id or candidate_id, score
+    return best_id
+
+
+def index_post(post):
+    """
+    Flag the post if it nearly duplicates an earlier one, otherwise add it to
+    the LSH index as an original. Returns the original's id, or None.
+    """
+    # SQL: UPDATE post SET duplicate_of_id = <original> WHERE id = <post_id>;
+    #      -- or, for an original:
+    # SQL: INSERT INTO post_lsh_band (post_id, key) VALUES (<post_id>, <key>), ... (16 rows);
+    shingle_set = shingles(post.content)
+    if not shingle_set:
+        return None
+    keys = band_keys(signature(shingle_set))
+
+    original_id = find_original(post.id, keys, shingle_set)
+    if original_id is not None:
+        # update() rather than save(): no second round of post_save handlers
+        Post.objects.filter(id=post.id).update(duplicate_of_id=original_id)
+        post.duplicate_of_id = original_id
+        return original_id
+
+    PostBand.objects.bulk_create([PostBand(post_id=post.id, key=key) for key in set(keys)])
+    return None
+
+
+def index_existing(rebuild=False, chunk_size=1000, log=None):
+    """Check posts neither indexed nor flagged yet, oldest first; returns (checked, flagged)"""
+    # SQL: SELECT id, content FROM post
+    #      WHERE id > <last id> AND duplicate_of_id IS NULL
+    #        AND id NOT IN (SELECT post_id FROM post_lsh_band)
+    #      ORDER BY id LIMIT <chunk_size>;
+    if rebuild:
+        with transaction.atomic():
+            PostBand.objects.all().delete()
+            Post.objects.exclude(duplicate_of=None).update(duplicate_of=None)
+
+    indexed = flagged = 0
+    last_id = 0
+    while True:
+        chunk = list(
+            Post.objects.filter(id__gt=last_id, duplicate_of=None)
+            .exclude(id__in=PostBand.objects.values('post_id'))
+            .order_by('id')
+            .only('id', 'content')[:chunk_size]
+        )
+        if not chunk:
+            break
+        with transaction.atomic():
+            for post in chunk:
+                if index_post(post) is not None:
+                    flagged += 1
+        indexed += len(chunk)
+        last_id = chunk[-1].id
+        if log:
+            log(f'{indexed} posts checked, {flagged} flagged as duplicates')
+    return indexed, flagged
@@ -0,0 +1,191 @@
+"""
+BATCHED DELETION
+================
+user.delete() makes Django's collector load every row that cascades from
+the user first - posts, their LSH bands, projects, requests sent and
+received, collaborator links - then delete all of it in one transaction
+that holds every one of those row locks until it ends. purge() removes the
+same graph in small batches instead:
+
+    deletion.purge(User, [7])
+    enqueue('purge_objects', model='core.User', ids=[7])     # from a request
+    python manage.py purge user 7
+
+For each batch of `batch_size` rows, depth first:
+1. SELECT id FROM <table> WHERE ... ORDER BY id LIMIT <batch_size>
+2. Purge the rows pointing at that batch with on_delete=CASCADE (M2M links
+   included), the same way
+3. One short transaction: null the on_delete=SET_NULL references to the
+   batch, then DELETE FROM <table> WHERE id IN (<batch>)
+
+Memory and lock time are one batch, however large the graph.
+
+RESUMABLE: every batch commits on its own and children always go before
+their parents, so a purge that stops (max_batches, a crash) leaves a
+consistent database and running it again finishes the job. A row inserted
+under a parent between steps 2 and 3 fails the DELETE on its foreign key;
+that batch rolls back and the next run takes it too.
+
+SIDE EFFECTS: raw DELETEs send no post_delete signals, so the version
+bumps, rollup refreshes and facet updates of core/signals.py are made here
+instead, once per batch (AFTER_DELETE). The query cache sees the DELETEs
+on its own.
+"""
+import time
+from collections import Counter
+
+from django.apps import apps
+from django.conf import settings
+from django.db import connection, models, transaction
+
+from .facets import changes, queue_update, user_written
+from .models import Field, Subfield, User, Problem, Project, Post, CollaborationRequest, ArchivedCollaborationRequest
+from .rollups import queue_refresh
+from .tasks import task, enqueue
+from .versions import bump
+
+
+def relations(model):
+    """(model, foreign key) of every relation pointing at `model`, M2M join tables included"""
+    return [
+        (field.related_model, field.field)
+        for field in model._meta.get_fields(include_hidden=True)
+        if field.auto_created and not field.concrete and (field.one_to_many or field.one_to_one)
+    ]
+
+
+class OutOfBatches(Exception):
+    """max_batches reached: the purge stops here and can be run again"""
+
+
+class Purge:
+    """One batched deletion: rows deleted per model and batches run so far"""
+
+    def __init__(self, batch_size=None, max_batches=None, pause=0.0, log=None):
+        self.batch_size = batch_size or getattr(settings, 'PURGE_BATCH_SIZE', 500)
+        self.max_batches = max_batches
+        self.pause = pause
+        self.log = log
+        self.deleted = Counter()
+        self.batches = 0
+        self.finished = False
+
+    def run(self, queryset):
+        """Delete the queryset's rows and everything that cascades from them"""
+        try:
+            self.purge(queryset)
+        except OutOfBatches:
+            return self
+        self.finished = True
+        return self
+
+    def purge(self, queryset):
+        model = queryset.model
+        pk = model._meta.pk.name
+        while True:
+            # SQL: SELECT id FROM <table> WHERE ... ORDER BY id LIMIT <batch_size>;
+            batch = list(queryset.order_by(pk).values_list(pk, flat=True)[:self.batch_size])
+            if not batch:
+                return
+            for related, fk in relations(model):
+                on_delete = fk.remote_field.on_delete
+                if on_delete is models.CASCADE:
+                    self.purge(related._base_manager.filter(**{f'{fk.name}__in': batch}))
+                elif on_delete not in (models.SET_NULL, models.DO_NOTHING):
+                    raise ValueError(f'{related._meta.label}.{fk.name}: on_delete={on_delete.__name__} is not supported')
+            self.delete_batch(model, batch)
+            if len(batch) < self.batch_size:
+                return
+
+    def delete_batch(self, model, batch):
+        """Delete one batch whose children are gone, in one transaction"""
+        # SQL: UPDATE <table> SET <fk> = NULL WHERE <fk> IN (<batch>);   -- SET_NULL references
+        # SQL: DELETE FROM <table> WHERE id IN (<batch>);
+        columns, after_delete = AFTER_DELETE.get(model, ((), None))
+        placeholders = ', '.join(['%s'] * len(batch))
+        with transaction.atomic():
+            rows = list(model._base_manager.filter(pk__in=batch).values(*columns)) if after_delete else None
+            for related, fk in relations(model):
+                if fk.remote_field.on_delete is models.SET_NULL:
+                    related._base_manager.filter(**{f'{fk.name}__in': batch}).update(**{fk.name: None})
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    f'DELETE FROM {connection.ops.quote_name(model._meta.db_table)} '
+                    f'WHERE {connection.ops.quote_name(model._meta.pk.column)} IN ({placeholders})',
+                    batch,
+                )
+                deleted = cursor.rowcount
+            if after_delete:
+                after_delete(rows)
+
+        self.deleted[model._meta.label] += deleted
+        self.batches += 1
+        if self.log:
+            self.log(f'batch {self.batches}: deleted {deleted} {model._meta.verbose_name_plural}')
+        if self.max_batches is not None and self.batches >= self.max_batches:
+            raise OutOfBatches
+        if self.pause:
+            time.sleep(self.pause)
+
+
+def purge(model, ids=None, batch_size=None, max_batches=None, pause=0.0, log=None):
+    """Delete these rows of `model` (every row without ids) and their cascades in batches; returns the Purge"""
+    queryset = model._base_manager.all()
+    if ids is not None:
+        queryset = queryset.filter(pk__in=ids)
+    return Purge(batch_size, max_batches, pause, log).run(queryset)
+
+
+@task('purge_objects', atomic=False)
+def purge_objects(model, ids, max_batches=200):
+    """Queue-friendly entry point: purge a bounded number of batches, re-queue if more remain"""
+    if not purge(apps.get_model(model), ids, max_batches=max_batches).finished:
+        enqueue('purge_objects', model=model, ids=ids, max_batches=max_batches)
+
+
+# ==============================================================================
+# SIGNAL SIDE EFFECTS
+# ==============================================================================
+# What the post_delete receivers in core/signals.py do per row, done once
+# per batch: model -> (columns read before the DELETE, handler(rows))
+
+def users_deleted(rows):
+    bump('users', *[f"profile:{row['id']}" for row in rows])
+    queue_refresh(institutions=[row['institution'] for row in rows])
+    removed = Counter((facet, value) for row in rows for facet, value, _ in changes(row, None))
+    queue_update([(facet, value, -count) for (facet, value), count in removed.items()])
+    ids = [row['id'] for row in rows]
+    transaction.on_commit(lambda: [user_written(user_id, None) for user_id in ids])
+
+
+def projects_deleted(rows):
+    bump(*[f"profile:{row['owner_id']}" for row in rows], *[f"subfield:{row['subfield_id']}" for row in rows])
+    queue_refresh(subfield_ids=[row['subfield_id'] for row in rows])
+
+
+def collaborators_deleted(rows):
+    # Mirrors the m2m_changed receiver: the project owners' profiles list them
+    bump(*[f"profile:{row['project__owner_id']}" for row in rows])
+
+
+def requests_deleted(rows):
+    bump(*[f"inbox:{row['receiver_id']}" for row in rows])
+    queue_refresh(receiver_ids=[row['receiver_id'] for row in rows])
+
+
+def problems_deleted(rows):
+    bump(*[f"problem:{row['id']}" for row in rows])
+    queue_refresh(subfield_ids=[row['subfield_id'] for row in rows])
+
+
+AFTER_DELETE = {
+    User: (['id', 'institution', 'country', 'field', 'user_type'], users_deleted),
+    Project: (['owner_id', 'subfield_id'], projects_deleted),
+    Project.collaborators.through: (['project__owner_id'], collaborators_deleted),
+    Post: ([], lambda rows: bump('feed')),
+    CollaborationRequest: (['receiver_id'], requests_deleted),
+    ArchivedCollaborationRequest: (['receiver_id'], requests_deleted),
+    Problem: (['id', 'subfield_id'], problems_deleted),
+    Field: ([], lambda rows: bump('taxonomy')),
+    Subfield: ([], lambda rows: bump('taxonomy')),
+}
@@ -0,0 +1,276 @@
+"""
+STREAMING DATA EXPORT
+=====================
+Full-table CSV / JSON Lines exports of users, projects, problems, posts and
+collaboration history, for analysts. Used by the staff-only
+/ops/export/<dataset>/ endpoint and by `manage.py export_data`.
+
+Memory stays flat whatever the table size:
+- rows are read with values_list() (tuples, no model instances) in
+  primary-key chunks of EXPORT_CHUNK_SIZE: WHERE id > <last id> ORDER BY id
+  LIMIT <chunk>, each chunk read with iterator(chunk_size=...). Keyset
+  chunks matter on MySQL, whose client otherwise buffers the whole result.
+- every row is encoded and handed on immediately (StreamingHttpResponse in
+  the view, a file in the command); with gzip=True the bytes go through one
+  zlib compressor as they are produced.
+
+JSON Lines values go through DjangoJSONEncoder: ISO 8601 datetimes,
+decimals as strings.
+
+FILTERS (where the dataset has the column):
+    field=<field name>  subfield=<subfield name>
+    since=YYYY-MM-DD    until=YYYY-MM-DD   (inclusive, on created_at)
+"""
+import csv
+import json
+import zlib
+from datetime import datetime, time, timedelta
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+
+from .models import User, Post, Project, Problem, CollaborationRequest, ArchivedCollaborationRequest
+
+FORMATS = {
+    'csv': 'text/csv',
+    'jsonl': 'application/x-ndjson',
+}
+
+
+class ExportError(Exception):
+    """Raised for an unknown dataset/format or a bad filter; shown as a 400"""
+
+
+# ==============================================================================
+# DATASET DEFINITIONS
+# ==============================================================================
+
+class Dataset:
+    """
+    Describes one exportable table.
+
+    models:   models read one after the other (history = hot table + archive);
+              each must have an integer `id` primary key
+    columns:  output column -> ORM lookup path used in values_list()
+    field / subfield / date: ORM lookups behind the filters, None if the
+              dataset can't be filtered that way
+    """
+
+    def __init__(self, models, columns, field=None, subfield=None, date=None):
+        self.models = models
+        self.columns = columns
+        self.field = field
+        self.subfield = subfield
+        self.date = date
+
+    def querysets(self, filters, using='default'):
+        lookups = self.lookups(filters)
+        paths = list(self.columns.values())
+        return [
+            model.objects.using(using).filter(**lookups).values_list(*paths)
+            for model in self.models
+        ]
+
+    def lookups(self, filters):
+        lookups = {}
+        for name in ('field', 'subfield'):
+            value = filters.get(name)
+            if not value:
+                continue
+            path = getattr(self, name)
+            if path is None:
+                raise ExportError(f'This dataset cannot be filtered by {name}')
+            lookups[path] = value
+
+        since, until = parse_day(filters.get('since')), parse_day(filters.get('until'))
+        if since or until:
+            if self.date is None:
+                raise ExportError('This dataset has no date to filter on')
+            if since:
+                lookups[f'{self.date}__gte'] = since
+            if until:
+                lookups[f'{self.date}__lt'] = until + timedelta(days=1)
+        return lookups
+
+
+DATASETS = {
+    'users': Dataset(
+        models=[User],
+        columns={
+            'id': 'id',
+            'name': 'name',
+            'email': 'email',
+            'user_type': 'user_type',
+            'institution': 'institution',
+            'country': 'country',
+            'field': 'field',
+            'rating': 'rating',
+        },
+        field='field',  # User.field stores the field name
+    ),
+    'projects': Dataset(
+        models=[Project],
+        columns={
+            'id': 'id',
+            'title': 'title',
+            'description': 'description',
+            'vacancy_status': 'vacancy_status',
+            'created_at': 'created_at',
+            'owner_id': 'owner_id',
+            'field': 'field__name',
+            'subfield': 'subfield__name',
+        },
+        field='field__name',
+        subfield='subfield__name',
+        date='created_at',
+    ),
+    'problems': Dataset(
+        models=[Problem],
+        columns={
+            'id': 'id',
+            'name': 'name',
+            'description': 'description',
+            'severity': 'severity',
+            'current_work': 'current_work',
+            'done_work': 'done_work',
+            'gaps': 'gaps',
+            'field': 'subfield__field__name',
+            'subfield': 'subfield__name',
+        },
+        field='subfield__field__name',
+        subfield='subfield__name',
+    ),
+    'posts': Dataset(
+        models=[Post],
+        columns={
+            'id': 'id',
+            'author_id': 'author_id',
+            'author_field': 'author__field',
+            'content': 'content',
+            'created_at': 'created_at',
+        },
+        field='author__field',
+        date='created_at',
+    ),
+    'collaborations': Dataset(
+        models=[CollaborationRequest, ArchivedCollaborationRequest],
+        columns={
+            'id': 'id',
+            'sender_id': 'sender_id',
+            'receiver_id': 'receiver_id',
+            'project_id': 'project_id',
+            'post_id': 'post_id',
+            'status': 'status',
+            'created_at': 'created_at',
+            'field': 'project__field__name',
+            'subfield': 'project__subfield__name',
+        },
+        field='project__field__name',
+        subfield='project__subfield__name',
+        date='created_at',
+    ),
+}
+
+
+def get_dataset(name):
+    if name not in DATASETS:
+        raise ExportError(f'Unknown dataset: {name}')
+    return DATASETS[name]
+
+
+def parse_day(value):
+    """'YYYY-MM-DD' -> aware datetime at midnight, or None"""
+    if not value:
+        return None
+    day = parse_date(value)
+    if day is None:
+        raise ExportError(f'Invalid date: {value} (expected YYYY-MM-DD)')
+    return datetime.combine(day, time.min, tzinfo=timezone.get_current_timezone())
+
+
+# ==============================================================================
+# STREAMING
+# ==============================================================================
+
+def iter_rows(queryset, chunk_size):
+    """Yield row tuples in id order, one keyset chunk at a time"""
+    # SQL: SELECT <columns> FROM <table> ... WHERE <filters> AND id > <last id>
+    #      ORDER BY id LIMIT <chunk_size>;   (repeated until a short chunk)
+    last_id = None
+    while True:
+        chunk = queryset.order_by('id')
+        if last_id is not None:
+            chunk = chunk.filter(id__gt=last_id)
+        count = 0
+        for row in chunk[:chunk_size].iterator(chunk_size=chunk_size):
+            count += 1
+            last_id = row[0]
+            yield row
+        if count < chunk_size:
+            return
+
+
+class Echo:
+    """File-like object whose write() just returns the line (for csv.writer)"""
+
+    def write(self, value):
+        return value
+
+
+def encode_lines(header, rows, fmt):
+    """Yield one encoded line per row (CSV starts with a header line)"""
+    if fmt == 'csv':
+        writer = csv.writer(Echo())
+        yield writer.writerow(header).encode()
+        for row in rows:
+            yield writer.writerow(row).encode()
+    else:
+        for row in rows:
+            yield (json.dumps(dict(zip(header, row)), cls=DjangoJSONEncoder) + '\n').encode()
+
+
+def gzip_stream(chunks):
+    """Gzip a byte stream on the fly"""
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)  # wbits=31 -> gzip container
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def buffered(lines, size=64 * 1024):
+    """Join small lines into ~size byte chunks (fewer writes / socket sends)"""
+    buffer, length = [], 0
+    for line in lines:
+        buffer.append(line)
+        length += len(line)
+        if length >= size:
+            yield b''.join(buffer)
+            buffer, length = [], 0
+    if buffer:
+        yield b''.join(buffer)
+
+
+def export_stream(name, fmt='csv', filters=None, gzip=False, chunk_size=None, using='default'):
+    """Bytes of the whole export, produced lazily"""
+    if fmt not in FORMATS:
+        raise ExportError(f'Unknown format: {fmt}')
+    dataset = get_dataset(name)
+    chunk_size = chunk_size or getattr(settings, 'EXPORT_CHUNK_SIZE', 2000)
+    # Built (and filters validated) now, so errors surface before streaming starts
+    querysets = dataset.querysets(filters or {}, using)
+
+    def rows():
+        for queryset in querysets:
+            yield from iter_rows(queryset, chunk_size)
+
+    stream = buffered(encode_lines(list(dataset.columns), rows(), fmt))
+    return gzip_stream(stream) if gzip else stream
+
+
+def filename(name, fmt, gzip=False):
+    stamp = timezone.now().strftime('%Y%m%d')
+    return f'{name}-{stamp}.{fmt}' + ('.gz' if gzip else '')
@@ -0,0 +1,455 @@
+"""
+RESEARCHER FACETS
+=================
+User counts per country, institution, field and user_type for the faceted
+directory (/researchers/browse/), without GROUP BY scans of `user` per
+request.
+
+UNFILTERED COUNTS - facet_count table, one row per (facet, value):
+- User saves and deletes (core/signals.py) queue +1/-1 deltas as an
+  'update_facets' task; the batched handler adds them with one
+  UPDATE ... CASE per facet.
+- Imports (bulk_create, no signals) queue a recount of the values they
+  wrote. A value a user left in an import keeps its old count until
+  `manage.py rebuild_facets`.
+- A facet is read with one indexed query:
+      SELECT value, count FROM facet_count
+      WHERE facet = 'country' AND count > 0 ORDER BY count DESC LIMIT 10;
+
+FILTERED COUNTS - FacetIndex, in memory in each process:
+- A value held by at least 1/256 of the users is a bitmap over user ids
+  (a Python int, bit i = user i); rarer values are sorted id arrays.
+  At most 256 values per facet are bitmaps, so with the id -> value
+  column a facet costs under 40 bytes per user (~5 on skewed data).
+- Filters are intersected with bitmap AND; counts are popcounts of
+  (filter & value). A filter that leaves few users is turned into ids and
+  counted through per-facet id -> value columns instead.
+- Matching users are listed from the bitmap in id order, then loaded by
+  primary key.
+- Built when the web process starts if FACET_INDEX_WARMUP is on
+  (research_fb/wsgi.py, asgi.py), else by the first filtered search;
+  later rebuilds run in a background thread while the old index serves.
+- Freshness: users created since the index was built are added on every
+  read (SELECT ... WHERE id > <last id>), writes made in this process are
+  applied directly, and the rest (edits and deletes in other processes)
+  arrive with the next rebuild, FACET_INDEX_MAX_AGE seconds after the
+  last one. Listed users are checked against the filters in SQL, so a
+  stale bit never shows a user who no longer matches.
+"""
+import threading
+import time
+from array import array
+from bisect import bisect_right
+from collections import Counter, defaultdict
+
+from django.conf import settings
+from django.db import connections, transaction
+from django.db.models import Case, Count, F, IntegerField, Value, When
+
+from .models import User, FacetCount
+from .rollups import chunks, upsert
+from .tasks import task, enqueue
+
+FACETS = ('country', 'institution', 'field', 'user_type')
+
+# Rows per INSERT while rebuilding facet_count
+REBUILD_BATCH_SIZE = 1000
+
+# Users read per round trip while building the index
+INDEX_CHUNK_SIZE = 10000
+
+
+# ==============================================================================
+# FACET TABLE
+# ==============================================================================
+
+def top_values(facet, limit):
+    """[(value, count)] of the most common values of a facet"""
+    # SQL: SELECT value, count FROM facet_count
+    #      WHERE facet = <facet> AND count > 0 ORDER BY count DESC LIMIT <limit>;
+    return list(
+        FacetCount.objects.filter(facet=facet, count__gt=0)
+        .order_by('-count', 'value').values_list('value', 'count')[:limit].cache()
+    )
+
+
+def queue_update(deltas=(), recount=()):
+    """
+    Ask the worker to apply these after the current transaction.
+    deltas:  (facet, value, +n / -n)
+    recount: (facet, value) to count again from `user`
+    """
+    deltas = [[facet, value, amount] for facet, value, amount in deltas if amount]
+    recount = sorted({(facet, value) for facet, value in recount})
+    if deltas or recount:
+        enqueue('update_facets', deltas=deltas, recount=[list(key) for key in recount])
+
+
+def changes(old, new):
+    """Facet deltas for a user going from `old` to `new` values (dicts, or None)"""
+    deltas = []
+    for facet in FACETS:
+        before = old.get(facet) if old else None
+        after = new.get(facet) if new else None
+        if before == after:
+            continue
+        if before:
+            deltas.append((facet, before, -1))
+        if after:
+            deltas.append((facet, after, 1))
+    return deltas
+
+
+def facet_values(user):
+    return {facet: getattr(user, facet) for facet in FACETS}
+
+
+@task('update_facets', batch=True)
+def update_facets(payloads):
+    """Apply a batch of deltas (one UPDATE ... CASE per facet), then recounts"""
+    # SQL: INSERT INTO facet_count (facet, value, count) VALUES (...), ...
+    #      ON CONFLICT DO NOTHING;   -- values seen for the first time
+    # SQL: UPDATE facet_count
+    #      SET count = count + CASE WHEN value = <v> THEN <n> ... ELSE 0 END
+    #      WHERE facet = <facet> AND value IN (<values>);
+    totals = Counter()
+    recount = set()
+    for payload in payloads:
+        for facet, value, amount in payload.get('deltas', []):
+            totals[(facet, value)] += amount
+        recount.update(tuple(key) for key in payload.get('recount', []))
+
+    by_facet = {}
+    for (facet, value), amount in totals.items():
+        if amount and (facet, value) not in recount:
+            by_facet.setdefault(facet, {})[value] = amount
+    if by_facet:
+        FacetCount.objects.bulk_create(
+            [FacetCount(facet=facet, value=value) for facet, values in by_facet.items() for value in values],
+            ignore_conflicts=True,
+        )
+    for facet, values in by_facet.items():
+        FacetCount.objects.filter(facet=facet, value__in=list(values)).update(count=F('count') + Case(
+            *[When(value=value, then=Value(amount)) for value, amount in values.items()],
+            default=Value(0), output_field=IntegerField(),
+        ))
+    if recount:
+        refresh(recount)
+
+
+def refresh(keys):
+    """Count the given (facet, value) pairs again from `user`"""
+    # SQL: SELECT <facet>, COUNT(id) FROM user WHERE <facet> IN (<values>) GROUP BY <facet>;
+    by_facet = {}
+    for facet, value in keys:
+        by_facet.setdefault(facet, set()).add(value)
+    for facet, values in by_facet.items():
+        counts = dict.fromkeys(values, 0)
+        counts.update(
+            User.objects.filter(**{f'{facet}__in': values})
+            .values_list(facet).annotate(count=Count('id')).order_by()
+        )
+        upsert(
+            FacetCount,
+            [FacetCount(facet=facet, value=value, count=count) for value, count in counts.items()],
+            ['facet', 'value'], ['count'],
+        )
+
+
+def rebuild_all(log=None):
+    """Recount every facet from `user`; returns the number of facet_count rows"""
+    # SQL: DELETE FROM facet_count;
+    # SQL: SELECT <facet>, COUNT(id) FROM user GROUP BY <facet>;   -- per facet
+    # SQL: INSERT INTO facet_count (facet, value, count) VALUES (...), ...;
+    total = 0
+    with transaction.atomic():
+        FacetCount.objects.all().delete()
+        for facet in FACETS:
+            counts = User.objects.values_list(facet).annotate(count=Count('id')).order_by()
+            rows = [FacetCount(facet=facet, value=value, count=count) for value, count in counts if value]
+            for batch in chunks(rows, REBUILD_BATCH_SIZE):
+                FacetCount.objects.bulk_create(batch)
+            total += len(rows)
+            if log:
+                log(f'{facet}: {len(rows)} values')
+    return total
+
+
+# ==============================================================================
+# IN-MEMORY INDEX
+# ==============================================================================
+
+def to_bitmap(ids, size):
+    """Python int with bit i set for every i in ids (all < size)"""
+    buffer = bytearray((size + 7) // 8)
+    for i in ids:
+        buffer[i >> 3] |= 1 << (i & 7)
+    return int.from_bytes(buffer, 'little')
+
+
+def bitmap_ids(bitmap):
+    """Sorted ids of the set bits"""
+    data = bitmap.to_bytes((bitmap.bit_length() + 7) // 8, 'little')
+    ids = []
+    for index, byte in enumerate(data):
+        while byte:
+            low = byte & -byte
+            ids.append(index * 8 + low.bit_length() - 1)
+            byte ^= low
+    return ids
+
+
+def first_ids(bitmap, after, limit):
+    """Up to `limit` smallest set bits greater than `after`"""
+    bitmap >>= after + 1
+    ids = []
+    position = after + 1
+    while bitmap and len(ids) < limit:
+        low = bitmap & -bitmap
+        shift = low.bit_length()
+        ids.append(position + shift - 1)
+        bitmap >>= shift
+        position += shift
+    return ids
+
+
+class FacetIndex:
+    """Bitmaps / id arrays per facet value, plus id -> value columns (see module docstring)"""
+
+    def __init__(self):
+        self.built_at = time.monotonic()
+        self.max_id = 0
+        self.all = 0
+        self.values = {facet: [''] for facet in FACETS}   # code -> value (code 0: no user)
+        self.codes = {facet: {} for facet in FACETS}      # value -> code
+        self.columns = {facet: array('I', [0]) for facet in FACETS}   # user id -> code
+        self.dense = {facet: {} for facet in FACETS}      # code -> bitmap
+        self.sparse = {facet: {} for facet in FACETS}     # code -> array of ids
+        self.lock = threading.RLock()
+
+    @classmethod
+    def build(cls):
+        # SQL: SELECT id, country, institution, field, user_type FROM user ORDER BY id;
+        index = cls()
+        # Ids grouped by value, one dict per facet (codes are given per value afterwards)
+        members = [defaultdict(list) for _ in FACETS]
+        ids = []
+        rows = User.objects.order_by('id').values_list('id', *FACETS).iterator(chunk_size=INDEX_CHUNK_SIZE)
+        for row in rows:
+            user_id = row[0]
+            ids.append(user_id)
+            for groups, value in zip(members, row[1:]):
+                groups[value].append(user_id)
+        index.max_id = ids[-1] if ids else 0
+        size = index.max_id + 1
+        index.all = to_bitmap(ids, size)
+
+        threshold = max(1, size // 256)
+        for facet, groups in zip(FACETS, members):
+            column = array('I', [0]) * size
+            for value, member_ids in groups.items():
+                code = index.code(facet, value)
+                if not code:
+                    continue
+                for user_id in member_ids:
+                    column[user_id] = code
+                if len(member_ids) >= threshold:
+                    index.dense[facet][code] = to_bitmap(member_ids, size)
+                else:
+                    index.sparse[facet][code] = array('I', member_ids)
+            index.columns[facet] = column
+        return index
+
+    def code(self, facet, value):
+        if not value:
+            return 0
+        code = self.codes[facet].get(value)
+        if code is None:
+            code = self.codes[facet][value] = len(self.values[facet])
+            self.values[facet].append(value)
+        return code
+
+    def age(self):
+        return time.monotonic() - self.built_at
+
+    # ==========================================================================
+    # KEEPING UP
+    # ==========================================================================
+
+    def add_new_users(self):
+        """Index users created since the last read"""
+        # SQL: SELECT id, country, institution, field, user_type FROM user
+        #      WHERE id > <max indexed id> ORDER BY id;
+        rows = list(User.objects.filter(id__gt=self.max_id).order_by('id').values_list('id', *FACETS))
+        for user_id, *values in rows:
+            self.set(user_id, dict(zip(FACETS, values)))
+
+    def set(self, user_id, values):
+        """Put user_id under these facet values (None: remove the user)"""
+        with self.lock:
+            if user_id > self.max_id:
+                for column in self.columns.values():
+                    column.extend(array('I', [0]) * (user_id - self.max_id))
+                self.max_id = user_id
+            bit = 1 << user_id
+            self.all = self.all | bit if values else self.all & ~bit
+            for facet in FACETS:
+                column = self.columns[facet]
+                old = column[user_id]
+                new = self.code(facet, values[facet]) if values else 0
+                if old == new:
+                    continue
+                if old:
+                    self.remove(facet, old, user_id)
+                if new:
+                    self.insert(facet, new, user_id)
+                column[user_id] = new
+
+    def insert(self, facet, code, user_id):
+        if code in self.dense[facet]:
+            self.dense[facet][code] |= 1 << user_id
+            return
+        ids = self.sparse[facet].setdefault(code, array('I'))
+        position = bisect_right(ids, user_id)
+        if not position or ids[position - 1] != user_id:
+            ids.insert(position, user_id)
+
+    def remove(self, facet, code, user_id):
+        if code in self.dense[facet]:
+            self.dense[facet][code] &= ~(1 << user_id)
+            return
+        ids = self.sparse[facet].get(code)
+        if ids is not None:
+            position = bisect_right(ids, user_id)
+            if position and ids[position - 1] == user_id:
+                del ids[position - 1]
+
+    # ==========================================================================
+    # QUERYING
+    # ==========================================================================
+
+    def search(self, filters, limit, after=0, page_size=50):
+        """
+        filters: {facet: value}. Returns (matching users, {facet: [(value, count)]}
+        with the `limit` largest counts, ids of the next `page_size` users after `after`).
+        """
+        with self.lock:
+            bitmap, ids = self.match(filters)
+            if ids is None and bitmap.bit_count() <= (self.max_id + 1) // 32:
+                ids = bitmap_ids(bitmap)
+
+            # A filtered facet has one value left: the chosen one
+            counted = [facet for facet in FACETS if facet not in filters]
+            if ids is not None:
+                total = len(ids)
+                counts = {facet: self.count_ids(facet, ids, limit) for facet in counted}
+                start = bisect_right(ids, after)
+                page = ids[start:start + page_size]
+            else:
+                total = bitmap.bit_count()
+                data = bitmap.to_bytes((self.max_id + 8) // 8, 'little')
+                counts = {facet: self.count_bitmap(facet, bitmap, data, limit) for facet in counted}
+                page = first_ids(bitmap, after, page_size)
+            for facet, value in filters.items():
+                counts[facet] = [(value, total)] if total else []
+        return total, counts, page
+
+    def match(self, filters):
+        """(bitmap, None) or (None, sorted ids) of the users matching every filter"""
+        bitmaps, arrays = [], []
+        for facet, value in filters.items():
+            code = self.codes[facet].get(value)
+            if code in self.dense[facet]:
+                bitmaps.append(self.dense[facet][code])
+            elif code in self.sparse[facet]:
+                arrays.append(self.sparse[facet][code])
+            else:
+                return None, []
+
+        bitmap = self.all
+        for other in bitmaps:
+            bitmap &= other
+        if not arrays:
+            return bitmap, None
+
+        # A rare value bounds the result: filter its ids by the other filters
+        arrays.sort(key=len)
+        data = bitmap.to_bytes((self.max_id + 8) // 8, 'little')
+        others = [set(other) for other in arrays[1:]]
+        ids = [
+            i for i in arrays[0]
+            if data[i >> 3] >> (i & 7) & 1 and all(i in other for other in others)
+        ]
+        return None, ids
+
+    def count_ids(self, facet, ids, limit):
+        column = self.columns[facet]
+        counts = Counter(column[i] for i in ids)
+        counts.pop(0, None)
+        return [(self.values[facet][code], count) for code, count in top(counts.items(), limit)]
+
+    def count_bitmap(self, facet, bitmap, data, limit):
+        counts = {code: (bitmap & other).bit_count() for code, other in self.dense[facet].items()}
+        best = top([(code, count) for code, count in counts.items() if count], limit)
+        # Rare values, largest first; stop once none left can make the top `limit`
+        for code, ids in sorted(self.sparse[facet].items(), key=lambda item: -len(item[1])):
+            if len(best) >= limit and len(ids) <= best[-1][1]:
+                break
+            count = sum(data[i >> 3] >> (i & 7) & 1 for i in ids)
+            if count:
+                best = top(best + [(code, count)], limit)
+        return [(self.values[facet][code], count) for code, count in best if count]
+
+
+def top(items, limit):
+    return sorted(items, key=lambda item: (-item[1], item[0]))[:limit]
+
+
+_index = None
+_index_lock = threading.Lock()
+_rebuilding = False
+
+
+def max_age():
+    return getattr(settings, 'FACET_INDEX_MAX_AGE', 300)
+
+
+def get_index():
+    """This process's index: built on first use, rebuilt in the background once stale"""
+    global _index, _rebuilding
+    with _index_lock:
+        if _index is None:
+            _index = FacetIndex.build()
+            return _index
+        index = _index
+        stale = index.age() > max_age() and not _rebuilding
+        if stale:
+            _rebuilding = True
+    if stale:
+        threading.Thread(target=rebuild_index, daemon=True).start()
+    index.add_new_users()
+    return index
+
+
+def warm_up():
+    """Build this process's index now if FACET_INDEX_WARMUP is on; returns it (None when off)"""
+    if not getattr(settings, 'FACET_INDEX_WARMUP', False):
+        return None
+    return get_index()
+
+
+def rebuild_index():
+    global _index, _rebuilding
+    try:
+        index = FacetIndex.build()
+        with _index_lock:
+            _index = index
+    finally:
+        _rebuilding = False
+        connections.close_all()
+
+
+def user_written(user_id, values):
+    """Apply a committed User write to this process's index, if it has one"""
+    if _index is not None:
+        _index.set(user_id, values)
@@ -0,0 +1,193 @@
+"""
+FIELD SURROGATE KEY BACKFILL
+============================
+Helpers for moving field.name (VARCHAR(200) primary key) to an integer
+surrogate key. Used by migrations 0005/0006/0017 and by the
+backfill_field_keys management command, so the slow part can run online
+before the swap. MySQL and SQLite only: on any other backend 0006 refuses
+before changing anything.
+
+ROLLOUT:
+1. migrate core 0004   -> adds nullable field.surrogate_id, subfield.field_ref_id
+                          and project.field_ref_id (no table rebuild, no locks
+                          beyond the metadata change)
+2. manage.py backfill_field_keys
+                       -> fills the new columns in small id-range batches,
+                          each in its own short transaction; safe to re-run
+3. migrate core 0005   -> same backfill (no-op if step 2 already ran)
+4. migrate core 0006   -> catch-up pass for rows written since step 2, then
+                          swaps the keys. Not free: on MySQL dropping the old
+                          VARCHAR columns and making field_id NOT NULL rebuild
+                          subfield and project (online, reads and writes go
+                          on), and the primary key change locks `field`
+                          (one row per research field) for a moment
+5. migrate core 0017   -> adds the foreign key constraints. On MySQL an
+                          orphan check (a plain SELECT) first, then each
+                          constraint is added in place without validating
+                          the rows (ALGORITHM=INPLACE, LOCK=NONE): letting
+                          MySQL validate would copy `project` under a lock.
+                          SQLite rebuilds both tables.
+
+Everything here is raw SQL on purpose: these columns only exist between
+migrations 0004 and 0006, so the current models can't be used.
+"""
+import time
+
+from django.db import NotSupportedError, migrations
+
+# Tables whose field_id points at field.name
+REFERENCING_TABLES = ['subfield', 'project']
+
+
+def assign_surrogate_ids(connection):
+    """Give every field without one the next integer id (ordered by name)"""
+    # SQL: SELECT name FROM field WHERE surrogate_id IS NULL ORDER BY name;
+    # SQL: UPDATE field SET surrogate_id = <n> WHERE name = <name>;
+    qn = connection.ops.quote_name
+    with connection.cursor() as cursor:
+        cursor.execute(f"SELECT COALESCE(MAX({qn('surrogate_id')}), 0) FROM {qn('field')}")
+        next_id = cursor.fetchone()[0] + 1
+        cursor.execute(
+            f"SELECT {qn('name')} FROM {qn('field')} "
+            f"WHERE {qn('surrogate_id')} IS NULL ORDER BY {qn('name')}"
+        )
+        names = [row[0] for row in cursor.fetchall()]
+        for name in names:
+            cursor.execute(
+                f"UPDATE {qn('field')} SET {qn('surrogate_id')} = %s WHERE {qn('name')} = %s",
+                [next_id, name],
+            )
+            next_id += 1
+    return len(names)
+
+
+def backfill_table(connection, table, batch_size=1000, pause=0.0):
+    """
+    Copy field.surrogate_id into <table>.field_ref_id in id-range batches.
+
+    Each batch is one short UPDATE over at most batch_size primary keys, so
+    row locks are held only briefly. Rows that already have field_ref_id are
+    skipped, which makes the pass resumable. Yields the rows updated per batch.
+    """
+    # SQL: UPDATE <table> SET field_ref_id = (
+    #          SELECT field.surrogate_id FROM field WHERE field.name = <table>.field_id
+    #      )
+    #      WHERE id >= <lo> AND id < <hi> AND field_ref_id IS NULL;
+    qn = connection.ops.quote_name
+    with connection.cursor() as cursor:
+        cursor.execute(f"SELECT MIN({qn('id')}), MAX({qn('id')}) FROM {qn(table)}")
+        low, high = cursor.fetchone()
+    if low is None:
+        return
+
+    sql = (
+        f"UPDATE {qn(table)} SET {qn('field_ref_id')} = ("
+        f"SELECT {qn('field')}.{qn('surrogate_id')} FROM {qn('field')} "
+        f"WHERE {qn('field')}.{qn('name')} = {qn(table)}.{qn('field_id')}"
+        f") WHERE {qn('id')} >= %s AND {qn('id')} < %s AND {qn('field_ref_id')} IS NULL"
+    )
+    for start in range(low, high + 1, batch_size):
+        with connection.cursor() as cursor:
+            cursor.execute(sql, [start, start + batch_size])
+            yield cursor.rowcount
+        if pause:
+            time.sleep(pause)
+
+
+def backfill_all(connection, batch_size=1000, pause=0.0, log=None):
+    """Run the whole backfill; returns {table: rows updated}"""
+    assigned = assign_surrogate_ids(connection)
+    if log:
+        log(f'field: assigned {assigned} surrogate ids')
+    totals = {}
+    for table in REFERENCING_TABLES:
+        totals[table] = 0
+        for updated in backfill_table(connection, table, batch_size, pause):
+            totals[table] += updated
+        if log:
+            log(f'{table}: backfilled {totals[table]} rows')
+    return totals
+
+
+# ==============================================================================
+# PRIMARY KEY SWAP (migration 0006)
+# ==============================================================================
+# Once nothing references field.name any more, turn surrogate_id into the
+# primary key and keep name as a UNIQUE column.
+
+SWAP_SQL = {
+    'mysql': [
+        "ALTER TABLE `field` DROP PRIMARY KEY, "
+        "CHANGE `surrogate_id` `id` bigint NOT NULL AUTO_INCREMENT PRIMARY KEY, "
+        "ADD CONSTRAINT `field_name_uniq` UNIQUE (`name`)",
+    ],
+    'sqlite': [
+        # SQLite can't alter a primary key in place; the table has one row per
+        # research field, so rebuilding it is instant
+        'CREATE TABLE "field__new" ('
+        '"id" integer NOT NULL PRIMARY KEY AUTOINCREMENT, '
+        '"name" varchar(200) NOT NULL UNIQUE)',
+        'INSERT INTO "field__new" ("id", "name") SELECT "surrogate_id", "name" FROM "field"',
+        'DROP TABLE "field"',
+        'ALTER TABLE "field__new" RENAME TO "field"',
+    ],
+}
+
+
+def check_vendor(apps, schema_editor):
+    """First step of 0006: refuse, before anything is dropped, on a backend the swap has no SQL for"""
+    vendor = schema_editor.connection.vendor
+    if vendor not in SWAP_SQL:
+        raise NotSupportedError(
+            f'The field key swap (migration 0006) supports {" and ".join(sorted(SWAP_SQL))}, not {vendor}. '
+            'Nothing has been changed; migrate this database from a dump of a supported one.'
+        )
+
+
+def swap_primary_key(apps, schema_editor):
+    for statement in SWAP_SQL[schema_editor.connection.vendor]:
+        schema_editor.execute(statement)
+
+
+# ==============================================================================
+# FOREIGN KEY CONSTRAINTS (migration 0017)
+# ==============================================================================
+
+class AddFieldForeignKey(migrations.AlterField):
+    """AlterField that, on MySQL, adds the constraint online instead of letting Django copy the table"""
+
+    def database_forwards(self, app_label, schema_editor, from_state, to_state):
+        if schema_editor.connection.vendor == 'mysql':
+            add_foreign_key_online(schema_editor, self.model_name_lower)
+        else:
+            super().database_forwards(app_label, schema_editor, from_state, to_state)
+
+
+def add_foreign_key_online(schema_editor, table):
+    """MySQL: check for orphans, then add the constraint without a table copy"""
+    # SQL: SELECT COUNT(*) FROM <table> LEFT JOIN field ON field.id = <table>.field_id
+    #      WHERE field.id IS NULL;
+    # SQL: SET SESSION foreign_key_checks = 0;
+    # SQL: ALTER TABLE <table> ADD CONSTRAINT <table>_field_id_fk_field_id
+    #      FOREIGN KEY (field_id) REFERENCES field (id), ALGORITHM=INPLACE, LOCK=NONE;
+    # SQL: SET SESSION foreign_key_checks = 1;
+    qn = schema_editor.connection.ops.quote_name
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(
+            f"SELECT COUNT(*) FROM {qn(table)} LEFT JOIN {qn('field')} "
+            f"ON {qn('field')}.{qn('id')} = {qn(table)}.{qn('field_id')} WHERE {qn('field')}.{qn('id')} IS NULL"
+        )
+        orphans = cursor.fetchone()[0]
+    if orphans:
+        raise NotSupportedError(f'{orphans} {table} rows point at no field; fix them and run migrate again')
+    # With checks off InnoDB adds the constraint as metadata only (the
+    # SELECT above did the validation); with them on it copies the table
+    schema_editor.execute('SET SESSION foreign_key_checks = 0')
+    try:
+        schema_editor.execute(
+            f"ALTER TABLE {qn(table)} ADD CONSTRAINT {qn(f'{table}_field_id_fk_field_id')} "
+            f"FOREIGN KEY ({qn('field_id')}) REFERENCES {qn('field')} ({qn('id')}), "
+            f"ALGORITHM=INPLACE, LOCK=NONE"
+        )
+    finally:
+        schema_editor.execute('SET SESSION foreign_key_checks = 1')
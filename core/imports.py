@@ -0,0 +1,314 @@
+"""
+BULK IMPORT
+===========
+Loads large CSV / JSON Lines catalogs of problems and researchers. Used by
+`manage.py import_data` and by the "Import" button on the Problem and User
+admin pages.
+
+- Streams the file row by row (plain or .gz), so memory only holds one batch.
+- Subfield names are resolved through one map loaded up front
+  (SELECT id, name, field name FROM subfield) instead of a query per row.
+- Rows are validated with the model's field validation; bad rows are
+  reported with their line number and skipped.
+- Valid rows are upserted by natural key in batches with
+  bulk_create(update_conflicts=True), one transaction per batch:
+      users    -> email, lowercased (User.save() stores every email that
+                  way, and migration 0018 lowercased the existing ones)
+      problems -> (subfield, name)
+"""
+import csv
+import gzip
+import io
+import json
+import time
+from abc import ABC, abstractmethod
+
+from django.core.exceptions import ValidationError
+from django.db import connection, transaction
+
+from .models import User, Problem, Subfield
+from . import facets
+from .rollups import queue_refresh
+from .versions import bump
+
+MAX_REPORTED_ERRORS = 50
+
+
+class ImportFileError(Exception):
+    """Raised for an unusable import (unknown kind or file format)"""
+
+
+class RowError(Exception):
+    """Raised by clean() for a single invalid row"""
+
+
+def value(row, name, default=''):
+    """Column value as a stripped string (JSONL rows may hold numbers/null)"""
+    raw = row.get(name)
+    return default if raw is None else str(raw).strip()
+
+
+# ==============================================================================
+# READING
+# ==============================================================================
+
+def detect_format(filename):
+    name = filename.lower()
+    if name.endswith('.gz'):
+        name = name[:-3]
+    if name.endswith('.csv'):
+        return 'csv'
+    if name.endswith(('.jsonl', '.ndjson', '.json')):
+        return 'jsonl'
+    raise ImportFileError(f'Cannot tell the format of {filename} (use .csv or .jsonl)')
+
+
+def open_text(fileobj, filename):
+    """Wrap a binary file object as text, decompressing .gz on the fly"""
+    if filename.lower().endswith('.gz'):
+        fileobj = gzip.GzipFile(fileobj=fileobj)
+    return io.TextIOWrapper(fileobj, encoding='utf-8-sig', newline='')
+
+
+def read_rows(text, fmt):
+    """Yield (line number, dict) for every row of the file"""
+    if fmt == 'csv':
+        reader = csv.DictReader(text)
+        for row in reader:
+            yield reader.line_num, row
+    else:
+        for line_num, line in enumerate(text, start=1):
+            if not line.strip():
+                continue
+            try:
+                row = json.loads(line)
+            except ValueError as error:
+                yield line_num, RowError(f'Invalid JSON: {error}')
+                continue
+            yield line_num, row if isinstance(row, dict) else RowError('Expected a JSON object')
+
+
+# ==============================================================================
+# IMPORTERS
+# ==============================================================================
+
+class Importer(ABC):
+    """
+    How one kind of row becomes a model instance.
+
+    unique_fields: natural key (must match a unique constraint)
+    update_fields: columns overwritten when the natural key already exists
+    required:      columns every row must have
+    """
+    model = None
+    unique_fields = []
+    update_fields = []
+    required = []
+    # Resource version keys bumped after an import (see core/versions.py)
+    version_keys = []
+
+    def prepare(self):
+        """Load whatever lookups clean() needs, once per import"""
+
+    def finish(self):
+        """After the last batch: redo what post_save signals would have done"""
+        if self.version_keys:
+            bump(*self.version_keys)
+
+    @abstractmethod
+    def clean(self, row):
+        """Unsaved model instance for one row (dict of column -> value); raises RowError"""
+
+    def key(self, instance):
+        return tuple(getattr(instance, name) for name in self.unique_fields)
+
+    def validate(self, instance, exclude=()):
+        # No uniqueness/constraint checks: those are the upsert's job, and
+        # would cost a query per row
+        try:
+            instance.full_clean(exclude=list(exclude), validate_unique=False, validate_constraints=False)
+        except ValidationError as error:
+            raise RowError('; '.join(
+                f'{name}: {" ".join(messages)}' for name, messages in error.message_dict.items()
+            ))
+        return instance
+
+
+class UserImporter(Importer):
+    model = User
+    unique_fields = ['email']
+    update_fields = ['name', 'user_type', 'institution', 'country', 'field', 'rating']
+    required = ['name', 'email', 'institution', 'country', 'field']
+    version_keys = ['users']
+
+    def prepare(self):
+        self.institutions = set()
+        self.facet_values = set()
+
+    def finish(self):
+        super().finish()
+        queue_refresh(institutions=self.institutions)
+        facets.queue_update(recount=self.facet_values)
+
+    def clean(self, row):
+        user = User(
+            name=value(row, 'name'),
+            # bulk_create skips save(), so lowercase here
+            email=value(row, 'email').lower(),
+            user_type=value(row, 'user_type') or 'researcher',
+            institution=value(row, 'institution'),
+            country=value(row, 'country'),
+            field=value(row, 'field'),
+            rating=value(row, 'rating') or 0,
+        )
+        user = self.validate(user)
+        self.institutions.add(user.institution)
+        self.facet_values.update((facet, getattr(user, facet)) for facet in facets.FACETS)
+        return user
+
+
+class ProblemImporter(Importer):
+    model = Problem
+    unique_fields = ['subfield', 'name']
+    update_fields = ['description', 'severity', 'severity_rank', 'current_work', 'done_work', 'gaps']
+    required = ['name', 'description', 'subfield']
+    # 'taxonomy' is part of every problem page's keys
+    version_keys = ['taxonomy']
+
+    def prepare(self):
+        # SQL: SELECT subfield.id, subfield.name, field.name
+        #      FROM subfield JOIN field ON subfield.field_id = field.id;
+        self.by_field = {}
+        self.by_name = {}
+        self.subfield_ids = set()
+        for subfield_id, name, field_name in Subfield.objects.values_list('id', 'name', 'field__name'):
+            self.by_field[(field_name, name)] = subfield_id
+            # Same subfield name under two fields -> rows must say which field
+            self.by_name[name] = None if name in self.by_name else subfield_id
+
+    def subfield_id(self, row):
+        name = value(row, 'subfield')
+        field_name = value(row, 'field')
+        if field_name:
+            subfield_id = self.by_field.get((field_name, name))
+        else:
+            subfield_id = self.by_name.get(name)
+            if subfield_id is None and name in self.by_name:
+                raise RowError(f'Subfield "{name}" exists in several fields; add a field column')
+        if subfield_id is None:
+            raise RowError(f'Unknown subfield: {name}')
+        return subfield_id
+
+    def clean(self, row):
+        severity = (value(row, 'severity') or 'medium').lower()
+        problem = Problem(
+            name=value(row, 'name'),
+            description=value(row, 'description'),
+            severity=severity,
+            current_work=value(row, 'current_work'),
+            done_work=value(row, 'done_work'),
+            gaps=value(row, 'gaps'),
+            subfield_id=self.subfield_id(row),
+        )
+        # subfield came from the preloaded map; validating the FK would query
+        problem = self.validate(problem, exclude=['subfield'])
+        self.subfield_ids.add(problem.subfield_id)
+        return problem
+
+    def finish(self):
+        super().finish()
+        queue_refresh(subfield_ids=self.subfield_ids)
+
+    def key(self, instance):
+        return (instance.subfield_id, instance.name)
+
+
+IMPORTERS = {
+    'users': UserImporter,
+    'problems': ProblemImporter,
+}
+
+
+# ==============================================================================
+# RUNNING AN IMPORT
+# ==============================================================================
+
+class ImportReport:
+    def __init__(self):
+        self.rows = 0
+        self.upserted = 0
+        self.invalid = 0
+        self.batches = 0
+        self.errors = []    # (line number, message), first MAX_REPORTED_ERRORS
+        self.seconds = 0.0
+
+    @property
+    def rows_per_second(self):
+        return self.rows / self.seconds if self.seconds else 0.0
+
+    def error(self, line_num, message):
+        self.invalid += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append((line_num, message))
+
+    def summary(self):
+        return (
+            f'{self.rows} rows: {self.upserted} upserted, {self.invalid} invalid '
+            f'in {self.batches} batches, {self.seconds:.1f}s ({self.rows_per_second:.0f} rows/s)'
+        )
+
+
+def write_batch(importer, batch):
+    """Upsert one batch of instances in a single INSERT ... ON CONFLICT/DUPLICATE KEY"""
+    # SQL (MySQL):  INSERT INTO <table> (...) VALUES (...), (...)
+    #               ON DUPLICATE KEY UPDATE <col> = VALUES(<col>), ...;
+    # SQL (others): INSERT INTO <table> (...) VALUES (...), (...)
+    #               ON CONFLICT (<natural key>) DO UPDATE SET <col> = EXCLUDED.<col>, ...;
+    # The same key twice in one statement is an error on some backends: last row wins
+    rows = list({importer.key(instance): instance for instance in batch}.values())
+    options = {'update_conflicts': True, 'update_fields': importer.update_fields}
+    if connection.features.supports_update_conflicts_with_target:
+        options['unique_fields'] = importer.unique_fields
+    with transaction.atomic():
+        importer.model.objects.bulk_create(rows, **options)
+    return len(rows)
+
+
+def run_import(kind, text, fmt, batch_size=1000, dry_run=False, progress=None):
+    """Import every row of an open text stream; returns an ImportReport"""
+    if kind not in IMPORTERS:
+        raise ImportFileError(f'Unknown import kind: {kind}')
+    importer = IMPORTERS[kind]()
+    importer.prepare()
+    report = ImportReport()
+    start = time.perf_counter()
+
+    batch = []
+    for line_num, row in read_rows(text, fmt):
+        report.rows += 1
+        try:
+            if isinstance(row, RowError):
+                raise row
+            missing = [name for name in importer.required if not value(row, name)]
+            if missing:
+                raise RowError(f'Missing {", ".join(missing)}')
+            batch.append(importer.clean(row))
+        except RowError as error:
+            report.error(line_num, str(error))
+            continue
+
+        if len(batch) >= batch_size:
+            report.upserted += 0 if dry_run else write_batch(importer, batch)
+            report.batches += 1
+            batch = []
+            if progress:
+                progress(report)
+    if batch:
+        report.upserted += 0 if dry_run else write_batch(importer, batch)
+        report.batches += 1
+
+    report.seconds = time.perf_counter() - start
+    # bulk_create sends no post_save signals
+    if report.upserted:
+        importer.finish()
+    return report
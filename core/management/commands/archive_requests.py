@@ -0,0 +1,27 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from core.archive import archive_resolved
+
+
+class Command(BaseCommand):
+    help = 'Move resolved collaboration requests into the archive table in batches'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--older-than-days', type=int, default=None,
+                            help=f'Default: COLLABORATION_ARCHIVE_AFTER_DAYS '
+                                 f'({getattr(settings, "COLLABORATION_ARCHIVE_AFTER_DAYS", 90)})')
+        parser.add_argument('--batch-size', type=int, default=1000, help='Rows moved per transaction')
+        parser.add_argument('--max-batches', type=int, default=None, help='Stop after this many batches')
+        parser.add_argument('--pause', type=float, default=0.0, help='Seconds to sleep between batches')
+
+    def handle(self, *args, **options):
+        self.stdout.write('🗄️  Archiving resolved collaboration requests...')
+        total = archive_resolved(
+            older_than_days=options['older_than_days'],
+            batch_size=options['batch_size'],
+            max_batches=options['max_batches'],
+            pause=options['pause'],
+            log=lambda message: self.stdout.write(f'   {message}'),
+        )
+        self.stdout.write(self.style.SUCCESS(f'✅ Archived {total} requests'))
@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from core.field_keys import backfill_all
+
+
+class Command(BaseCommand):
+    help = 'Backfill field surrogate keys in small batches (run between migrations 0004 and 0006)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help='Rows per UPDATE')
+        parser.add_argument('--pause', type=float, default=0.05, help='Seconds to sleep between batches')
+
+    def handle(self, *args, **options):
+        with connection.cursor() as cursor:
+            columns = [col.name for col in connection.introspection.get_table_description(cursor, 'field')]
+        if 'surrogate_id' not in columns:
+            raise CommandError('field.surrogate_id does not exist: run "migrate core 0004" first, '
+                               'or the key swap (0006) has already been applied.')
+
+        self.stdout.write('🔑 Backfilling field surrogate keys...')
+        backfill_all(
+            connection,
+            batch_size=options['batch_size'],
+            pause=options['pause'],
+            log=lambda message: self.stdout.write(f'   {message}'),
+        )
+        self.stdout.write(self.style.SUCCESS('✅ Backfill complete. Now run "migrate core 0006".'))
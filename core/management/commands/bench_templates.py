@@ -0,0 +1,94 @@
+import time
+
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser
+from django.core.management.base import BaseCommand, CommandError
+from django.template import Engine
+from django.template.backends.django import get_installed_libraries
+from django.test import RequestFactory
+
+from core import archive
+from core.models import User, Post, CollaborationRequest
+from core.streaming import Slot, stream_page
+
+UNCACHED_LOADERS = [
+    'django.template.loaders.filesystem.Loader',
+    'django.template.loaders.app_directories.Loader',
+]
+
+
+class Command(BaseCommand):
+    help = 'Compare render time of feed.html and notifications.html with and without the cached loader'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=200, help='Renders per template and loader')
+        parser.add_argument('--user', type=int, default=None, help='Render as this user id (default: first user)')
+
+    def handle(self, *args, **options):
+        user = User.objects.order_by('id').first() if options['user'] is None else User.objects.filter(id=options['user']).first()
+        if user is None:
+            raise CommandError('No user to render as; run generate_data first')
+
+        request = RequestFactory().get('/')
+        request.session = {'user_id': user.id, 'user_name': user.name, 'user_type': user.user_type}
+        request.user = AnonymousUser()
+
+        # Querysets are evaluated once up front, so only template work is timed
+        posts = list(Post.objects.all().select_related('author'))
+        pending = list(CollaborationRequest.objects.filter(
+            receiver_id=user.id, status='pending').select_related('sender', 'project', 'post'))
+        accepted = archive.history(user.id, 'accepted')
+        rejected = archive.history(user.id, 'rejected')
+        pages = {
+            'core/feed.html': (
+                {'pending_requests_count': len(pending)},
+                {'posts': ('core/_post.html', 'post', posts)},
+            ),
+            'core/notifications.html': ({}, {
+                'pending': ('core/_pending_request.html', 'request', pending),
+                'accepted': ('core/_accepted_request.html', 'request', accepted),
+                'rejected': ('core/_rejected_request.html', 'request', rejected),
+            }),
+        }
+
+        engines = {
+            'uncached': self.engine(UNCACHED_LOADERS),
+            'cached': self.engine([('django.template.loaders.cached.Loader', UNCACHED_LOADERS)]),
+        }
+
+        iterations = options['iterations']
+        self.stdout.write(f'⏱️  Rendering each template {iterations} times as {user.name}...')
+        self.stdout.write(self.style.SUCCESS('=' * 60))
+        self.stdout.write(f"{'template':28}{'uncached':>10}{'cached':>10}{'speedup':>10}")
+        for name, page in pages.items():
+            timings = {label: self.time_renders(engine, name, request, page, iterations)
+                       for label, engine in engines.items()}
+            speedup = timings['uncached'] / timings['cached'] if timings['cached'] else float('inf')
+            self.stdout.write(
+                f"{name:28}{timings['uncached']:>8.2f}ms{timings['cached']:>8.2f}ms{speedup:>9.1f}x"
+            )
+        self.stdout.write(self.style.SUCCESS('=' * 60))
+        self.stdout.write('(mean per request: get_template() + render() of the page and its items)')
+
+    def engine(self, loaders):
+        options = settings.TEMPLATES[0].get('OPTIONS', {})
+        return Engine(
+            dirs=settings.TEMPLATES[0].get('DIRS', []),
+            context_processors=options.get('context_processors', []),
+            loaders=loaders,
+            libraries=get_installed_libraries(),
+        )
+
+    def render(self, engine, name, request, page):
+        # Like a request: look the templates up, then render the page and stream its items
+        context, slots = page
+        slots = {slot: Slot(rows, template, as_name) for slot, (template, as_name, rows) in slots.items()}
+        return ''.join(stream_page(request, name, context, slots, load=engine.get_template))
+
+    def time_renders(self, engine, name, request, page, iterations):
+        # One untimed render: the cached engine compiles here, like a warm-up
+        self.render(engine, name, request, page)
+        start = time.perf_counter()
+        for _ in range(iterations):
+            self.render(engine, name, request, page)
+        return (time.perf_counter() - start) * 1000 / iterations
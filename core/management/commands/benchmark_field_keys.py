@@ -0,0 +1,138 @@
+import random
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+FIELD_NAMES = ['Computer Science', 'Biology', 'Physics', 'Chemistry', 'Mathematics']
+
+
+class Command(BaseCommand):
+    help = 'Compare join cost and index size of VARCHAR vs integer field keys on scratch tables'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=200000, help='Project rows per variant')
+        parser.add_argument('--fields', type=int, default=50, help='Distinct fields')
+        parser.add_argument('--repeat', type=int, default=5, help='Timed runs per query (best is reported)')
+
+    def handle(self, *args, **options):
+        rows, repeat = options['rows'], options['repeat']
+        names = [f'{random.choice(FIELD_NAMES)} {i}' for i in range(options['fields'])]
+        variants = {
+            'varchar': ('bench_field_str', 'bench_project_str', 'VARCHAR(200)', 'name'),
+            'integer': ('bench_field_int', 'bench_project_int', 'BIGINT', 'id'),
+        }
+
+        self.stdout.write(f'📊 Building scratch tables ({rows} projects, {len(names)} fields)...')
+        results = {}
+        try:
+            for label, (field_table, project_table, key_type, key_column) in variants.items():
+                self.create_tables(field_table, project_table, key_type)
+                self.fill(field_table, project_table, names, rows, use_ids=(key_column == 'id'))
+                results[label] = {
+                    'join_ms': self.time_join(field_table, project_table, key_column, repeat),
+                    'lookup_ms': self.time_lookup(field_table, project_table, key_column, names[0], repeat),
+                    'index_bytes': self.index_size(project_table, f'{project_table}_field'),
+                }
+        finally:
+            self.drop_tables(variants)
+
+        self.stdout.write(self.style.SUCCESS('\n' + '=' * 60))
+        self.stdout.write(f"{'':10}{'join (ms)':>14}{'lookup (ms)':>14}{'fk index':>16}")
+        for label, result in results.items():
+            size = result['index_bytes']
+            size = f'{size / 1024:.0f} KiB' if size is not None else 'n/a'
+            self.stdout.write(f"{label:10}{result['join_ms']:>14.1f}{result['lookup_ms']:>14.2f}{size:>16}")
+        self.stdout.write(self.style.SUCCESS('=' * 60))
+
+    # ------------------------------------------------------------------
+    # Table setup
+    # ------------------------------------------------------------------
+
+    def create_tables(self, field_table, project_table, key_type):
+        with connection.cursor() as cursor:
+            if key_type == 'BIGINT':
+                cursor.execute(f'CREATE TABLE {field_table} (id BIGINT PRIMARY KEY, name VARCHAR(200) NOT NULL UNIQUE)')
+            else:
+                cursor.execute(f'CREATE TABLE {field_table} (name VARCHAR(200) PRIMARY KEY)')
+            cursor.execute(
+                f'CREATE TABLE {project_table} '
+                f'(id INTEGER PRIMARY KEY, field_id {key_type} NOT NULL, title VARCHAR(300) NOT NULL)'
+            )
+            cursor.execute(f'CREATE INDEX {project_table}_field ON {project_table} (field_id)')
+
+    def fill(self, field_table, project_table, names, rows, use_ids):
+        keys = list(range(1, len(names) + 1)) if use_ids else names
+        with connection.cursor() as cursor:
+            if use_ids:
+                cursor.executemany(f'INSERT INTO {field_table} (id, name) VALUES (%s, %s)', list(zip(keys, names)))
+            else:
+                cursor.executemany(f'INSERT INTO {field_table} (name) VALUES (%s)', [(name,) for name in names])
+            rng = random.Random(42)
+            batch = []
+            for i in range(1, rows + 1):
+                batch.append((i, keys[rng.randrange(len(keys))], f'Project {i}'))
+                if len(batch) == 5000:
+                    cursor.executemany(f'INSERT INTO {project_table} (id, field_id, title) VALUES (%s, %s, %s)', batch)
+                    batch = []
+            if batch:
+                cursor.executemany(f'INSERT INTO {project_table} (id, field_id, title) VALUES (%s, %s, %s)', batch)
+
+    def drop_tables(self, variants):
+        with connection.cursor() as cursor:
+            for field_table, project_table, _, _ in variants.values():
+                cursor.execute(f'DROP TABLE IF EXISTS {project_table}')
+                cursor.execute(f'DROP TABLE IF EXISTS {field_table}')
+
+    # ------------------------------------------------------------------
+    # Measurements
+    # ------------------------------------------------------------------
+
+    def best_of(self, sql, params, repeat):
+        best = None
+        with connection.cursor() as cursor:
+            for _ in range(repeat):
+                start = time.perf_counter()
+                cursor.execute(sql, params)
+                cursor.fetchall()
+                elapsed = (time.perf_counter() - start) * 1000
+                best = elapsed if best is None else min(best, elapsed)
+        return best
+
+    def time_join(self, field_table, project_table, key_column, repeat):
+        # Full join + group, like listing projects with their field name
+        sql = (
+            f'SELECT f.name, COUNT(*) FROM {project_table} p '
+            f'JOIN {field_table} f ON p.field_id = f.{key_column} GROUP BY f.name'
+        )
+        return self.best_of(sql, [], repeat)
+
+    def time_lookup(self, field_table, project_table, key_column, name, repeat):
+        # Filter by field name, like search_problems_view's subfield__field__name
+        sql = (
+            f'SELECT COUNT(*) FROM {project_table} p '
+            f'JOIN {field_table} f ON p.field_id = f.{key_column} WHERE f.name = %s'
+        )
+        return self.best_of(sql, [name], repeat)
+
+    def index_size(self, table, index):
+        """Size of the FK index in bytes, or None if the backend won't tell us"""
+        try:
+            with connection.cursor() as cursor:
+                if connection.vendor == 'sqlite':
+                    cursor.execute('SELECT SUM(pgsize) FROM dbstat WHERE name = %s', [index])
+                    return cursor.fetchone()[0]
+                if connection.vendor == 'mysql':
+                    cursor.execute(f'ANALYZE TABLE {table}')
+                    cursor.fetchall()
+                    cursor.execute(
+                        "SELECT stat_value * @@innodb_page_size FROM mysql.innodb_index_stats "
+                        "WHERE database_name = DATABASE() AND table_name = %s "
+                        "AND index_name = %s AND stat_name = 'size'",
+                        [table, index],
+                    )
+                    row = cursor.fetchone()
+                    return row[0] if row else None
+        except Exception:
+            return None
+        return None
@@ -0,0 +1,50 @@
+import sys
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core.exports import DATASETS, FORMATS, ExportError, export_stream
+
+
+class Command(BaseCommand):
+    help = 'Stream a dataset (users, projects, problems, posts, collaborations) to CSV or JSON Lines'
+
+    def add_arguments(self, parser):
+        parser.add_argument('dataset', choices=sorted(DATASETS))
+        parser.add_argument('--format', choices=sorted(FORMATS), default='csv')
+        parser.add_argument('--field', help='Only rows in this research field')
+        parser.add_argument('--subfield', help='Only rows in this subfield')
+        parser.add_argument('--since', help='Created on or after YYYY-MM-DD')
+        parser.add_argument('--until', help='Created on or before YYYY-MM-DD')
+        parser.add_argument('--gzip', action='store_true', help='Gzip the output')
+        parser.add_argument('--chunk-size', type=int, default=None, help='Rows per query (default EXPORT_CHUNK_SIZE)')
+        parser.add_argument('-o', '--output', help='Output file (default: stdout)')
+
+    def handle(self, *args, **options):
+        filters = {key: options[key] for key in ('field', 'subfield', 'since', 'until')}
+        try:
+            stream = export_stream(
+                options['dataset'], options['format'], filters,
+                gzip=options['gzip'], chunk_size=options['chunk_size'],
+            )
+        except ExportError as error:
+            raise CommandError(str(error))
+
+        start = time.perf_counter()
+        written = 0
+        out = open(options['output'], 'wb') if options['output'] else sys.stdout.buffer
+        try:
+            for chunk in stream:
+                out.write(chunk)
+                written += len(chunk)
+        finally:
+            if options['output']:
+                out.close()
+            else:
+                out.flush()
+
+        if options['output']:
+            elapsed = time.perf_counter() - start
+            self.stdout.write(self.style.SUCCESS(
+                f"✅ Wrote {written / 1024:.0f} KiB to {options['output']} in {elapsed:.1f}s"
+            ))
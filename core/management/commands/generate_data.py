@@ -1,4 +1,5 @@
 from django.core.management.base import BaseCommand
+from core.deletion import purge
 from core.models import Field, Subfield, User, Problem, Project, Post, CollaborationRequest
 import random
 
@@ -8,15 +9,11 @@ class Command(BaseCommand):
     def handle(self, *args, **kwargs):
         self.stdout.write('🚀 Starting data generation...')
         
-        # Clear existing data
+        # Clear existing data, in batches (core/deletion.py) rather than
+        # loading every row into Django's delete collector
         self.stdout.write('🗑️  Clearing existing data...')
-        CollaborationRequest.objects.all().delete()
-        Post.objects.all().delete()
-        Project.objects.all().delete()
-        Problem.objects.all().delete()
-        Subfield.objects.all().delete()
-        Field.objects.all().delete()
-        User.objects.all().delete()
+        for model in (CollaborationRequest, Post, Project, Problem, Subfield, Field, User):
+            purge(model)
         
         # ===================================================================
         # 1. CREATE FIELDS
@@ -0,0 +1,38 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from core.imports import IMPORTERS, ImportFileError, detect_format, open_text, run_import
+
+
+class Command(BaseCommand):
+    help = 'Upsert problems or researchers from a CSV / JSON Lines file (optionally .gz)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('kind', choices=sorted(IMPORTERS))
+        parser.add_argument('path', help='File to import (.csv, .jsonl, optionally .gz)')
+        parser.add_argument('--format', choices=['csv', 'jsonl'], help='Override the format taken from the file name')
+        parser.add_argument('--batch-size', type=int, default=1000, help='Rows per INSERT ... upsert')
+        parser.add_argument('--dry-run', action='store_true', help='Validate only, write nothing')
+
+    def handle(self, *args, **options):
+        path = options['path']
+        try:
+            fmt = options['format'] or detect_format(path)
+            self.stdout.write(f"📥 Importing {options['kind']} from {path}...")
+            with open(path, 'rb') as raw:
+                report = run_import(
+                    options['kind'], open_text(raw, path), fmt,
+                    batch_size=options['batch_size'],
+                    dry_run=options['dry_run'],
+                    progress=lambda report: self.stdout.write(
+                        f'   {report.rows} rows read, {report.upserted} upserted'
+                    ),
+                )
+        except (ImportFileError, OSError) as error:
+            raise CommandError(str(error))
+
+        for line_num, message in report.errors:
+            self.stdout.write(self.style.WARNING(f'   line {line_num}: {message}'))
+        if report.invalid > len(report.errors):
+            self.stdout.write(self.style.WARNING(f'   ... and {report.invalid - len(report.errors)} more invalid rows'))
+        prefix = '(dry run) ' if options['dry_run'] else ''
+        self.stdout.write(self.style.SUCCESS(f'✅ {prefix}{report.summary()}'))
@@ -0,0 +1,290 @@
+import http.client
+import random
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.cookies import SimpleCookie
+from urllib.parse import urlencode, urlsplit
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.test import Client
+from django.urls import Resolver404, resolve
+
+from core import template_cache
+from core.models import User, Field, Problem, Project, CollaborationRequest
+
+LOCAL_HOSTS = {'localhost', '127.0.0.1', '::1'}
+CSRF_INPUT_RE = re.compile(r'name="csrfmiddlewaretoken" value="([^"]+)"')
+
+# Login, logout and the collaboration links answer with a redirect
+EXPECTED_REDIRECTS = {302}
+
+
+def allowed_host():
+    """A Host header ALLOWED_HOSTS accepts ('localhost' for an empty list, valid with DEBUG on)"""
+    for pattern in settings.ALLOWED_HOSTS:
+        if pattern != '*':
+            # '.example.com' also matches example.com itself
+            return pattern.lstrip('.')
+    return 'localhost'
+
+
+def failed(status):
+    """Whether a response status counts as an error rather than a latency sample"""
+    return not (200 <= status < 300 or status in EXPECTED_REDIRECTS)
+
+
+def percentile(sorted_values, pct):
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, -(-len(sorted_values) * pct // 100))  # ceil(n * pct / 100)
+    return sorted_values[int(rank) - 1]
+
+
+# ==============================================================================
+# TRANSPORTS (one per virtual user)
+# ==============================================================================
+
+class InProcessTransport:
+    """Requests go straight through Django's handler (django.test.Client)"""
+
+    def __init__(self):
+        # Client's default Host, 'testserver', is rejected by ALLOWED_HOSTS
+        self.client = Client(HTTP_HOST=allowed_host())
+
+    def request(self, method, path, data=None):
+        if method == 'POST':
+            response = self.client.post(path, data or {})
+        else:
+            response = self.client.get(path)
+        if response.streaming:
+            # Streamed pages only run their list queries while being read
+            b''.join(response.streaming_content)
+        return response.status_code
+
+    def close(self):
+        # Each worker thread opened its own database connection
+        connections.close_all()
+
+
+class HttpTransport:
+    """A keep-alive HTTP/1.1 connection to a server on this machine, with its own cookies"""
+
+    def __init__(self, base_url):
+        parts = urlsplit(base_url)
+        self.host, self.port = parts.hostname, parts.port or 80
+        self.connection = http.client.HTTPConnection(self.host, self.port, timeout=30)
+        self.cookies = SimpleCookie()
+        self.csrf_token = None
+
+    def request(self, method, path, data=None):
+        headers = {}
+        if self.cookies:
+            headers['Cookie'] = '; '.join(f'{name}={morsel.value}' for name, morsel in self.cookies.items())
+        body = None
+        if method == 'POST':
+            data = dict(data or {}, csrfmiddlewaretoken=self.csrf_token or '')
+            body = urlencode(data)
+            headers['Content-Type'] = 'application/x-www-form-urlencoded'
+        try:
+            self.connection.request(method, path, body=body, headers=headers)
+            response = self.connection.getresponse()
+        except (http.client.HTTPException, OSError):
+            # Server closed the keep-alive connection: reconnect once
+            self.connection.close()
+            self.connection.request(method, path, body=body, headers=headers)
+            response = self.connection.getresponse()
+
+        content = response.read()
+        for header in response.headers.get_all('Set-Cookie') or []:
+            self.cookies.load(header)
+        match = CSRF_INPUT_RE.search(content.decode('utf-8', 'replace'))
+        if match:
+            self.csrf_token = match.group(1)
+        return response.status
+
+    def close(self):
+        self.connection.close()
+
+
+# ==============================================================================
+# RESULTS
+# ==============================================================================
+
+class Results:
+    """Latencies (ms) and status codes per URL name, and errors (exceptions, error statuses), shared by all workers"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.latencies = {}
+        self.statuses = {}
+        self.errors = {}
+
+    def add(self, url_name, millis, status):
+        with self.lock:
+            self.latencies.setdefault(url_name, []).append(millis)
+            counts = self.statuses.setdefault(url_name, {})
+            counts[status] = counts.get(status, 0) + 1
+
+    def error(self, url_name, error):
+        with self.lock:
+            key = (url_name, error)
+            self.errors[key] = self.errors.get(key, 0) + 1
+
+
+class Command(BaseCommand):
+    help = 'Replay concurrent user sessions against this app and report latency percentiles per URL name'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=10, help='Concurrent virtual users (threads)')
+        parser.add_argument('--sessions', type=int, default=20, help='Sessions each virtual user runs')
+        parser.add_argument('--duration', type=float, default=None,
+                            help='Stop after this many seconds instead of a fixed number of sessions')
+        parser.add_argument('--url', default=None,
+                            help='Base URL of a running server on this machine, e.g. http://127.0.0.1:8000 '
+                                 '(default: run the app in-process)')
+        parser.add_argument('--think-ms', type=float, default=0, help='Pause between requests of a session')
+        parser.add_argument('--seed', type=int, default=None, help='Random seed, for repeatable runs')
+
+    def handle(self, *args, **options):
+        if options['url']:
+            parts = urlsplit(options['url'])
+            if parts.scheme != 'http' or parts.hostname not in LOCAL_HOSTS:
+                raise CommandError('--url must be http:// on localhost, 127.0.0.1 or ::1')
+        else:
+            # The in-process app starts like a web process would (research_fb/wsgi.py)
+            template_cache.warm_up()
+        self.random = random.Random(options['seed'])
+        self.load_plan()
+
+        results = Results()
+        deadline = time.monotonic() + options['duration'] if options['duration'] else None
+        target = options['url'] or 'in-process app'
+        self.stdout.write(f"🚀 {options['users']} virtual users against {target}...")
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=options['users']) as pool:
+            futures = [
+                pool.submit(self.virtual_user, worker, options, deadline, results)
+                for worker in range(options['users'])
+            ]
+            for future in futures:
+                future.result()
+        elapsed = time.perf_counter() - start
+
+        self.report(results, elapsed)
+
+    # ==========================================================================
+    # SCENARIO
+    # ==========================================================================
+
+    def load_plan(self):
+        """Ids the sessions pick from, read once so workers don't query for them"""
+        self.user_ids = list(User.objects.values_list('id', flat=True))
+        if not self.user_ids:
+            raise CommandError('No users to log in as; run generate_data first')
+        self.field_names = list(Field.objects.values_list('name', flat=True))
+        self.problem_ids = list(Problem.objects.values_list('id', flat=True)[:5000])
+        self.open_projects = list(
+            Project.objects.filter(vacancy_status=True).values_list('id', 'owner_id')[:5000]
+        )
+        # Pending requests by receiver; a session accepts one of its own
+        self.pending = {}
+        for request_id, receiver_id in CollaborationRequest.objects.filter(
+            status='pending'
+        ).values_list('id', 'receiver_id'):
+            self.pending.setdefault(receiver_id, []).append(request_id)
+        self.pending_lock = threading.Lock()
+        connections.close_all()
+
+    def session_steps(self, rng, user_id):
+        """(method, path, data) requests of one user session"""
+        yield 'GET', '/', None
+        yield 'POST', '/', {'user_id': user_id}
+        yield 'GET', '/feed/', None
+        if self.field_names:
+            yield 'GET', '/problems/?' + urlencode({'field': rng.choice(self.field_names)}), None
+        if self.problem_ids:
+            yield 'GET', f'/problem/{rng.choice(self.problem_ids)}/', None
+        if self.open_projects:
+            project_id, owner_id = rng.choice(self.open_projects)
+            yield 'GET', f'/project/{project_id}/', None
+            if owner_id != user_id:
+                yield 'GET', f'/project/{project_id}/collaborate/', None
+        yield 'GET', '/notifications/', None
+        with self.pending_lock:
+            request_id = self.pending[user_id].pop() if self.pending.get(user_id) else None
+        if request_id is not None:
+            yield 'GET', f'/collaboration/{request_id}/accept/', None
+        yield 'GET', '/logout/', None
+
+    def virtual_user(self, worker, options, deadline, results):
+        rng = random.Random(self.random.random() + worker)
+        transport = HttpTransport(options['url']) if options['url'] else InProcessTransport()
+        think = options['think_ms'] / 1000
+        try:
+            sessions = 0
+            while (time.monotonic() < deadline) if deadline else (sessions < options['sessions']):
+                for method, path, data in self.session_steps(rng, rng.choice(self.user_ids)):
+                    url_name = self.url_name(path)
+                    started = time.perf_counter()
+                    try:
+                        status = transport.request(method, path, data)
+                    except Exception as exception:
+                        results.error(url_name, type(exception).__name__)
+                        continue
+                    if failed(status):
+                        # Not a latency sample: an error page is no measure of the real one
+                        results.error(url_name, f'HTTP {status}')
+                    else:
+                        results.add(url_name, (time.perf_counter() - started) * 1000, status)
+                    if think:
+                        time.sleep(think)
+                sessions += 1
+        finally:
+            transport.close()
+
+    def url_name(self, path):
+        try:
+            return resolve(path.split('?')[0]).url_name or path
+        except Resolver404:
+            return path
+
+    # ==========================================================================
+    # REPORT
+    # ==========================================================================
+
+    def report(self, results, elapsed):
+        total = sum(len(values) for values in results.latencies.values())
+        self.stdout.write(self.style.SUCCESS('=' * 78))
+        self.stdout.write(
+            f"{'url name':24}{'count':>7}{'req/s':>8}{'p50':>9}{'p95':>9}{'p99':>9}{'max':>9}  statuses"
+        )
+        for url_name in sorted(results.latencies):
+            values = sorted(results.latencies[url_name])
+            statuses = ' '.join(
+                f'{status}x{count}' for status, count in sorted(results.statuses[url_name].items())
+            )
+            self.stdout.write(
+                f'{url_name:24}{len(values):>7}{len(values) / elapsed:>8.1f}'
+                f'{percentile(values, 50):>7.1f}ms{percentile(values, 95):>7.1f}ms'
+                f'{percentile(values, 99):>7.1f}ms{values[-1]:>7.1f}ms  {statuses}'
+            )
+        self.stdout.write(self.style.SUCCESS('=' * 78))
+        everything = sorted(value for values in results.latencies.values() for value in values)
+        self.stdout.write(
+            f'{total} requests in {elapsed:.1f}s: {total / elapsed:.1f} req/s, '
+            f'p50 {percentile(everything, 50):.1f}ms, p95 {percentile(everything, 95):.1f}ms, '
+            f'p99 {percentile(everything, 99):.1f}ms'
+        )
+        if results.errors:
+            errors = sum(results.errors.values())
+            self.stdout.write(self.style.ERROR(
+                f'{errors} failed requests ({errors / (total + errors):.1%}), not counted above:'
+            ))
+        for (url_name, error), count in sorted(results.errors.items()):
+            self.stdout.write(self.style.ERROR(f'{url_name}: {count} x {error}'))
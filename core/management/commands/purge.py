@@ -0,0 +1,48 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from core.deletion import purge
+from core.models import User, Project, Post
+from core.tasks import enqueue
+
+MODELS = {'user': User, 'project': Project, 'post': Post}
+
+
+class Command(BaseCommand):
+    help = 'Delete users, projects or posts and everything that cascades from them, in batches'
+
+    def add_arguments(self, parser):
+        parser.add_argument('model', choices=sorted(MODELS))
+        parser.add_argument('ids', nargs='+', type=int)
+        parser.add_argument('--batch-size', type=int, default=None, help='Default: PURGE_BATCH_SIZE')
+        parser.add_argument('--max-batches', type=int, default=None, help='Stop after this many batches')
+        parser.add_argument('--pause', type=float, default=0.0, help='Seconds to sleep between batches')
+        parser.add_argument('--background', action='store_true', help='Queue a purge_objects task instead')
+
+    def handle(self, *args, **options):
+        model = MODELS[options['model']]
+        ids = options['ids']
+        missing = set(ids) - set(model.objects.filter(id__in=ids).values_list('id', flat=True))
+        if missing:
+            raise CommandError(f'No {options["model"]} with id {", ".join(map(str, sorted(missing)))}')
+
+        if options['background']:
+            enqueue('purge_objects', model=model._meta.label, ids=ids)
+            self.stdout.write(self.style.SUCCESS(f'✅ Queued the purge of {len(ids)} {model._meta.verbose_name_plural}'))
+            return
+
+        self.stdout.write(f'🗑️  Purging {len(ids)} {model._meta.verbose_name_plural}...')
+        job = purge(
+            model, ids,
+            batch_size=options['batch_size'],
+            max_batches=options['max_batches'],
+            pause=options['pause'],
+            log=lambda message: self.stdout.write(f'   {message}'),
+        )
+        for label, count in sorted(job.deleted.items()):
+            self.stdout.write(f'   {label}: {count}')
+        if job.finished:
+            self.stdout.write(self.style.SUCCESS(f'✅ Deleted {sum(job.deleted.values())} rows in {job.batches} batches'))
+        else:
+            self.stdout.write(self.style.WARNING(
+                f'⏸️  Stopped after {job.batches} batches; run the command again to continue'
+            ))
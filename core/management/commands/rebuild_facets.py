@@ -0,0 +1,15 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from core.facets import rebuild_all
+
+
+class Command(BaseCommand):
+    help = 'Recount the researcher facet table (facet_count) from the user table'
+
+    def handle(self, *args, **options):
+        self.stdout.write('📊 Rebuilding facet counts...')
+        start = time.perf_counter()
+        rows = rebuild_all(log=lambda message: self.stdout.write(f'   {message}'))
+        self.stdout.write(self.style.SUCCESS(f'✅ {rows} facet values counted in {time.perf_counter() - start:.1f}s'))
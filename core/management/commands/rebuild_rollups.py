@@ -0,0 +1,19 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from core.rollups import REBUILD_CHUNK_SIZE, rebuild_all
+
+
+class Command(BaseCommand):
+    help = 'Recompute every analytics rollup row from the source tables'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=REBUILD_CHUNK_SIZE,
+                            help='Subfields / institutions per grouped query')
+
+    def handle(self, *args, **options):
+        self.stdout.write('📊 Rebuilding analytics rollups...')
+        start = time.perf_counter()
+        rebuild_all(options['chunk_size'], log=lambda message: self.stdout.write(f'   {message}'))
+        self.stdout.write(self.style.SUCCESS(f'✅ Rollups rebuilt in {time.perf_counter() - start:.1f}s'))
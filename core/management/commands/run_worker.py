@@ -0,0 +1,29 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from core import tasks
+
+
+class Command(BaseCommand):
+    help = 'Run queued background tasks (see core/tasks.py)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=100, help='Tasks claimed per poll')
+        parser.add_argument('--sleep', type=float, default=1.0, help='Seconds to wait when the queue is empty')
+        parser.add_argument('--once', action='store_true', help='Drain the queue once and exit')
+
+    def handle(self, *args, **options):
+        self.stdout.write(f'⚙️  Worker started ({len(tasks.REGISTRY)} task types registered)')
+        try:
+            while True:
+                processed = tasks.run_once(options['batch_size'])
+                if processed:
+                    self.stdout.write(f'   processed {processed} tasks')
+                    continue
+                if options['once']:
+                    break
+                time.sleep(options['sleep'])
+        except KeyboardInterrupt:
+            pass
+        self.stdout.write(self.style.SUCCESS('✅ Worker stopped'))
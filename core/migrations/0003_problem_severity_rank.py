@@ -0,0 +1,31 @@
+# Generated by Django 6.0 on 2026-10-19 00:52
+
+from django.db import migrations, models
+
+
+def fill_severity_rank(apps, schema_editor):
+    # One UPDATE per severity value instead of saving every row
+    Problem = apps.get_model('core', 'Problem')
+    ranks = {'high': 0, 'medium': 1, 'low': 2}
+    for severity, rank in ranks.items():
+        Problem.objects.filter(severity=severity).update(severity_rank=rank)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0002_resourceversion'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='problem',
+            name='severity_rank',
+            field=models.PositiveSmallIntegerField(default=1, editable=False),
+        ),
+        migrations.RunPython(fill_severity_rank, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='problem',
+            index=models.Index(fields=['subfield', 'severity_rank'], name='problem_subfield_rank_idx'),
+        ),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 6.0 on 2026-10-19 01:10
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    """
+    Step 1 of the field surrogate key rollout (see core/field_keys.py).
+
+    Only adds nullable columns, so it is safe to run while the old code is
+    still serving traffic. field_ref has no database constraint yet; it
+    becomes the real field FK in 0006.
+    """
+
+    dependencies = [
+        ('core', '0003_problem_severity_rank'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='field',
+            name='surrogate_id',
+            field=models.BigIntegerField(null=True),
+        ),
+        migrations.AddField(
+            model_name='subfield',
+            name='field_ref',
+            field=models.ForeignKey(db_constraint=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='core.field', to_field='surrogate_id'),
+        ),
+        migrations.AddField(
+            model_name='project',
+            name='field_ref',
+            field=models.ForeignKey(db_constraint=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='core.field', to_field='surrogate_id'),
+        ),
+    ]
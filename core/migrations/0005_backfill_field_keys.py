@@ -0,0 +1,28 @@
+# Generated by Django 6.0 on 2026-10-19 01:10
+
+from django.db import migrations
+
+from core.field_keys import backfill_all
+
+
+def backfill(apps, schema_editor):
+    backfill_all(schema_editor.connection)
+
+
+class Migration(migrations.Migration):
+    """
+    Step 2 of the field surrogate key rollout (see core/field_keys.py).
+
+    Non-atomic so every batch commits on its own. A no-op for rows that
+    `manage.py backfill_field_keys` already filled.
+    """
+
+    atomic = False
+
+    dependencies = [
+        ('core', '0004_field_surrogate_columns'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,80 @@
+# Generated by Django 6.0 on 2026-10-19 01:10
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+from core.field_keys import backfill_all, check_vendor, swap_primary_key
+
+
+def catch_up(apps, schema_editor):
+    # Rows written since the backfill still have field_ref_id = NULL
+    backfill_all(schema_editor.connection)
+
+
+class Migration(migrations.Migration):
+    """
+    Step 3 of the field surrogate key rollout (see core/field_keys.py).
+
+    Drops the VARCHAR field_id columns, renames field_ref_id to field_id
+    and makes field.id the primary key (name stays UNIQUE). The foreign key
+    constraints come in 0017. MySQL and SQLite only. Not reversible.
+    """
+
+    dependencies = [
+        ('core', '0005_backfill_field_keys'),
+    ]
+
+    operations = [
+        migrations.RunPython(check_vendor),
+        migrations.RunPython(catch_up),
+        migrations.RemoveField(
+            model_name='subfield',
+            name='field',
+        ),
+        migrations.RemoveField(
+            model_name='project',
+            name='field',
+        ),
+        migrations.RenameField(
+            model_name='subfield',
+            old_name='field_ref',
+            new_name='field',
+        ),
+        migrations.RenameField(
+            model_name='project',
+            old_name='field_ref',
+            new_name='field',
+        ),
+        migrations.SeparateDatabaseAndState(
+            database_operations=[
+                migrations.RunPython(swap_primary_key),
+            ],
+            state_operations=[
+                migrations.AlterField(
+                    model_name='field',
+                    name='name',
+                    field=models.CharField(max_length=200, unique=True),
+                ),
+                migrations.RenameField(
+                    model_name='field',
+                    old_name='surrogate_id',
+                    new_name='id',
+                ),
+                migrations.AlterField(
+                    model_name='field',
+                    name='id',
+                    field=models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID'),
+                ),
+            ],
+        ),
+        migrations.AlterField(
+            model_name='subfield',
+            name='field',
+            field=models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.CASCADE, related_name='subfields', to='core.field'),
+        ),
+        migrations.AlterField(
+            model_name='project',
+            name='field',
+            field=models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.CASCADE, to='core.field'),
+        ),
+    ]
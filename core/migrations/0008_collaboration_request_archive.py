@@ -0,0 +1,33 @@
+# Generated by Django 6.0 on 2026-10-19 00:59
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0007_task'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedCollaborationRequest',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('accepted', 'Accepted'), ('rejected', 'Rejected')], max_length=20)),
+                ('created_at', models.DateTimeField()),
+                ('archived_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('post', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='archived_requests', to='core.post')),
+                ('project', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='archived_requests', to='core.project')),
+                ('receiver', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='archived_received_requests', to='core.user')),
+                ('sender', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='archived_sent_requests', to='core.user')),
+            ],
+            options={
+                'db_table': 'collaboration_request_archive',
+                'ordering': ['-created_at'],
+                'indexes': [models.Index(fields=['receiver', 'status', 'created_at'], name='archive_receiver_status_idx')],
+            },
+        ),
+    ]
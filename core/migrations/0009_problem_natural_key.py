@@ -0,0 +1,17 @@
+# Generated by Django 6.0 on 2026-10-19 01:03
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0008_collaboration_request_archive'),
+    ]
+
+    operations = [
+        migrations.AddConstraint(
+            model_name='problem',
+            constraint=models.UniqueConstraint(fields=('subfield', 'name'), name='problem_subfield_name_uniq'),
+        ),
+    ]
@@ -0,0 +1,43 @@
+# Generated by Django 6.0 on 2026-10-19 01:05
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0009_problem_natural_key'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='InstitutionRollup',
+            fields=[
+                ('institution', models.CharField(max_length=300, primary_key=True, serialize=False)),
+                ('pending_requests', models.PositiveIntegerField(default=0)),
+                ('accepted_requests', models.PositiveIntegerField(default=0)),
+                ('rejected_requests', models.PositiveIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'db_table': 'institution_rollup',
+            },
+        ),
+        migrations.CreateModel(
+            name='SubfieldRollup',
+            fields=[
+                ('subfield', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='rollup', serialize=False, to='core.subfield')),
+                ('open_projects', models.PositiveIntegerField(default=0)),
+                ('closed_projects', models.PositiveIntegerField(default=0)),
+                ('high_problems', models.PositiveIntegerField(default=0)),
+                ('medium_problems', models.PositiveIntegerField(default=0)),
+                ('low_problems', models.PositiveIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('field', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='subfield_rollups', to='core.field')),
+            ],
+            options={
+                'db_table': 'subfield_rollup',
+            },
+        ),
+    ]
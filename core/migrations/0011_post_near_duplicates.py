@@ -0,0 +1,31 @@
+# Generated by Django 6.0 on 2026-10-19 01:11
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0010_analytics_rollups'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='duplicate_of',
+            field=models.ForeignKey(blank=True, editable=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='duplicates', to='core.post'),
+        ),
+        migrations.CreateModel(
+            name='PostBand',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.BigIntegerField()),
+                ('post', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='lsh_bands', to='core.post')),
+            ],
+            options={
+                'db_table': 'post_lsh_band',
+                'indexes': [models.Index(fields=['key', 'post'], name='post_band_key_idx')],
+            },
+        ),
+    ]
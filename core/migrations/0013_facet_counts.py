@@ -0,0 +1,40 @@
+# Generated by Django 6.0 on 2026-10-19 02:40
+
+from django.db import migrations, models
+
+
+def count_facets(apps, schema_editor):
+    # One GROUP BY per facet over the existing users
+    User = apps.get_model('core', 'User')
+    FacetCount = apps.get_model('core', 'FacetCount')
+    for facet in ('country', 'institution', 'field', 'user_type'):
+        counts = User.objects.values_list(facet).annotate(count=models.Count('id')).order_by()
+        FacetCount.objects.bulk_create(
+            [FacetCount(facet=facet, value=value, count=count) for value, count in counts if value],
+            batch_size=1000,
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0012_engagement_counters'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FacetCount',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('facet', models.CharField(choices=[('country', 'Country'), ('institution', 'Institution'), ('field', 'Field'), ('user_type', 'User type')], max_length=20)),
+                ('value', models.CharField(max_length=300)),
+                ('count', models.IntegerField(default=0)),
+            ],
+            options={
+                'db_table': 'facet_count',
+                'indexes': [models.Index(fields=['facet', '-count'], name='facet_count_top_idx')],
+                'constraints': [models.UniqueConstraint(fields=('facet', 'value'), name='facet_count_facet_value_uniq')],
+            },
+        ),
+        migrations.RunPython(count_facets, migrations.RunPython.noop),
+    ]
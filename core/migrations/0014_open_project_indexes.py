@@ -0,0 +1,25 @@
+# Generated by Django 6.0 on 2026-10-19 10:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0013_facet_counts'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='project',
+            index=models.Index(fields=['vacancy_status', 'created_at', 'id'], name='project_open_recent_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='project',
+            index=models.Index(fields=['vacancy_status', 'field', 'created_at', 'id'], name='project_open_field_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='project',
+            index=models.Index(fields=['vacancy_status', 'subfield', 'created_at', 'id'], name='project_open_subfield_idx'),
+        ),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 6.0 on 2026-10-19 11:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0014_open_project_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProfileCapture',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('method', models.CharField(max_length=10)),
+                ('path', models.CharField(max_length=500)),
+                ('staff_user', models.CharField(max_length=150)),
+                ('mode', models.CharField(choices=[('cprofile', 'cProfile'), ('sample', 'Sampling')], max_length=10)),
+                ('status_code', models.IntegerField()),
+                ('duration_ms', models.FloatField()),
+                ('query_count', models.IntegerField()),
+                ('query_ms', models.FloatField()),
+                ('summary', models.JSONField(default=dict)),
+                ('pstats', models.BinaryField(null=True)),
+                ('collapsed', models.TextField(blank=True)),
+            ],
+            options={
+                'db_table': 'profile_capture',
+                'ordering': ['-id'],
+            },
+        ),
+    ]
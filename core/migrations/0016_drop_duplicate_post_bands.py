@@ -0,0 +1,18 @@
+from django.db import migrations
+
+
+def drop_duplicate_bands(apps, schema_editor):
+    # Copies are found through their original's bands (core/dedup.py)
+    PostBand = apps.get_model('core', 'PostBand')
+    PostBand.objects.filter(post__duplicate_of__isnull=False).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0015_profile_capture'),
+    ]
+
+    operations = [
+        migrations.RunPython(drop_duplicate_bands, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,31 @@
+import django.db.models.deletion
+from django.db import migrations, models
+
+from core.field_keys import AddFieldForeignKey
+
+
+class Migration(migrations.Migration):
+    """
+    Step 4 of the field surrogate key rollout (see core/field_keys.py).
+
+    Adds the foreign key constraints of subfield.field_id and
+    project.field_id. On MySQL the rows are checked with a SELECT and the
+    constraints added in place, without copying `project` under a lock.
+    """
+
+    dependencies = [
+        ('core', '0016_drop_duplicate_post_bands'),
+    ]
+
+    operations = [
+        AddFieldForeignKey(
+            model_name='subfield',
+            name='field',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='subfields', to='core.field'),
+        ),
+        AddFieldForeignKey(
+            model_name='project',
+            name='field',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='core.field'),
+        ),
+    ]
@@ -0,0 +1,24 @@
+from django.db import migrations
+from django.db.models.functions import Lower
+
+
+def lowercase_emails(apps, schema_editor):
+    # Imports match users by lowercased email (core/imports.py). A row whose
+    # lowercase spelling is already taken stays as it is: imports update the
+    # lowercase one. On MySQL's case-insensitive collation nothing matches.
+    User = apps.get_model('core', 'User')
+    mixed = User.objects.exclude(email=Lower('email')).values_list('id', 'email')
+    for user_id, email in mixed.iterator():
+        if not User.objects.filter(email=email.lower()).exists():
+            User.objects.filter(id=user_id).update(email=email.lower())
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0017_field_foreign_keys'),
+    ]
+
+    operations = [
+        migrations.RunPython(lowercase_emails, migrations.RunPython.noop),
+    ]
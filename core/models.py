@@ -1,4 +1,8 @@
 from django.db import models
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .querycache import CachingManager, CachedManager, CachingQuerySet
 
 """
 RESEARCH COLLABORATION PLATFORM - DATABASE MODELS
@@ -33,10 +37,21 @@ class Field(models.Model):
     PARTICIPATION:
     - Partial participation in relationships (field may exist without subfields/projects)
     
-    SQL: CREATE TABLE field (name VARCHAR(200) PRIMARY KEY);
+    SQL: CREATE TABLE field (
+           id BIGINT AUTO_INCREMENT PRIMARY KEY,
+           name VARCHAR(200) UNIQUE
+         );
+    
+    NOTE: name used to be the primary key, which made every subfield/project
+    row carry a VARCHAR(200) foreign key. Migrations 0004-0006 moved the
+    table to an integer surrogate key; name is still unique, so lookups
+    like Field.objects.get(name=...) and subfield__field__name keep working.
     """
-    # Primary Key
-    name = models.CharField(max_length=200, primary_key=True)
+    # Attributes (id is the auto-created integer primary key)
+    name = models.CharField(max_length=200, unique=True)
+    
+    # Read on almost every page, rarely written: served from the query cache
+    objects = CachedManager()
     
     class Meta:
         db_table = 'field'
@@ -64,21 +79,24 @@ class Subfield(models.Model):
     SQL: CREATE TABLE subfield (
            id INT AUTO_INCREMENT PRIMARY KEY,
            name VARCHAR(200),
-           field_id VARCHAR(200),
-           FOREIGN KEY (field_id) REFERENCES field(name) ON DELETE CASCADE
+           field_id BIGINT,
+           FOREIGN KEY (field_id) REFERENCES field(id) ON DELETE CASCADE
          );
     """
     # Attributes
     name = models.CharField(max_length=200)
     
     # RELATIONSHIP: Many Subfields → One Field (N:1)
-    # Foreign Key: subfield.field_id → field.name
+    # Foreign Key: subfield.field_id → field.id
     field = models.ForeignKey(
         Field,
         on_delete=models.CASCADE,      # Delete subfields when field is deleted
         related_name='subfields'       # Access: field.subfields.all()
     )
     
+    # Small reference table behind every search dropdown: cached like Field
+    objects = CachedManager()
+    
     class Meta:
         db_table = 'subfield'
     
@@ -128,9 +146,17 @@ class User(models.Model):
     field = models.CharField(max_length=200)
     rating = models.DecimalField(max_digits=3, decimal_places=1, default=0.0)
     
+    # Researcher lists opt in with .cache() (core/querycache.py)
+    objects = CachingManager()
+    
     class Meta:
         db_table = 'user'
     
+    def save(self, *args, **kwargs):
+        # Emails are stored lowercase, the key imports match on (core/imports.py)
+        self.email = self.email.lower()
+        super().save(*args, **kwargs)
+    
     def __str__(self):
         return self.name
 
@@ -138,6 +164,33 @@ class User(models.Model):
 # ==============================================================================
 # MODEL 4: PROBLEM
 # ==============================================================================
+class ProblemQuerySet(CachingQuerySet):
+    """Keeps severity_rank in sync on the bulk writes that skip Problem.save()"""
+    
+    def bulk_create(self, objs, *args, **kwargs):
+        objs = list(objs)
+        for problem in objs:
+            problem.severity_rank = Problem.rank_of(problem.severity)
+        update_fields = kwargs.get('update_fields')
+        if update_fields and 'severity' in update_fields and 'severity_rank' not in update_fields:
+            kwargs['update_fields'] = [*update_fields, 'severity_rank']
+        return super().bulk_create(objs, *args, **kwargs)
+    
+    def bulk_update(self, objs, fields, batch_size=None):
+        if 'severity' in fields and 'severity_rank' not in fields:
+            objs = list(objs)
+            for problem in objs:
+                problem.severity_rank = Problem.rank_of(problem.severity)
+            fields = [*fields, 'severity_rank']
+        return super().bulk_update(objs, fields, batch_size=batch_size)
+    
+    def update(self, **kwargs):
+        # A plain value only: bulk_update() passes a CASE and its own severity_rank
+        if isinstance(kwargs.get('severity'), str) and 'severity_rank' not in kwargs:
+            kwargs['severity_rank'] = Problem.rank_of(kwargs['severity'])
+        return super().update(**kwargs)
+
+
 class Problem(models.Model):
     """
     Represents a research problem in a specific subfield
@@ -158,11 +211,14 @@ class Problem(models.Model):
            name VARCHAR(300),
            description TEXT,
            severity VARCHAR(20),
+           severity_rank SMALLINT,  -- 0=high, 1=medium, 2=low
            subfield_id INT,
            current_work TEXT,
            done_work TEXT,
            gaps TEXT,
-           FOREIGN KEY (subfield_id) REFERENCES subfield(id) ON DELETE CASCADE
+           FOREIGN KEY (subfield_id) REFERENCES subfield(id) ON DELETE CASCADE,
+           INDEX problem_subfield_rank_idx (subfield_id, severity_rank),
+           UNIQUE problem_subfield_name_uniq (subfield_id, name)
          );
     """
     SEVERITY_CHOICES = [
@@ -171,10 +227,19 @@ class Problem(models.Model):
         ('low', 'Low'),        # 🟢 Green
     ]
     
+    # Sort key for severity: high first. Stored in severity_rank so search
+    # can ORDER BY an indexed integer instead of a CASE expression per row.
+    SEVERITY_RANKS = {
+        'high': 0,
+        'medium': 1,
+        'low': 2,
+    }
+    
     # Attributes
     name = models.CharField(max_length=300)
     description = models.TextField()
     severity = models.CharField(max_length=20, choices=SEVERITY_CHOICES, default='medium')
+    severity_rank = models.PositiveSmallIntegerField(default=1, editable=False)
     current_work = models.TextField(blank=True)
     done_work = models.TextField(blank=True)
     gaps = models.TextField(blank=True)
@@ -187,8 +252,32 @@ class Problem(models.Model):
         related_name='problems'  # Access: subfield.problems.all()
     )
     
+    # Problem searches opt in with .cache()
+    objects = CachingManager.from_queryset(ProblemQuerySet)()
+    
     class Meta:
         db_table = 'problem'
+        indexes = [
+            # Backs search_problems_view: WHERE subfield_id = ? ORDER BY severity_rank, id
+            # (InnoDB appends the primary key to every secondary index)
+            models.Index(fields=['subfield', 'severity_rank'], name='problem_subfield_rank_idx'),
+        ]
+        constraints = [
+            # Natural key used by bulk imports to upsert (core/imports.py)
+            models.UniqueConstraint(fields=['subfield', 'name'], name='problem_subfield_name_uniq'),
+        ]
+    
+    @classmethod
+    def rank_of(cls, severity):
+        return cls.SEVERITY_RANKS.get(severity, cls.SEVERITY_RANKS['medium'])
+    
+    def save(self, *args, **kwargs):
+        # Keep severity_rank in sync with severity (bulk writes: ProblemQuerySet)
+        self.severity_rank = self.rank_of(self.severity)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'severity' in update_fields:
+            kwargs['update_fields'] = set(update_fields) | {'severity_rank'}
+        super().save(*args, **kwargs)
     
     def __str__(self):
         return self.name
@@ -221,12 +310,14 @@ class Project(models.Model):
            title VARCHAR(300),
            description TEXT,
            owner_id INT,
-           field_id VARCHAR(200),
+           field_id BIGINT,
            subfield_id INT,
            vacancy_status BOOLEAN DEFAULT TRUE,
            created_at DATETIME,
+           view_count INT UNSIGNED DEFAULT 0,
+           interest_count INT UNSIGNED DEFAULT 0,
            FOREIGN KEY (owner_id) REFERENCES user(id) ON DELETE CASCADE,
-           FOREIGN KEY (field_id) REFERENCES field(name) ON DELETE CASCADE,
+           FOREIGN KEY (field_id) REFERENCES field(id) ON DELETE CASCADE,
            FOREIGN KEY (subfield_id) REFERENCES subfield(id) ON DELETE CASCADE
          );
          
@@ -245,6 +336,11 @@ class Project(models.Model):
     vacancy_status = models.BooleanField(default=True)  # True=Open, False=Closed
     created_at = models.DateTimeField(auto_now_add=True)
     
+    # Engagement: page views and collaboration requests received, added in
+    # batches by core/counters.py
+    view_count = models.PositiveIntegerField(default=0, editable=False)
+    interest_count = models.PositiveIntegerField(default=0, editable=False)
+    
     # RELATIONSHIP 1: Many Projects → One User (owner) (N:1)
     # Foreign Key: project.owner_id → user.id
     owner = models.ForeignKey(
@@ -254,7 +350,7 @@ class Project(models.Model):
     )
     
     # RELATIONSHIP 2: Many Projects → One Field (N:1)
-    # Foreign Key: project.field_id → field.name
+    # Foreign Key: project.field_id → field.id
     field = models.ForeignKey(Field, on_delete=models.CASCADE)
     
     # RELATIONSHIP 3: Many Projects → One Subfield (N:1)
@@ -270,9 +366,37 @@ class Project(models.Model):
         blank=True
     )
     
+    # Open projects, as an equality the project_open_* indexes can be searched
+    # on (vacancy_status=True compiles to a bare `WHERE vacancy_status`)
+    OPEN = models.Q(vacancy_status__in=[True])
+    
     class Meta:
         db_table = 'project'
         ordering = ['-created_at']
+        indexes = [
+            # Open-project discovery (open_projects_view, api 'open-projects'):
+            # SELECT id WHERE vacancy_status = TRUE [AND subfield_id = ? | AND field_id = ?]
+            # ORDER BY created_at DESC, id DESC LIMIT n - read backwards from the index alone
+            models.Index(fields=['vacancy_status', 'created_at', 'id'], name='project_open_recent_idx'),
+            models.Index(fields=['vacancy_status', 'field', 'created_at', 'id'], name='project_open_field_idx'),
+            models.Index(fields=['vacancy_status', 'subfield', 'created_at', 'id'], name='project_open_subfield_idx'),
+        ]
+    
+    @staticmethod
+    def collaborator_count():
+        """Correlated subquery counting a project's collaborators, for annotate() on a page of projects"""
+        # SQL: (SELECT COUNT(*) FROM core_project_collaborators
+        #       WHERE core_project_collaborators.project_id = project.id)
+        # Run for the rows returned only, unlike COUNT() over a JOIN ... GROUP BY
+        counts = (
+            Project.collaborators.through.objects
+            .filter(project_id=models.OuterRef('pk'))
+            .order_by()
+            .values('project_id')
+            .annotate(n=models.Count('*'))
+            .values('n')
+        )
+        return Coalesce(models.Subquery(counts), 0)
     
     def __str__(self):
         return self.title
@@ -298,13 +422,26 @@ class Post(models.Model):
            author_id INT,
            content TEXT,
            created_at DATETIME,
-           FOREIGN KEY (author_id) REFERENCES user(id) ON DELETE CASCADE
+           duplicate_of_id INT NULL,
+           view_count INT UNSIGNED DEFAULT 0,
+           interest_count INT UNSIGNED DEFAULT 0,
+           FOREIGN KEY (author_id) REFERENCES user(id) ON DELETE CASCADE,
+           FOREIGN KEY (duplicate_of_id) REFERENCES post(id) ON DELETE SET NULL
          );
+    
+    DUPLICATES: duplicate_of is set when the post is created if its content
+    nearly matches an earlier post (MinHash/LSH, see core/dedup.py); the
+    feed then shows only the original, with a count of similar posts.
     """
     # Attributes
     content = models.TextField()
     created_at = models.DateTimeField(auto_now_add=True)
     
+    # Engagement: feed impressions and collaboration requests received,
+    # added in batches by core/counters.py
+    view_count = models.PositiveIntegerField(default=0, editable=False)
+    interest_count = models.PositiveIntegerField(default=0, editable=False)
+    
     # RELATIONSHIP: Many Posts → One User (author) (N:1)
     # Foreign Key: post.author_id → user.id
     author = models.ForeignKey(
@@ -313,6 +450,17 @@ class Post(models.Model):
         related_name='posts'  # Access: user.posts.all()
     )
     
+    # RELATIONSHIP: Many near-duplicate Posts → One original Post (N:1)
+    # Foreign Key: post.duplicate_of_id → post.id
+    duplicate_of = models.ForeignKey(
+        'self',
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        editable=False,
+        related_name='duplicates'  # Access: post.duplicates.all()
+    )
+    
     class Meta:
         db_table = 'post'
         ordering = ['-created_at']
@@ -410,6 +558,359 @@ class CollaborationRequest(models.Model):
         return f"{self.sender.name} → {self.receiver.name} ({self.status})"
 
 
+# ==============================================================================
+# MODEL 8: RESOURCE VERSION
+# ==============================================================================
+class ResourceVersion(models.Model):
+    """
+    Version counter for a cacheable resource (e.g. 'feed', 'profile:7')
+    
+    Bumped by signal handlers (core/signals.py) whenever a row that a page
+    depends on is written. Pages build their ETag / Last-Modified from these
+    counters, so a revisit costs one indexed lookup instead of the full
+    queries + template render.
+    
+    SQL: CREATE TABLE resource_version (
+           key VARCHAR(100) PRIMARY KEY,
+           version BIGINT DEFAULT 0,
+           updated_at DATETIME
+         );
+    """
+    key = models.CharField(max_length=100, primary_key=True)
+    version = models.BigIntegerField(default=0)
+    updated_at = models.DateTimeField()
+    
+    class Meta:
+        db_table = 'resource_version'
+    
+    def __str__(self):
+        return f"{self.key} v{self.version}"
+
+
+# ==============================================================================
+# MODEL 9: TASK (background queue)
+# ==============================================================================
+class Task(models.Model):
+    """
+    A unit of background work queued by a view (see core/tasks.py)
+    
+    Rows are inserted after the view's transaction commits and picked up by
+    `manage.py run_worker`. Finished tasks are deleted; failed ones stay
+    for inspection in the admin.
+    
+    STATUS:
+    - 'queued': Waiting for a worker (or for run_after, when retrying)
+    - 'running': Claimed by a worker
+    - 'failed': Gave up after TASK_QUEUE_MAX_ATTEMPTS
+    
+    SQL: CREATE TABLE task (
+           id INT AUTO_INCREMENT PRIMARY KEY,
+           name VARCHAR(100),
+           payload JSON,
+           status VARCHAR(20) DEFAULT 'queued',
+           attempts SMALLINT DEFAULT 0,
+           run_after DATETIME,
+           locked_at DATETIME NULL,
+           last_error TEXT,
+           created_at DATETIME,
+           INDEX task_status_run_after_idx (status, run_after)
+         );
+    """
+    STATUS_CHOICES = [
+        ('queued', 'Queued'),
+        ('running', 'Running'),
+        ('failed', 'Failed'),
+    ]
+    
+    # Attributes
+    name = models.CharField(max_length=100)
+    payload = models.JSONField(default=dict)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='queued')
+    attempts = models.PositiveSmallIntegerField(default=0)
+    run_after = models.DateTimeField(default=timezone.now)
+    locked_at = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        db_table = 'task'
+        indexes = [
+            # Worker poll: WHERE status = 'queued' AND run_after <= NOW() ORDER BY id
+            models.Index(fields=['status', 'run_after'], name='task_status_run_after_idx'),
+        ]
+    
+    def __str__(self):
+        return f"{self.name} #{self.id} ({self.status})"
+
+
+# ==============================================================================
+# MODEL 10: ARCHIVED COLLABORATION REQUEST
+# ==============================================================================
+class ArchivedCollaborationRequest(models.Model):
+    """
+    A resolved (accepted/rejected) collaboration request moved out of the
+    hot collaboration_request table by core/archive.py
+    
+    Same columns as CollaborationRequest (and the same id), so templates can
+    render either kind of row. notifications_view merges both tables for
+    the accepted/rejected history.
+    
+    SQL: CREATE TABLE collaboration_request_archive (
+           id INT PRIMARY KEY,  -- id of the original collaboration_request row
+           sender_id INT,
+           receiver_id INT,
+           project_id INT NULL,
+           post_id INT NULL,
+           status VARCHAR(20),
+           created_at DATETIME,
+           archived_at DATETIME,
+           FOREIGN KEY (sender_id) REFERENCES user(id) ON DELETE CASCADE,
+           FOREIGN KEY (receiver_id) REFERENCES user(id) ON DELETE CASCADE,
+           FOREIGN KEY (project_id) REFERENCES project(id) ON DELETE CASCADE,
+           FOREIGN KEY (post_id) REFERENCES post(id) ON DELETE CASCADE,
+           INDEX archive_receiver_status_idx (receiver_id, status, created_at)
+         );
+    """
+    # Primary Key (copied from collaboration_request.id)
+    id = models.BigIntegerField(primary_key=True)
+    
+    # Attributes
+    status = models.CharField(max_length=20, choices=CollaborationRequest.STATUS_CHOICES)
+    created_at = models.DateTimeField()
+    archived_at = models.DateTimeField(default=timezone.now)
+    
+    # Relationships (same as CollaborationRequest)
+    sender = models.ForeignKey(User, on_delete=models.CASCADE, related_name='archived_sent_requests')
+    receiver = models.ForeignKey(User, on_delete=models.CASCADE, related_name='archived_received_requests')
+    project = models.ForeignKey(Project, on_delete=models.CASCADE, null=True, blank=True, related_name='archived_requests')
+    post = models.ForeignKey(Post, on_delete=models.CASCADE, null=True, blank=True, related_name='archived_requests')
+    
+    class Meta:
+        db_table = 'collaboration_request_archive'
+        ordering = ['-created_at']
+        indexes = [
+            # History lookup: WHERE receiver_id = ? AND status = ? ORDER BY created_at DESC
+            models.Index(fields=['receiver', 'status', 'created_at'], name='archive_receiver_status_idx'),
+        ]
+    
+    def __str__(self):
+        return f"{self.sender.name} → {self.receiver.name} ({self.status}, archived)"
+
+
+
+# ==============================================================================
+# MODEL 11: SUBFIELD ROLLUP (analytics)
+# ==============================================================================
+class SubfieldRollup(models.Model):
+    """
+    Precomputed project/problem counts for one subfield (see core/rollups.py)
+    
+    Adjusted in the same transaction whenever a project or problem in the
+    subfield is written, and rebuilt in bulk by `manage.py rebuild_rollups`.
+    The analytics page reads only this table.
+    
+    SQL: CREATE TABLE subfield_rollup (
+           subfield_id INT PRIMARY KEY,
+           field_id BIGINT,
+           open_projects INT, closed_projects INT,
+           high_problems INT, medium_problems INT, low_problems INT,
+           updated_at DATETIME,
+           FOREIGN KEY (subfield_id) REFERENCES subfield(id) ON DELETE CASCADE,
+           FOREIGN KEY (field_id) REFERENCES field(id) ON DELETE CASCADE
+         );
+    """
+    # One row per subfield; field is copied in so dashboards can group by it
+    subfield = models.OneToOneField(Subfield, on_delete=models.CASCADE, primary_key=True, related_name='rollup')
+    field = models.ForeignKey(Field, on_delete=models.CASCADE, related_name='subfield_rollups')
+    
+    # Attributes
+    open_projects = models.PositiveIntegerField(default=0)
+    closed_projects = models.PositiveIntegerField(default=0)
+    high_problems = models.PositiveIntegerField(default=0)
+    medium_problems = models.PositiveIntegerField(default=0)
+    low_problems = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        db_table = 'subfield_rollup'
+    
+    def __str__(self):
+        return f"Rollup for subfield {self.subfield_id}"
+
+
+# ==============================================================================
+# MODEL 12: INSTITUTION ROLLUP (analytics)
+# ==============================================================================
+class InstitutionRollup(models.Model):
+    """
+    Collaboration request counts for researchers of one institution, as
+    receivers, including archived requests (see core/rollups.py)
+    
+    SQL: CREATE TABLE institution_rollup (
+           institution VARCHAR(300) PRIMARY KEY,
+           pending_requests INT, accepted_requests INT, rejected_requests INT,
+           updated_at DATETIME
+         );
+    """
+    institution = models.CharField(max_length=300, primary_key=True)
+    
+    # Attributes
+    pending_requests = models.PositiveIntegerField(default=0)
+    accepted_requests = models.PositiveIntegerField(default=0)
+    rejected_requests = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        db_table = 'institution_rollup'
+    
+    @property
+    def acceptance_rate(self):
+        """Accepted share of resolved requests, or None if none are resolved"""
+        resolved = self.accepted_requests + self.rejected_requests
+        return self.accepted_requests / resolved if resolved else None
+    
+    def __str__(self):
+        return f"Rollup for {self.institution}"
+
+
+# ==============================================================================
+# MODEL 13: POST LSH BAND (near-duplicate index)
+# ==============================================================================
+class PostBand(models.Model):
+    """
+    One locality-sensitive-hashing bucket of a post's MinHash signature
+    (see core/dedup.py)
+    
+    Every original post gets one row per band (copies flagged with
+    duplicate_of get none). Two posts that share any bucket are candidate
+    near-duplicates, so finding them is an indexed IN lookup on `key`
+    instead of a scan of all posts.
+    
+    SQL: CREATE TABLE post_lsh_band (
+           id BIGINT AUTO_INCREMENT PRIMARY KEY,
+           post_id INT,
+           key BIGINT,  -- hash of (band number, band rows)
+           FOREIGN KEY (post_id) REFERENCES post(id) ON DELETE CASCADE,
+           INDEX post_band_key_idx (key, post_id)
+         );
+    """
+    post = models.ForeignKey(Post, on_delete=models.CASCADE, related_name='lsh_bands')
+    key = models.BigIntegerField()
+    
+    class Meta:
+        db_table = 'post_lsh_band'
+        indexes = [
+            # Candidate lookup: WHERE key IN (...) -> post_id, from the index alone
+            models.Index(fields=['key', 'post'], name='post_band_key_idx'),
+        ]
+    
+    def __str__(self):
+        return f"Band {self.key} of post {self.post_id}"
+
+
+# ==============================================================================
+# MODEL 14: FACET COUNT (researcher directory)
+# ==============================================================================
+class FacetCount(models.Model):
+    """
+    Number of users with one value of one facet - country, institution,
+    field or user_type - for the faceted directory (see core/facets.py)
+    
+    Kept up to date by a background task on every User write, and rebuilt
+    in bulk by `manage.py rebuild_facets`. Values nobody has any more stay
+    with a count of 0.
+    
+    SQL: CREATE TABLE facet_count (
+           id BIGINT AUTO_INCREMENT PRIMARY KEY,
+           facet VARCHAR(20),
+           value VARCHAR(300),
+           count INT DEFAULT 0,
+           UNIQUE (facet, value),
+           INDEX facet_count_top_idx (facet, count DESC)
+         );
+    """
+    FACET_CHOICES = [
+        ('country', 'Country'),
+        ('institution', 'Institution'),
+        ('field', 'Field'),
+        ('user_type', 'User type'),
+    ]
+    
+    facet = models.CharField(max_length=20, choices=FACET_CHOICES)
+    value = models.CharField(max_length=300)
+    count = models.IntegerField(default=0)
+    
+    # Read with .cache() (core/querycache.py); invalidated by every count change
+    objects = CachingManager()
+    
+    class Meta:
+        db_table = 'facet_count'
+        constraints = [
+            models.UniqueConstraint(fields=['facet', 'value'], name='facet_count_facet_value_uniq'),
+        ]
+        indexes = [
+            # Largest values of a facet: WHERE facet = ... ORDER BY count DESC LIMIT n
+            models.Index(fields=['facet', '-count'], name='facet_count_top_idx'),
+        ]
+    
+    def __str__(self):
+        return f"{self.facet}={self.value}: {self.count}"
+
+
+# ==============================================================================
+# MODEL 15: PROFILE CAPTURE (staff request profiler)
+# ==============================================================================
+class ProfileCapture(models.Model):
+    """
+    One profiled request (see core/profiling.py): its SQL timeline, template
+    render times and the profiler output, browsable in the admin.
+    
+    Only the newest PROFILER_KEEP captures are kept.
+    
+    SQL: CREATE TABLE profile_capture (
+           id BIGINT AUTO_INCREMENT PRIMARY KEY,
+           created_at DATETIME,
+           method VARCHAR(10),
+           path VARCHAR(500),
+           staff_user VARCHAR(150),
+           mode VARCHAR(10),
+           status_code INT,
+           duration_ms DOUBLE,
+           query_count INT,
+           query_ms DOUBLE,
+           summary JSON,
+           pstats LONGBLOB NULL,
+           collapsed LONGTEXT
+         );
+    """
+    MODE_CHOICES = [
+        ('cprofile', 'cProfile'),
+        ('sample', 'Sampling'),
+    ]
+    
+    created_at = models.DateTimeField(auto_now_add=True)
+    method = models.CharField(max_length=10)
+    path = models.CharField(max_length=500)
+    staff_user = models.CharField(max_length=150)
+    mode = models.CharField(max_length=10, choices=MODE_CHOICES)
+    status_code = models.IntegerField()
+    duration_ms = models.FloatField()
+    query_count = models.IntegerField()
+    query_ms = models.FloatField()
+    # SQL timeline, template render times, hottest functions
+    summary = models.JSONField(default=dict)
+    # marshal-ed cProfile stats, as written by Profile.dump_stats() (cprofile mode)
+    pstats = models.BinaryField(null=True)
+    # Sampled stacks, one "frame;frame;frame <samples>" line each (flamegraph.pl, speedscope)
+    collapsed = models.TextField(blank=True)
+    
+    class Meta:
+        db_table = 'profile_capture'
+        ordering = ['-id']
+    
+    def __str__(self):
+        return f"{self.method} {self.path} ({self.duration_ms:.0f} ms)"
+
 """
 ==============================================================================
 COMPLETE RELATIONSHIPS SUMMARY
@@ -418,7 +919,7 @@ COMPLETE RELATIONSHIPS SUMMARY
 1. Field (1) ──→ Subfield (N)
    Cardinality: 1:N
    Participation: Partial:Total
-   Foreign Key: subfield.field_id → field.name
+   Foreign Key: subfield.field_id → field.id
 
 2. Subfield (1) ──→ Problem (N)
    Cardinality: 1:N
@@ -463,7 +964,7 @@ COMPLETE RELATIONSHIPS SUMMARY
 10. Field (1) ──→ Project (N)
     Cardinality: 1:N
     Participation: Partial:Total
-    Foreign Key: project.field_id → field.name
+    Foreign Key: project.field_id → field.id
 
 11. Subfield (1) ──→ Project (N)
     Cardinality: 1:N
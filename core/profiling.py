@@ -0,0 +1,321 @@
+"""
+REQUEST PROFILER (staff only)
+=============================
+Profiles one request on demand, on the server and with the data where it
+is slow:
+
+    /notifications/?_profile=cprofile         (or ?_profile=sample)
+    curl -H 'X-Profile: sample' ...
+
+Only for staff (request.user.is_staff); anyone else's trigger is ignored.
+A capture records:
+- cProfile stats (cprofile mode), downloadable as a .prof file for
+  pstats / snakeviz
+- the call stack sampled every PROFILER_SAMPLE_INTERVAL seconds (both
+  modes), downloadable in collapsed-stack format for flamegraph.pl /
+  speedscope. Sample mode adds next to no overhead, so its timings are
+  the realistic ones.
+- the SQL timeline: each query's offset, duration and database (up to
+  PROFILER_MAX_QUERIES of them)
+- template render time: renders and total time per template (a page's
+  time includes the templates it includes)
+
+Streamed pages (core/streaming.py) are read to the end inside the capture,
+so their lists are in it. The newest PROFILER_KEEP captures are kept in
+`profile_capture`, browsable in the admin; the response carries
+X-Profile-Id.
+
+NOT TRIGGERED: the middleware looks at the query string and one header,
+then calls the next handler. Nothing else is installed: the SQL wrapper
+and the template hook exist only while a capture runs.
+"""
+import cProfile
+import contextvars
+import marshal
+import sys
+import sysconfig
+import threading
+import time
+from collections import Counter
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import connections
+from django.template.base import Template
+
+from .models import ProfileCapture
+
+TRIGGER_PARAM = '_profile'
+TRIGGER_HEADER = 'HTTP_X_PROFILE'
+DEFAULT_MODE = 'cprofile'
+
+# Functions kept in the summary, by cumulative time
+TOP_FUNCTIONS = 40
+# Characters of each query's SQL kept in the timeline
+SQL_CHARS = 2000
+
+_capture = contextvars.ContextVar('profile_capture', default=None)
+_hook_lock = threading.Lock()
+_hook_users = 0
+_unhooked_render = None
+
+
+def requested_mode(request):
+    """'cprofile' / 'sample' when the request asks to be profiled, else None"""
+    header = request.META.get(TRIGGER_HEADER)
+    if not header and TRIGGER_PARAM not in request.META.get('QUERY_STRING', ''):
+        return None
+    mode = request.GET.get(TRIGGER_PARAM) or header
+    return mode if mode in dict(ProfileCapture.MODE_CHOICES) else DEFAULT_MODE
+
+
+class ProfilingMiddleware:
+    """Profile requests that ask for it (?_profile= / X-Profile), for staff; goes after AuthenticationMiddleware"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        mode = requested_mode(request)
+        if mode is None or not request.user.is_staff:
+            return self.get_response(request)
+        return profile_request(self.get_response, request, mode)
+
+
+# ==============================================================================
+# CAPTURE
+# ==============================================================================
+
+class Capture:
+    """SQL timeline and template times of the request being profiled"""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.finished = None
+        self.queries = []
+        self.query_count = 0
+        self.query_seconds = 0.0
+        self.templates = {}
+
+    def offset_ms(self, moment):
+        return round((moment - self.started) * 1000, 3)
+
+    def sql_wrapper(self, alias):
+        """execute_wrapper recording each query of this thread on `alias`"""
+        max_queries = getattr(settings, 'PROFILER_MAX_QUERIES', 1000)
+
+        def wrapper(execute, sql, params, many, context):
+            started = time.perf_counter()
+            try:
+                return execute(sql, params, many, context)
+            finally:
+                seconds = time.perf_counter() - started
+                self.query_count += 1
+                self.query_seconds += seconds
+                if len(self.queries) < max_queries:
+                    self.queries.append({
+                        'start_ms': self.offset_ms(started),
+                        'duration_ms': round(seconds * 1000, 3),
+                        'alias': alias,
+                        'sql': sql[:SQL_CHARS],
+                    })
+        return wrapper
+
+    def template_rendered(self, name, seconds):
+        entry = self.templates.setdefault(name, {'name': name, 'renders': 0, 'total_ms': 0.0, 'max_ms': 0.0})
+        entry['renders'] += 1
+        entry['total_ms'] = round(entry['total_ms'] + seconds * 1000, 3)
+        entry['max_ms'] = max(entry['max_ms'], round(seconds * 1000, 3))
+
+
+def _timed_render(original):
+    # Template._render runs for every template, {% extends %} parents and
+    # {% include %}d partials included
+    def _render(self, context):
+        capture = _capture.get()
+        if capture is None:
+            return original(self, context)
+        started = time.perf_counter()
+        try:
+            return original(self, context)
+        finally:
+            capture.template_rendered(self.name or '<string>', time.perf_counter() - started)
+    return _render
+
+
+def hook_templates():
+    """Time template renders until unhook_templates() (shared by concurrent captures)"""
+    global _hook_users, _unhooked_render
+    with _hook_lock:
+        if not _hook_users:
+            _unhooked_render = Template._render
+            Template._render = _timed_render(_unhooked_render)
+        _hook_users += 1
+
+
+def unhook_templates():
+    global _hook_users
+    with _hook_lock:
+        _hook_users -= 1
+        if not _hook_users:
+            Template._render = _unhooked_render
+
+
+# ==============================================================================
+# SAMPLING
+# ==============================================================================
+
+class Sampler(threading.Thread):
+    """Counts the call stacks of one thread, read every `interval` seconds"""
+
+    def __init__(self, thread_id, interval, root_code):
+        super().__init__(name='profile-sampler', daemon=True)
+        self.thread_id = thread_id
+        self.interval = interval
+        self.root_code = root_code
+        self.stacks = Counter()
+        self.labels = {}
+        self.done = threading.Event()
+
+    def run(self):
+        while not self.done.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            # Leaf to root, stopping at the capture's own frame
+            while frame is not None:
+                stack.append(self.label(frame.f_code))
+                if frame.f_code is self.root_code:
+                    break
+                frame = frame.f_back
+            if stack:
+                self.stacks[';'.join(reversed(stack))] += 1
+
+    def label(self, code):
+        label = self.labels.get(code)
+        if label is None:
+            label = self.labels[code] = f'{code.co_qualname} ({short_path(code.co_filename)}:{code.co_firstlineno})'
+        return label
+
+    def stop(self):
+        self.done.set()
+        self.join()
+
+    def collapsed(self):
+        """flamegraph.pl input: one "root;...;leaf <count>" line per stack"""
+        return '\n'.join(f'{stack} {count}' for stack, count in self.stacks.most_common())
+
+
+def short_path(filename):
+    """Path from the package root (site-packages, the project or the standard library) for display"""
+    head, marker, tail = filename.rpartition('site-packages/')
+    if marker:
+        return tail
+    for root in (str(settings.BASE_DIR), sysconfig.get_paths()['stdlib']):
+        if filename.startswith(root + '/'):
+            return filename[len(root) + 1:]
+    return filename
+
+
+def top_functions(stats, limit=TOP_FUNCTIONS):
+    """The `limit` functions with the most cumulative time, from cProfile stats"""
+    rows = sorted(stats.items(), key=lambda item: item[1][3], reverse=True)[:limit]
+    return [
+        {
+            'function': name if filename == '~' else f'{name} ({short_path(filename)}:{line})',
+            'calls': calls,
+            'own_ms': round(own * 1000, 3),
+            'cumulative_ms': round(cumulative * 1000, 3),
+        }
+        for (filename, line, name), (_, calls, own, cumulative, _) in rows
+    ]
+
+
+# ==============================================================================
+# PROFILED REQUEST
+# ==============================================================================
+
+def run_request(get_response, request):
+    """The profiled part: the view, and a streamed body read to the end"""
+    response = get_response(request)
+    if response.streaming:
+        response.streaming_content = [b''.join(response.streaming_content)]
+    return response
+
+
+def profile_request(get_response, request, mode):
+    """Run the request under the profilers; store the capture and return the response"""
+    capture = Capture()
+    sampler = Sampler(
+        threading.get_ident(),
+        getattr(settings, 'PROFILER_SAMPLE_INTERVAL', 0.005),
+        run_request.__code__,
+    )
+    profiler = cProfile.Profile() if mode == 'cprofile' else None
+
+    token = _capture.set(capture)
+    hook_templates()
+    try:
+        with ExitStack() as stack:
+            for alias in connections:
+                stack.enter_context(connections[alias].execute_wrapper(capture.sql_wrapper(alias)))
+            sampler.start()
+            if profiler is not None:
+                try:
+                    profiler.enable()
+                except ValueError:
+                    # Another profiler owns this thread (e.g. a debugger): sample only
+                    profiler, mode = None, 'sample'
+            capture.started = time.perf_counter()
+            try:
+                response = run_request(get_response, request)
+            finally:
+                if profiler is not None:
+                    profiler.disable()
+                capture.finished = time.perf_counter()
+                sampler.stop()
+    finally:
+        unhook_templates()
+        _capture.reset(token)
+
+    saved = save(request, response, mode, capture, sampler, profiler)
+    response['X-Profile-Id'] = str(saved.id)
+    return response
+
+
+def save(request, response, mode, capture, sampler, profiler):
+    """Store the capture and drop the ones older than the newest PROFILER_KEEP"""
+    # SQL: INSERT INTO profile_capture (...) VALUES (...);
+    # SQL: SELECT id FROM profile_capture ORDER BY id DESC LIMIT 1 OFFSET <PROFILER_KEEP>;
+    # SQL: DELETE FROM profile_capture WHERE id <= <that id>;
+    pstats = None
+    functions = []
+    if profiler is not None:
+        profiler.create_stats()
+        pstats = marshal.dumps(profiler.stats)
+        functions = top_functions(profiler.stats)
+
+    saved = ProfileCapture.objects.create(
+        method=request.method,
+        path=request.get_full_path()[:500],
+        staff_user=request.user.get_username(),
+        mode=mode,
+        status_code=response.status_code,
+        duration_ms=capture.offset_ms(capture.finished),
+        query_count=capture.query_count,
+        query_ms=round(capture.query_seconds * 1000, 3),
+        summary={
+            'queries': capture.queries,
+            'templates': sorted(capture.templates.values(), key=lambda entry: -entry['total_ms']),
+            'functions': functions,
+            'samples': sum(sampler.stacks.values()),
+            'sample_interval_ms': sampler.interval * 1000,
+        },
+        pstats=pstats,
+        collapsed=sampler.collapsed(),
+    )
+    keep = getattr(settings, 'PROFILER_KEEP', 20)
+    captures = ProfileCapture.objects.using(saved._state.db)
+    oldest_kept = list(captures.order_by('-id').values_list('id', flat=True)[keep:keep + 1])
+    if oldest_kept:
+        captures.filter(id__lte=oldest_kept[0]).delete()
+    return saved
@@ -0,0 +1,273 @@
+"""
+QUERY-RESULT CACHE
+==================
+Caches the rows of identical ORM queries (the field list, researcher
+lists, problem searches) in Django's cache, shared by every worker.
+
+Only with a shared cache backend (Redis, Memcached, database, files): with
+a per-process one (LocMemCache) each worker would keep its own table
+generations, a write in one would never invalidate the others' entries,
+and the cache stays off whatever QUERY_CACHE_ENABLED says.
+
+    Field.objects.all()                                   # cached by default
+    User.objects.filter(user_type='researcher').cache()   # opt in
+    Field.objects.nocache()                               # opt out
+
+KEY: the compiled SQL and parameters, the database alias, the result shape
+(values(), values_list(), instances) and the current generation of every
+table the SQL reads (FROM / JOIN, subqueries included).
+
+INVALIDATION: each `core` table has a generation counter in the cache.
+Every INSERT / UPDATE / DELETE that reaches the database on a `core` table
+bumps it - save(), QuerySet.update(), bulk_create(), M2M add/remove, raw
+SQL alike, since the check sits in the connection's execute wrapper. Old
+entries are never deleted, just never looked up again, and expire on
+their own.
+- Writes inside a transaction bump again on commit, so a reader that
+  cached the old rows in between is invalidated too.
+- While a transaction has written to the database, its reads skip the
+  cache (they may see uncommitted rows), until it commits or rolls back.
+- Rows read from a replica are kept at most REPLICA_MAX_LAG_SECONDS, so a
+  lagging replica can't pin old rows in the cache.
+
+SETTINGS:
+    QUERY_CACHE_ENABLED = True
+    QUERY_CACHE_TIMEOUT = 300     # seconds an entry lives
+    QUERY_CACHE_ALIAS = 'default' # entry in CACHES
+
+Hit ratio per model for this process: stats() (shown at /ops/query-cache/).
+"""
+import hashlib
+import re
+import threading
+import time
+
+from django.apps import apps
+from django.conf import settings
+from django.core.cache import caches
+from django.core.exceptions import EmptyResultSet
+from django.db import connections, transaction
+from django.db.backends.signals import connection_created
+from django.db.models import Manager, QuerySet
+from django.dispatch import receiver
+
+READ_TABLE_RE = re.compile(r'\b(?:FROM|JOIN)\s+[`"\[]?(\w+)', re.IGNORECASE)
+# INSERT [IGNORE | OR IGNORE] INTO, UPDATE, DELETE FROM, REPLACE INTO <table>
+WRITE_TABLE_RE = re.compile(
+    r'^\s*(?:INSERT\s+(?:IGNORE\s+|OR\s+\w+\s+)?INTO|UPDATE|DELETE\s+FROM|REPLACE\s+INTO)\s+[`"\[]?(\w+)',
+    re.IGNORECASE,
+)
+WRITE_VERBS = ('INSERT', 'UPDATE', 'DELETE', 'REPLAC')
+
+# Marker stored for an empty result, since cache.get() returns None on a miss
+EMPTY = '__empty__'
+
+_stats = {}              # model label -> hits / misses / bypassed
+_invalidations = {}      # table -> generation bumps
+_stats_lock = threading.Lock()
+_core_tables = None
+
+
+# Backends whose entries live in one process only
+PROCESS_LOCAL_BACKENDS = (
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+)
+
+
+def enabled():
+    if not getattr(settings, 'QUERY_CACHE_ENABLED', True):
+        return False
+    alias = getattr(settings, 'QUERY_CACHE_ALIAS', 'default')
+    return settings.CACHES.get(alias, {}).get('BACKEND') not in PROCESS_LOCAL_BACKENDS
+
+
+def cache():
+    return caches[getattr(settings, 'QUERY_CACHE_ALIAS', 'default')]
+
+
+def core_tables():
+    """db_table of every core model, M2M join tables included"""
+    global _core_tables
+    if _core_tables is None:
+        tables = set()
+        for model in apps.get_app_config('core').get_models(include_auto_created=True):
+            tables.add(model._meta.db_table)
+        _core_tables = frozenset(tables)
+    return _core_tables
+
+
+def record(label, outcome):
+    with _stats_lock:
+        entry = _stats.setdefault(label, {'hits': 0, 'misses': 0, 'bypassed': 0})
+        entry[outcome] += 1
+
+
+def stats():
+    """Snapshot of per-model lookups (with hit_ratio) and per-table invalidations, this process"""
+    with _stats_lock:
+        queries = {label: dict(entry) for label, entry in _stats.items()}
+        invalidations = dict(_invalidations)
+    for entry in queries.values():
+        lookups = entry['hits'] + entry['misses']
+        entry['hit_ratio'] = round(entry['hits'] / lookups, 3) if lookups else None
+    return {'queries': queries, 'invalidations': invalidations}
+
+
+# ==============================================================================
+# GENERATIONS
+# ==============================================================================
+
+def generation_key(table):
+    return f'qc:gen:{table}'
+
+
+def generations(tables):
+    """Current generation of each table; a counter evicted from the cache restarts at the clock"""
+    store = cache()
+    keys = [generation_key(table) for table in tables]
+    found = store.get_many(keys)
+    for key in keys:
+        if key not in found:
+            # Never back to a value an older entry may have been keyed with
+            store.add(key, time.time_ns(), timeout=None)
+            found[key] = store.get(key)
+    return [found[key] for key in keys]
+
+
+def bump(tables):
+    """Invalidate every cached query that read one of these tables"""
+    store = cache()
+    for table in tables:
+        try:
+            store.incr(generation_key(table))
+        except ValueError:
+            store.set(generation_key(table), time.time_ns(), timeout=None)
+        with _stats_lock:
+            _invalidations[table] = _invalidations.get(table, 0) + 1
+
+
+def written_tables(sql):
+    match = WRITE_TABLE_RE.match(sql)
+    if match and match.group(1) in core_tables():
+        return {match.group(1)}
+    return set()
+
+
+def invalidation_wrapper(alias):
+    """execute_wrapper: bump the tables a write statement touched"""
+    def wrapper(execute, sql, params, many, context):
+        result = execute(sql, params, many, context)
+        if sql.lstrip()[:6].upper().startswith(WRITE_VERBS):
+            tables = written_tables(sql)
+            if tables:
+                bump(tables)
+                if connections[alias].in_atomic_block:
+                    transaction.on_commit(bump_on_commit(tables), using=alias)
+        return result
+    return wrapper
+
+
+def bump_on_commit(tables):
+    def committed():
+        bump(tables)
+    committed.query_cache_tables = tables
+    return committed
+
+
+def has_written(connection):
+    """Whether the open transaction wrote to a core table (a rolled back savepoint's writes don't count)"""
+    # Django drops on_commit callbacks with the transaction or savepoint
+    # that registered them, committed or rolled back: no flag to go stale
+    return connection.in_atomic_block and any(
+        hasattr(callback, 'query_cache_tables') for _, callback, _ in connection.run_on_commit
+    )
+
+
+@receiver(connection_created)
+def install_wrapper(sender, connection, **kwargs):
+    # Sent again whenever the wrapper reconnects (CONN_MAX_AGE, health checks)
+    if not getattr(connection, 'query_cache_wrapped', False):
+        connection.execute_wrappers.append(invalidation_wrapper(connection.alias))
+        connection.query_cache_wrapped = True
+
+
+# ==============================================================================
+# QUERYSET
+# ==============================================================================
+
+class CachingQuerySet(QuerySet):
+    """QuerySet whose rows can be served from the query cache (see .cache())"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._cache_timeout = None
+
+    def _clone(self):
+        clone = super()._clone()
+        clone._cache_timeout = self._cache_timeout
+        return clone
+
+    def cache(self, timeout=None):
+        """Serve this queryset's rows from the query cache"""
+        clone = self._chain()
+        clone._cache_timeout = timeout or getattr(settings, 'QUERY_CACHE_TIMEOUT', 300)
+        return clone
+
+    def nocache(self):
+        """Always run this queryset against the database"""
+        clone = self._chain()
+        clone._cache_timeout = None
+        return clone
+
+    def _fetch_all(self):
+        # Related-manager querysets (user.posts, ...) differ per instance: not worth caching
+        if (self._result_cache is None and self._cache_timeout and enabled()
+                and 'instance' not in self._hints):
+            self._fetch_cached()
+        super()._fetch_all()
+
+    def _fetch_cached(self):
+        label = self.model._meta.label
+        connection = connections[self.db]
+        if has_written(connection):
+            record(label, 'bypassed')
+            return
+        try:
+            sql, params = self.query.get_compiler(using=self.db).as_sql()
+        except EmptyResultSet:
+            return
+
+        tables = sorted(set(READ_TABLE_RE.findall(sql)) & core_tables())
+        if not tables:
+            record(label, 'bypassed')
+            return
+        parts = [self.db, self._iterable_class.__name__, repr(self._fields), sql, repr(params)]
+        parts += [f'{table}={generation}' for table, generation in zip(tables, generations(tables))]
+        key = 'qc:' + hashlib.sha256('\x1f'.join(parts).encode()).hexdigest()
+
+        store = cache()
+        rows = store.get(key)
+        if rows is not None:
+            record(label, 'hits')
+            self._result_cache = [] if rows == EMPTY else rows
+            return
+
+        record(label, 'misses')
+        self._result_cache = list(self._iterable_class(self))
+        timeout = self._cache_timeout
+        if self.db != 'default':
+            # Replica rows may be behind the primary
+            timeout = min(timeout, getattr(settings, 'REPLICA_MAX_LAG_SECONDS', 2))
+        store.set(key, self._result_cache or EMPTY, timeout)
+
+
+class CachingManager(Manager.from_queryset(CachingQuerySet)):
+    """Manager whose querysets are cached only after .cache()"""
+
+
+class CachedManager(CachingManager):
+    """Manager whose querysets are cached unless .nocache() (small, read-mostly tables)"""
+
+    def get_queryset(self):
+        return super().get_queryset().cache()
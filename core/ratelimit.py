@@ -0,0 +1,145 @@
+"""
+RATE LIMITING
+=============
+Token buckets per (endpoint, user) for the write endpoints, so one script
+can't flood post / collaboration_request.
+
+    @rate_limited('create_post', methods=('POST',))
+    def create_post_view(request): ...
+
+Each bucket holds up to `burst` tokens and refills at `per_minute` tokens
+a minute; a request takes one token or gets 429 Too Many Requests with a
+Retry-After header. Budgets come from RATE_LIMITS; endpoints not listed
+there are not limited.
+
+BACKENDS (RATE_LIMIT_BACKEND):
+- 'memory' (default): a dict in this process, guarded by a lock. A few
+  microseconds per request, but each worker process has its own budget.
+- 'cache': the bucket lives in Django's default cache (Redis/memcached),
+  shared by every worker. Costs one cache get + set. The read-modify-write
+  isn't atomic, so concurrent requests of one user may each spend the same
+  token; budgets are approximate by a request or two.
+
+Per-endpoint allowed/throttled counts for this process: metrics()
+(shown at /ops/rate-limits/).
+"""
+import threading
+import time
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse
+
+# Memory backend drops idle (full) buckets once it holds this many
+MAX_MEMORY_BUCKETS = 100000
+
+
+def take_token(state, now, burst, rate):
+    """
+    Token bucket step. state is (tokens, updated_at) or None for a full
+    bucket; returns (new state, allowed, seconds until a token is available).
+    """
+    tokens, updated_at = state if state else (burst, now)
+    tokens = min(burst, tokens + (now - updated_at) * rate)
+    if tokens >= 1:
+        return (tokens - 1, now), True, 0.0
+    return (tokens, now), False, (1 - tokens) / rate
+
+
+class MemoryBackend:
+    def __init__(self):
+        self.buckets = {}
+        self.lock = threading.Lock()
+
+    def take(self, key, burst, rate):
+        now = time.monotonic()
+        with self.lock:
+            state, allowed, wait = take_token(self.buckets.get(key), now, burst, rate)
+            self.buckets[key] = state
+            if len(self.buckets) > MAX_MEMORY_BUCKETS:
+                self.prune(now)
+        return allowed, wait
+
+    def prune(self, now):
+        # A bucket that has had time to refill completely is the same as no bucket.
+        # burst/rate differ per endpoint, so use the slowest refill there is
+        refill = max((spec['burst'] * 60 / spec['per_minute'] for spec in limits().values()), default=0)
+        self.buckets = {
+            key: state for key, state in self.buckets.items()
+            if now - state[1] < refill
+        }
+        if len(self.buckets) > MAX_MEMORY_BUCKETS // 2:
+            # Still crowded: keep the most recently used half
+            recent = sorted(self.buckets.items(), key=lambda item: item[1][1], reverse=True)
+            self.buckets = dict(recent[:MAX_MEMORY_BUCKETS // 2])
+
+
+class CacheBackend:
+    def take(self, key, burst, rate):
+        now = time.time()
+        cache_key = f'ratelimit:{key}'
+        state, allowed, wait = take_token(cache.get(cache_key), now, burst, rate)
+        # Expire once the bucket would be full again anyway
+        cache.set(cache_key, state, timeout=int(burst / rate) + 1)
+        return allowed, wait
+
+
+_backends = {'memory': MemoryBackend(), 'cache': CacheBackend()}
+
+_metrics = {}
+_metrics_lock = threading.Lock()
+
+
+def limits():
+    return getattr(settings, 'RATE_LIMITS', {})
+
+
+def backend():
+    return _backends[getattr(settings, 'RATE_LIMIT_BACKEND', 'memory')]
+
+
+def record(endpoint, allowed):
+    with _metrics_lock:
+        entry = _metrics.setdefault(endpoint, {'allowed': 0, 'throttled': 0})
+        entry['allowed' if allowed else 'throttled'] += 1
+
+
+def metrics():
+    """Snapshot of {endpoint: {'allowed', 'throttled'}} for this process"""
+    with _metrics_lock:
+        return {endpoint: dict(entry) for endpoint, entry in _metrics.items()}
+
+
+def client_key(request):
+    """Session user id, or the client address for anonymous requests"""
+    user_id = request.session.get('user_id')
+    if user_id:
+        return f'user:{user_id}'
+    return f"ip:{request.META.get('REMOTE_ADDR', '')}"
+
+
+def rate_limited(endpoint, methods=None):
+    """Limit a view to RATE_LIMITS[endpoint] requests per user (only `methods`, if given)"""
+    def decorator(view):
+        @wraps(view)
+        def wrapped(request, *args, **kwargs):
+            spec = limits().get(endpoint)
+            if spec is None or (methods and request.method not in methods):
+                return view(request, *args, **kwargs)
+
+            allowed, wait = backend().take(
+                f'{endpoint}:{client_key(request)}', spec['burst'], spec['per_minute'] / 60,
+            )
+            record(endpoint, allowed)
+            if not allowed:
+                retry_after = max(1, int(wait + 0.999))
+                response = HttpResponse(
+                    f'Too many requests. Please try again in {retry_after} seconds.',
+                    status=429, content_type='text/plain',
+                )
+                response['Retry-After'] = str(retry_after)
+                return response
+            return view(request, *args, **kwargs)
+        return wrapped
+    return decorator
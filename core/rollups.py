@@ -0,0 +1,322 @@
+"""
+ANALYTICS ROLLUPS
+=================
+Summary tables behind the analytics page, so dashboards never scan
+project, problem or collaboration_request:
+
+- subfield_rollup     open/closed projects and problems by severity, per subfield
+- institution_rollup  pending/accepted/rejected requests received, per institution
+
+KEEPING THEM FRESH:
+- Saves and deletes (core/signals.py) move their row's count in the same
+  transaction: -1 on the key and column it had, +1 on the ones it has now
+  (a project changing subfield or closing, a request being accepted, a
+  user changing institution with their received requests), each one
+  UPDATE ... SET <column> = <column> + <n> on the rollup row.
+- A key with no rollup row yet is recounted instead: a batched
+  'refresh_rollups' task computes it with one grouped query per source
+  table restricted to the keys it names. Bulk writes (imports, batched
+  deletion) queue the same task for the keys they touched.
+- `manage.py rebuild_rollups` recomputes everything, e.g. after bulk SQL.
+  It also drops rows of institutions nobody belongs to any more, which
+  writes leave in place.
+
+Request counts include the archive (core/archive.py); archiving moves rows
+without changing any total. Archived requests deleted along with their
+user, project or post are taken off like hot ones.
+"""
+from collections import Counter
+
+from django.db import connection, transaction
+from django.db.models import Count, F, IntegerField
+from django.db.models.functions import Greatest
+from django.utils import timezone
+
+from .models import (
+    User, Subfield, Problem, Project, CollaborationRequest, ArchivedCollaborationRequest,
+    SubfieldRollup, InstitutionRollup,
+)
+from .tasks import task, enqueue
+
+# Keys refreshed per grouped query during a rebuild
+REBUILD_CHUNK_SIZE = 500
+
+
+def upsert(model, rows, unique_fields, update_fields):
+    # SQL: INSERT INTO <rollup table> (...) VALUES (...), ...
+    #      ON DUPLICATE KEY UPDATE ... / ON CONFLICT (<key>) DO UPDATE SET ...;
+    options = {'update_conflicts': True, 'update_fields': update_fields}
+    if connection.features.supports_update_conflicts_with_target:
+        options['unique_fields'] = unique_fields
+    model.objects.bulk_create(rows, **options)
+
+
+# ==============================================================================
+# SUBFIELD ROLLUP
+# ==============================================================================
+
+def refresh_subfields(subfield_ids):
+    """Recompute the rollup rows of the given subfields"""
+    # SQL: SELECT id, field_id FROM subfield WHERE id IN (<ids>);
+    # SQL: SELECT subfield_id, vacancy_status, COUNT(id) FROM project
+    #      WHERE subfield_id IN (<ids>) GROUP BY subfield_id, vacancy_status;
+    # SQL: SELECT subfield_id, severity, COUNT(id) FROM problem
+    #      WHERE subfield_id IN (<ids>) GROUP BY subfield_id, severity;
+    rollups = {
+        subfield_id: SubfieldRollup(subfield_id=subfield_id, field_id=field_id)
+        for subfield_id, field_id in Subfield.objects.filter(id__in=subfield_ids).values_list('id', 'field_id')
+    }
+    if not rollups:
+        return 0
+
+    projects = (
+        Project.objects.filter(subfield_id__in=rollups)
+        .values_list('subfield_id', 'vacancy_status')
+        .annotate(count=Count('id'))
+        .order_by()
+    )
+    for subfield_id, is_open, count in projects:
+        setattr(rollups[subfield_id], 'open_projects' if is_open else 'closed_projects', count)
+
+    problems = (
+        Problem.objects.filter(subfield_id__in=rollups)
+        .values_list('subfield_id', 'severity')
+        .annotate(count=Count('id'))
+        .order_by()
+    )
+    for subfield_id, severity, count in problems:
+        if severity in Problem.SEVERITY_RANKS:
+            setattr(rollups[subfield_id], f'{severity}_problems', count)
+
+    upsert(
+        SubfieldRollup, list(rollups.values()), ['subfield'],
+        ['field', 'open_projects', 'closed_projects', 'high_problems', 'medium_problems', 'low_problems', 'updated_at'],
+    )
+    return len(rollups)
+
+
+# ==============================================================================
+# INSTITUTION ROLLUP
+# ==============================================================================
+
+def refresh_institutions(institutions):
+    """Recompute the rollup rows of the given institutions"""
+    # SQL: SELECT user.institution, cr.status, COUNT(cr.id)
+    #      FROM collaboration_request cr JOIN user ON cr.receiver_id = user.id
+    #      WHERE user.institution IN (<names>) GROUP BY user.institution, cr.status;
+    # SQL: (Same query on collaboration_request_archive)
+    rollups = {
+        name: InstitutionRollup(institution=name)
+        for name in institutions
+    }
+    if not rollups:
+        return 0
+
+    for model in (CollaborationRequest, ArchivedCollaborationRequest):
+        counts = (
+            model.objects.filter(receiver__institution__in=rollups)
+            .values_list('receiver__institution', 'status')
+            .annotate(count=Count('id'))
+            .order_by()
+        )
+        for name, status, count in counts:
+            rollup = rollups[name]
+            column = f'{status}_requests'
+            setattr(rollup, column, getattr(rollup, column) + count)
+
+    # Institutions nobody belongs to any more are dropped
+    # SQL: SELECT DISTINCT institution FROM user WHERE institution IN (<names>);
+    existing = set(User.objects.filter(institution__in=rollups).values_list('institution', flat=True))
+    InstitutionRollup.objects.filter(institution__in=set(rollups) - existing).delete()
+    upsert(
+        InstitutionRollup, [rollups[name] for name in existing], ['institution'],
+        ['pending_requests', 'accepted_requests', 'rejected_requests', 'updated_at'],
+    )
+    return len(existing)
+
+
+# ==============================================================================
+# DELTAS
+# ==============================================================================
+
+def add(model, deltas):
+    """Add {(key, column): n} to existing rollup rows; returns the keys that have no row"""
+    # SQL: UPDATE <rollup table> SET <column> = GREATEST(<column> + <n>, 0), ..., updated_at = NOW()
+    #      WHERE <key> = <key>;    -- one per key
+    by_key = {}
+    for (key, column), amount in deltas.items():
+        if amount and key is not None:
+            by_key.setdefault(key, Counter())[column] += amount
+    missing = []
+    for key, columns in by_key.items():
+        columns = {column: amount for column, amount in columns.items() if amount}
+        if not columns:
+            continue
+        # Never below zero, should a count have drifted (bulk SQL before a rebuild)
+        updated = model.objects.filter(pk=key).update(updated_at=timezone.now(), **{
+            column: Greatest(F(column) + amount, 0, output_field=IntegerField())
+            for column, amount in columns.items()
+        })
+        if not updated:
+            missing.append(key)
+    return missing
+
+
+def subfield_deltas(deltas):
+    """Apply {(subfield_id, column): n}; subfields without a row are recounted"""
+    queue_refresh(subfield_ids=add(SubfieldRollup, deltas))
+
+
+def institution_deltas(deltas):
+    """Apply {(institution, column): n}; institutions without a row are recounted"""
+    queue_refresh(institutions=add(InstitutionRollup, deltas))
+
+
+def request_deltas(deltas):
+    """Apply {(receiver_id, column): n} to the receivers' institutions"""
+    # SQL: SELECT id, institution FROM user WHERE id IN (<receiver_ids>);
+    receivers = dict(
+        User.objects.filter(id__in={receiver_id for receiver_id, _ in deltas}).values_list('id', 'institution')
+    )
+    institution_deltas(Counter({
+        (receivers[receiver_id], column): amount
+        for (receiver_id, column), amount in deltas.items() if receiver_id in receivers
+    }))
+
+
+def problem_column(severity):
+    return f'{severity}_problems' if severity in Problem.SEVERITY_RANKS else None
+
+
+def request_column(status):
+    return f'{status}_requests' if status in dict(CollaborationRequest.STATUS_CHOICES) else None
+
+
+# Source rows counted in a rollup: model -> (columns read, (key, column) of a row, apply deltas)
+SOURCES = {
+    Project: (
+        ('subfield_id', 'vacancy_status'),
+        lambda row: (row['subfield_id'], 'open_projects' if row['vacancy_status'] else 'closed_projects'),
+        subfield_deltas,
+    ),
+    Problem: (
+        ('subfield_id', 'severity'),
+        lambda row: (row['subfield_id'], problem_column(row['severity'])),
+        subfield_deltas,
+    ),
+    CollaborationRequest: (
+        ('receiver_id', 'status'),
+        lambda row: (row['receiver_id'], request_column(row['status'])),
+        request_deltas,
+    ),
+}
+SOURCES[ArchivedCollaborationRequest] = SOURCES[CollaborationRequest]
+
+
+def row_changed(model, old, new):
+    """Move one source row's count from its old (key, column) to its new one; old/new are column dicts or None"""
+    _, key, apply_deltas = SOURCES[model]
+    before = key(old) if old else None
+    after = key(new) if new else None
+    if before == after:
+        return
+    deltas = Counter()
+    for counted, amount in ((before, -1), (after, 1)):
+        if counted and None not in counted:
+            deltas[counted] += amount
+    if deltas:
+        apply_deltas(deltas)
+
+
+def institution_changed(user_id, old, new):
+    """Move a user's received requests from institution `old` to `new`"""
+    # SQL: SELECT status, COUNT(id) FROM collaboration_request WHERE receiver_id = <user_id> GROUP BY status;
+    # SQL: (Same query on collaboration_request_archive)
+    deltas = Counter()
+    for model in (CollaborationRequest, ArchivedCollaborationRequest):
+        counts = model.objects.filter(receiver_id=user_id).values_list('status').annotate(count=Count('id')).order_by()
+        for status, count in counts:
+            deltas[(old, request_column(status))] -= count
+            deltas[(new, request_column(status))] += count
+    institution_deltas(deltas)
+
+
+def add_rows(subfields=(), institutions=()):
+    """Rows of zeros for new subfields / institutions, so they show before anything is counted"""
+    # SQL: INSERT INTO <rollup table> (...) VALUES (...) ON CONFLICT DO NOTHING;
+    if subfields:
+        SubfieldRollup.objects.bulk_create(
+            [SubfieldRollup(subfield_id=subfield.id, field_id=subfield.field_id) for subfield in subfields],
+            ignore_conflicts=True,
+        )
+    if institutions:
+        InstitutionRollup.objects.bulk_create(
+            [InstitutionRollup(institution=name) for name in institutions], ignore_conflicts=True,
+        )
+
+
+# ==============================================================================
+# QUEUEING AND REBUILDING
+# ==============================================================================
+
+def queue_refresh(subfield_ids=(), institutions=(), receiver_ids=()):
+    """
+    Ask the worker to recount these keys after the current transaction.
+    receiver_ids stand for their users' institutions, looked up by the task.
+    """
+    payload = {
+        'subfield_ids': sorted({subfield_id for subfield_id in subfield_ids if subfield_id is not None}),
+        'institutions': sorted({name for name in institutions if name}),
+        'receiver_ids': sorted({user_id for user_id in receiver_ids if user_id is not None}),
+    }
+    if any(payload.values()):
+        enqueue('refresh_rollups', **payload)
+
+
+@task('refresh_rollups', batch=True)
+def refresh_rollups(payloads):
+    """Refresh every key named by a batch of payloads, each key once"""
+    subfield_ids, institutions, receiver_ids = set(), set(), set()
+    for payload in payloads:
+        subfield_ids.update(payload.get('subfield_ids', []))
+        institutions.update(payload.get('institutions', []))
+        receiver_ids.update(payload.get('receiver_ids', []))
+    if receiver_ids:
+        # SQL: SELECT DISTINCT institution FROM user WHERE id IN (<receiver_ids>);
+        institutions.update(
+            User.objects.filter(id__in=receiver_ids).values_list('institution', flat=True).distinct()
+        )
+    if subfield_ids:
+        refresh_subfields(subfield_ids)
+    if institutions:
+        refresh_institutions(institutions)
+
+
+def chunks(values, size):
+    values = list(values)
+    for start in range(0, len(values), size):
+        yield values[start:start + size]
+
+
+def rebuild_all(chunk_size=REBUILD_CHUNK_SIZE, log=None):
+    """Recompute every rollup row; returns (subfields, institutions) refreshed"""
+    subfield_total = institution_total = 0
+
+    # SQL: SELECT id FROM subfield ORDER BY id;
+    for ids in chunks(Subfield.objects.order_by('id').values_list('id', flat=True), chunk_size):
+        with transaction.atomic():
+            subfield_total += refresh_subfields(ids)
+    if log:
+        log(f'subfield_rollup: {subfield_total} rows')
+
+    # SQL: SELECT DISTINCT institution FROM user ORDER BY institution;
+    names = User.objects.order_by('institution').values_list('institution', flat=True).distinct()
+    with transaction.atomic():
+        # Rows for institutions that no longer exist
+        InstitutionRollup.objects.exclude(institution__in=User.objects.values('institution')).delete()
+    for batch in chunks(names, chunk_size):
+        with transaction.atomic():
+            institution_total += refresh_institutions(batch)
+    if log:
+        log(f'institution_rollup: {institution_total} rows')
+    return subfield_total, institution_total
@@ -0,0 +1,240 @@
+"""
+READ-REPLICA ROUTING
+====================
+Sends the queries of read-only views to a replica database while every
+write (and every other view) stays on 'default' (the primary).
+
+PIECES:
+- @replica_reads          marks a view as safe to serve from a replica
+- ReplicaRoutingMiddleware picks a replica for those views, times their
+                          queries per alias (metrics()) and sets the sticky
+                          cookie after any other request
+- PrimaryReplicaRouter    DATABASE_ROUTERS entry; reads of `core` models go
+                          to the replica picked for the current request
+
+READ-YOUR-WRITES: any request to a view that is not @replica_reads (POSTs,
+but also the GET links that accept/reject/collaborate) sets a short-lived
+cookie, and until it expires that browser reads from the primary, so users
+always see their own changes.
+
+STREAMED RESPONSES: their body is read after the view has returned
+(core/streaming.py, exports). The middleware hands its routing context and
+query timers to the body, which keeps them until it has been sent or the
+response is closed.
+
+LAG: replicas are checked at most every REPLICA_LAG_CHECK_SECONDS; one that
+is unreachable or more than REPLICA_MAX_LAG_SECONDS behind is skipped until
+the next check. If no replica qualifies, reads go to the primary.
+
+SETTINGS:
+    REPLICA_DATABASES = ['replica']     # aliases from DATABASES
+    REPLICA_STICKY_SECONDS = 5
+    REPLICA_MAX_LAG_SECONDS = 2
+    REPLICA_LAG_CHECK_SECONDS = 5
+"""
+import contextvars
+import itertools
+import logging
+import threading
+import time
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import connections
+
+logger = logging.getLogger(__name__)
+
+STICKY_COOKIE = 'primary_until'
+
+# Alias that `core` reads should use during the current request (None = primary)
+_read_alias = contextvars.ContextVar('read_alias', default=None)
+
+
+def replica_reads(view):
+    """Mark a view as read-only, so its queries may be served by a replica"""
+    view.replica_reads = True
+    return view
+
+
+class PrimaryReplicaRouter:
+    """Route `core` reads to the request's replica; everything else to default"""
+
+    def db_for_read(self, model, **hints):
+        if model._meta.app_label == 'core':
+            return _read_alias.get()
+        return None
+
+    def db_for_write(self, model, **hints):
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Primary and replicas hold the same data
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return True
+
+
+# ==============================================================================
+# REPLICA HEALTH
+# ==============================================================================
+
+_lag_cache = {}          # alias -> (checked_at, healthy)
+_lag_lock = threading.Lock()
+_round_robin = itertools.count()
+
+
+def replica_lag(alias):
+    """Seconds the replica is behind the primary (0 if the backend can't tell)"""
+    connection = connections[alias]
+    if connection.vendor != 'mysql':
+        return 0
+    with connection.cursor() as cursor:
+        try:
+            cursor.execute('SHOW REPLICA STATUS')
+        except Exception:
+            cursor.execute('SHOW SLAVE STATUS')  # MySQL < 8.0.22
+        row = cursor.fetchone()
+        if row is None:
+            return 0  # not configured as a replica (e.g. a local copy)
+        columns = [col[0] for col in cursor.description]
+    status = dict(zip(columns, row))
+    lag = status.get('Seconds_Behind_Source', status.get('Seconds_Behind_Master'))
+    # NULL means replication is stopped
+    return float('inf') if lag is None else lag
+
+
+def is_healthy(alias):
+    max_lag = getattr(settings, 'REPLICA_MAX_LAG_SECONDS', 2)
+    interval = getattr(settings, 'REPLICA_LAG_CHECK_SECONDS', 5)
+    now = time.monotonic()
+    with _lag_lock:
+        cached = _lag_cache.get(alias)
+        if cached and now - cached[0] < interval:
+            return cached[1]
+    try:
+        healthy = replica_lag(alias) <= max_lag
+    except Exception:
+        logger.warning('Replica %s is unreachable, reading from primary', alias, exc_info=True)
+        healthy = False
+    with _lag_lock:
+        _lag_cache[alias] = (now, healthy)
+    return healthy
+
+
+def choose_replica():
+    """Pick a healthy replica (round robin), or None to use the primary"""
+    replicas = [alias for alias in getattr(settings, 'REPLICA_DATABASES', []) if is_healthy(alias)]
+    if not replicas:
+        return None
+    return replicas[next(_round_robin) % len(replicas)]
+
+
+# ==============================================================================
+# PER-ALIAS QUERY METRICS
+# ==============================================================================
+
+_metrics = {}
+_metrics_lock = threading.Lock()
+
+
+def _record(alias, elapsed):
+    with _metrics_lock:
+        entry = _metrics.setdefault(alias, {'queries': 0, 'seconds': 0.0})
+        entry['queries'] += 1
+        entry['seconds'] += elapsed
+
+
+def _metrics_wrapper(alias):
+    def wrapper(execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            _record(alias, time.perf_counter() - start)
+    return wrapper
+
+
+def metrics():
+    """Snapshot of {alias: {'queries', 'seconds'}} for this process"""
+    with _metrics_lock:
+        return {alias: dict(entry) for alias, entry in _metrics.items()}
+
+
+# ==============================================================================
+# MIDDLEWARE
+# ==============================================================================
+
+class ReplicaRoutingMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        request.read_alias = None
+        with ExitStack() as stack:
+            # process_view adds the query metrics wrappers for routed views
+            request._replica_metrics = stack
+            token = _read_alias.set(None)
+            try:
+                response = self.get_response(request)
+                if response.streaming:
+                    response.streaming_content = RoutedStream(
+                        response.streaming_content, contextvars.copy_context(), stack.pop_all(),
+                    )
+            finally:
+                _read_alias.reset(token)
+
+        # Any view that isn't a replica read may have written: pin this
+        # browser to the primary for a few seconds so it sees its own writes
+        if getattr(request, 'replica_candidate', None) is False and getattr(settings, 'REPLICA_DATABASES', []):
+            sticky = getattr(settings, 'REPLICA_STICKY_SECONDS', 5)
+            response.set_cookie(STICKY_COOKIE, str(int(time.time()) + sticky), max_age=sticky, httponly=True)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        request.replica_candidate = (
+            request.method in ('GET', 'HEAD') and getattr(view_func, 'replica_reads', False)
+        )
+        if not request.replica_candidate:
+            return None
+        # Time the routed views only (pinned ones too, they are the primary's
+        # share of the same pages); admin, static and writes pay nothing
+        for alias in connections:
+            request._replica_metrics.enter_context(connections[alias].execute_wrapper(_metrics_wrapper(alias)))
+        if self.is_pinned(request):
+            return None
+        alias = choose_replica()
+        if alias:
+            request.read_alias = alias
+            _read_alias.set(alias)
+        return None
+
+    def is_pinned(self, request):
+        try:
+            return int(request.COOKIES.get(STICKY_COOKIE, 0)) > time.time()
+        except ValueError:
+            return False
+
+
+class RoutedStream:
+    """Body of a streamed response, read in its request's routing context with the query timers still on"""
+
+    def __init__(self, chunks, context, stack):
+        self.chunks = chunks
+        self.context = context
+        self.stack = stack
+
+    def __iter__(self):
+        iterator = iter(self.chunks)
+        try:
+            while True:
+                try:
+                    yield self.context.run(next, iterator)
+                except StopIteration:
+                    return
+        finally:
+            self.close()
+
+    def close(self):
+        # Also called by the response when it is closed unread
+        self.stack.close()
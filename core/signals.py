@@ -0,0 +1,192 @@
+"""
+SIGNAL HANDLERS
+===============
+Bump resource versions (core/versions.py) whenever a row that a cached page
+depends on is written, move the analytics rollup counts (core/rollups.py),
+queue updates of the researcher facet counts (core/facets.py), and
+index new posts for near-duplicate detection (core/dedup.py). Connected in
+CoreConfig.ready().
+
+NOTE: QuerySet.update(), bulk_create() and raw SQL do not send these
+signals; code that uses them must call versions.bump() /
+rollups.queue_refresh() / facets.queue_update() itself (core/deletion.py
+does so for its batched DELETEs).
+"""
+from django.db import transaction
+from django.db.models.signals import pre_save, post_save, post_delete, m2m_changed
+from django.dispatch import receiver
+
+from .models import (
+    Field, Subfield, User, Problem, Project, Post, CollaborationRequest, ArchivedCollaborationRequest, SubfieldRollup,
+)
+from . import rollups
+from .dedup import index_post
+from .facets import FACETS, changes, facet_values, queue_update, user_written
+from .versions import bump
+
+
+@receiver([post_save, post_delete], sender=Post)
+def post_changed(sender, instance, **kwargs):
+    bump('feed')
+
+
+@receiver([post_save, post_delete], sender=User)
+def user_changed(sender, instance, **kwargs):
+    # Names and institutions appear on almost every page
+    bump('users', f'profile:{instance.id}')
+
+
+@receiver([post_save, post_delete], sender=CollaborationRequest)
+def collaboration_request_changed(sender, instance, **kwargs):
+    bump(f'inbox:{instance.receiver_id}')
+
+
+@receiver(pre_save, sender=Project)
+def project_saving(sender, instance, using, update_fields=None, **kwargs):
+    # A project moved to another owner or subfield leaves the old pages too
+    # SQL: SELECT owner_id, subfield_id FROM project WHERE id = <id>;
+    instance._versions_old = None
+    if instance._state.adding:
+        return
+    if update_fields is None or set(update_fields) & {'owner', 'owner_id', 'subfield', 'subfield_id'}:
+        instance._versions_old = Project.objects.using(using).filter(pk=instance.pk).values(
+            'owner_id', 'subfield_id').first()
+
+
+@receiver([post_save, post_delete], sender=Project)
+def project_changed(sender, instance, **kwargs):
+    keys = [f'profile:{instance.owner_id}', f'subfield:{instance.subfield_id}']
+    old = getattr(instance, '_versions_old', None)
+    if old:
+        keys += [f"profile:{old['owner_id']}", f"subfield:{old['subfield_id']}"]
+    bump(*keys)
+
+
+@receiver(m2m_changed, sender=Project.collaborators.through)
+def project_collaborators_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    # clear() has no pk_set, so its projects are looked up before the rows go
+    if action not in ('post_add', 'post_remove', 'pre_clear'):
+        return
+    if not reverse:
+        bump(f'profile:{instance.owner_id}')
+        return
+    # user.collaborated_projects.add(...) - instance is the User
+    # SQL: SELECT owner_id FROM project WHERE id IN (<pk_set>);
+    if action == 'pre_clear':
+        projects = Project.objects.filter(collaborators=instance)
+    else:
+        projects = Project.objects.filter(id__in=pk_set)
+    owner_ids = set(projects.values_list('owner_id', flat=True))
+    bump(*[f'profile:{owner_id}' for owner_id in owner_ids])
+
+
+@receiver([post_save, post_delete], sender=Problem)
+def problem_changed(sender, instance, **kwargs):
+    bump(f'problem:{instance.id}')
+
+
+@receiver([post_save, post_delete], sender=Field)
+@receiver([post_save, post_delete], sender=Subfield)
+def taxonomy_changed(sender, instance, **kwargs):
+    bump('taxonomy')
+
+
+# ==============================================================================
+# ANALYTICS ROLLUPS
+# ==============================================================================
+
+@receiver(pre_save, sender=Project)
+@receiver(pre_save, sender=Problem)
+@receiver(pre_save, sender=CollaborationRequest)
+def rollup_row_saving(sender, instance, using, update_fields=None, **kwargs):
+    # The key and column being replaced, for the -1 side of the move
+    # SQL: SELECT <rollup columns> FROM <table> WHERE id = <id>;
+    columns = rollups.SOURCES[sender][0]
+    instance._rollup_old = None
+    if instance._state.adding:
+        return
+    if update_fields is not None and not set(update_fields) & {*columns, *(c.removesuffix('_id') for c in columns)}:
+        return
+    instance._rollup_old = sender.objects.using(using).filter(pk=instance.pk).values(*columns).first()
+
+
+@receiver(post_save, sender=Project)
+@receiver(post_save, sender=Problem)
+@receiver(post_save, sender=CollaborationRequest)
+def rollup_row_saved(sender, instance, created, **kwargs):
+    old = getattr(instance, '_rollup_old', None)
+    if created or old is not None:
+        columns = rollups.SOURCES[sender][0]
+        rollups.row_changed(sender, old, {column: getattr(instance, column) for column in columns})
+
+
+@receiver(post_delete, sender=Project)
+@receiver(post_delete, sender=Problem)
+@receiver(post_delete, sender=CollaborationRequest)
+# Archived rows are only written in bulk, but deleting a user, project or
+# post takes theirs along: this receiver makes the collector send their
+# post_delete instead of one signal-less DELETE
+@receiver(post_delete, sender=ArchivedCollaborationRequest)
+def rollup_row_deleted(sender, instance, **kwargs):
+    columns = rollups.SOURCES[sender][0]
+    rollups.row_changed(sender, {column: getattr(instance, column) for column in columns}, None)
+
+
+@receiver(post_save, sender=Subfield)
+def rollup_subfield_saved(sender, instance, created, **kwargs):
+    # Empty subfields get a row of zeros too (deletes cascade to the rollup)
+    # SQL: UPDATE subfield_rollup SET field_id = <field_id> WHERE subfield_id = <id>;
+    if created:
+        rollups.add_rows(subfields=[instance])
+    else:
+        SubfieldRollup.objects.filter(subfield_id=instance.id).update(field_id=instance.field_id)
+
+
+@receiver(post_save, sender=User)
+def rollup_user_saved(sender, instance, created, **kwargs):
+    # facet_user_saving read the old institution
+    old = (getattr(instance, '_facet_old', None) or {}).get('institution')
+    if created:
+        rollups.add_rows(institutions=[instance.institution])
+    elif old and old != instance.institution:
+        rollups.institution_changed(instance.id, old, instance.institution)
+
+
+# ==============================================================================
+# RESEARCHER FACETS
+# ==============================================================================
+
+@receiver(pre_save, sender=User)
+def facet_user_saving(sender, instance, using, update_fields=None, **kwargs):
+    # The values being replaced, for the -1 side of the deltas
+    # SQL: SELECT country, institution, field, user_type FROM user WHERE id = <id>;
+    instance._facet_old = None
+    if instance._state.adding or (update_fields is not None and not set(update_fields) & set(FACETS)):
+        return
+    instance._facet_old = User.objects.using(using).filter(pk=instance.pk).values(*FACETS).first()
+
+
+@receiver(post_save, sender=User)
+def facet_user_saved(sender, instance, update_fields=None, **kwargs):
+    if update_fields is not None and not set(update_fields) & set(FACETS):
+        return
+    values = facet_values(instance)
+    queue_update(changes(getattr(instance, '_facet_old', None), values))
+    transaction.on_commit(lambda: user_written(instance.id, values))
+
+
+@receiver(post_delete, sender=User)
+def facet_user_deleted(sender, instance, **kwargs):
+    queue_update(changes(facet_values(instance), None))
+    transaction.on_commit(lambda: user_written(instance.id, None))
+
+
+# ==============================================================================
+# NEAR-DUPLICATE POSTS
+# ==============================================================================
+
+@receiver(post_save, sender=Post)
+def post_created(sender, instance, created, raw=False, **kwargs):
+    # Flag reposts at write time (core/dedup.py); fixtures are left alone
+    if created and not raw:
+        index_post(instance)
@@ -0,0 +1,180 @@
+"""
+STREAMED PAGES
+==============
+Long list pages (feed, notifications, researcher search) are sent while
+their rows are still being read, instead of after the whole list has been
+queried and rendered:
+
+1. The page template is rendered with a marker in place of each list
+   ({% stream_slot 'posts' %}) - cheap, it holds no rows - and everything
+   up to the first marker (<head>, navigation, forms) is sent at once.
+2. Each list is then read in keyset chunks of STREAM_CHUNK_SIZE rows
+   (WHERE (created_at, id) < (<last row>) ORDER BY ... LIMIT n), every row
+   rendered with a small item template (core/_post.html, ...), and the
+   HTML flushed every STREAM_FLUSH_ROWS rows.
+3. The rest of the page follows the last list.
+
+Memory per request holds one chunk of rows, whatever the list size.
+
+The rows are read after the view has returned. The response iterates
+inside a copy of the view's context variables, so strict loading
+(core/strict.py) still applies to those queries, and the routing
+middleware keeps the request's replica and query timings until the body
+has been sent (core/routers.py).
+
+An error while the rows stream comes after the 200 and the page head have
+gone out: it is logged and reported like a view's (got_request_exception),
+and the page ends with a notice instead of being cut off silently.
+"""
+import contextvars
+import heapq
+import logging
+import operator
+
+from django.conf import settings
+from django.core.signals import got_request_exception
+from django.db.models import Q
+from django.http import StreamingHttpResponse
+from django.template import Context, RequestContext, loader
+
+logger = logging.getLogger(__name__)
+
+SLOT_MARKER = '<!--stream-slot:{}-->'
+
+# Sent in place of the rest of the page when streaming fails
+ERROR_NOTICE = (
+    '<div class="alert alert-danger">Sorry, the rest of this page could not be loaded. '
+    'Please reload.</div>'
+)
+
+
+def load_template(name):
+    """django.template.Template behind the configured engine's template"""
+    return loader.get_template(name).template
+
+
+class Slot:
+    """
+    A list streamed into the page.
+
+    rows:      any iterable; rendered one by one as it yields
+    template:  item template, gets the row as `as_name` (plus `request`)
+    empty:     with no rows, render the item template once with `as_name`
+               set to None (its {% else %} branch holds the "nothing here")
+    """
+
+    def __init__(self, rows, template, as_name, empty=True, context=None):
+        self.rows = rows
+        self.template = template
+        self.as_name = as_name
+        self.empty = empty
+        self.context = context or {}
+
+    def render(self, request, load, flush_rows):
+        item = load(self.template)
+        context = Context({'request': request, **self.context})
+        buffer = []
+        count = 0
+        try:
+            for row in self.rows:
+                with context.push({self.as_name: row}):
+                    buffer.append(item.render(context))
+                count += 1
+                if len(buffer) >= flush_rows:
+                    yield ''.join(buffer)
+                    buffer = []
+        except Exception:
+            # Send the rows already rendered before the error notice
+            if buffer:
+                yield ''.join(buffer)
+            raise
+        if buffer:
+            yield ''.join(buffer)
+        if not count and self.empty:
+            with context.push({self.as_name: None}):
+                yield item.render(context)
+
+
+def stream_page(request, template_name, context, slots, load=load_template, flush_rows=None):
+    """Yield the page as HTML chunks: the page up to each slot, then the slot's rows"""
+    flush_rows = flush_rows or getattr(settings, 'STREAM_FLUSH_ROWS', 20)
+    page = load(template_name).render(RequestContext(request, context))
+    for name, slot in slots.items():
+        marker = SLOT_MARKER.format(name)
+        head, found, page = page.partition(marker)
+        yield head
+        if found:
+            yield from slot.render(request, load, flush_rows)
+    yield page
+
+
+def guarded(request, chunks):
+    """Pass the chunks on; an error ends the page with ERROR_NOTICE"""
+    try:
+        yield from chunks
+    except Exception:
+        logger.exception('Error while streaming %s', request.path)
+        got_request_exception.send(sender=None, request=request)
+        yield ERROR_NOTICE
+
+
+def in_context(context, iterable):
+    """Iterate inside a contextvars context (the one captured in the view)"""
+    iterator = iter(iterable)
+    while True:
+        try:
+            yield context.run(next, iterator)
+        except StopIteration:
+            return
+
+
+def render_streamed(request, template_name, context, slots):
+    """StreamingHttpResponse version of render() for pages with stream slots"""
+    chunks = guarded(request, stream_page(request, template_name, context, slots))
+    response = StreamingHttpResponse(
+        in_context(contextvars.copy_context(), chunks),
+        content_type='text/html; charset=utf-8',
+    )
+    # Reverse proxies (nginx) would otherwise buffer the whole response
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
+# ==============================================================================
+# ROW SOURCES
+# ==============================================================================
+
+def keyset_rows(queryset, ordering, chunk_size=None):
+    """
+    Yield the queryset's rows in `ordering` (all ascending or all
+    descending, ending with a unique column such as id), one LIMIT query
+    per chunk.
+    """
+    # SQL: SELECT ... ORDER BY created_at DESC, id DESC LIMIT <chunk_size>;
+    # SQL: SELECT ... WHERE (created_at < <c>) OR (created_at = <c> AND id < <id>)
+    #      ORDER BY created_at DESC, id DESC LIMIT <chunk_size>;   (repeated)
+    chunk_size = chunk_size or getattr(settings, 'STREAM_CHUNK_SIZE', 200)
+    names = [name.lstrip('-') for name in ordering]
+    lookup = 'lt' if ordering[0].startswith('-') else 'gt'
+    queryset = queryset.order_by(*ordering)
+    last = None
+    while True:
+        chunk = queryset
+        if last is not None:
+            condition = Q()
+            for i, name in enumerate(names):
+                step = Q(**{f'{name}__{lookup}': last[i]})
+                for previous, value in zip(names[:i], last[:i]):
+                    step &= Q(**{previous: value})
+                condition |= step
+            chunk = chunk.filter(condition)
+        rows = list(chunk[:chunk_size])
+        yield from rows
+        if len(rows) < chunk_size:
+            return
+        last = [getattr(rows[-1], name) for name in names]
+
+
+def merged(*streams, key, reverse=False):
+    """Merge already-sorted row streams into one (e.g. hot table + archive)"""
+    return heapq.merge(*streams, key=operator.attrgetter(key), reverse=reverse)
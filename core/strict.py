@@ -0,0 +1,196 @@
+"""
+STRICT LOADING
+==============
+Catches lazy relation loads (the usual source of N+1 queries) while a
+`core` view or its template runs:
+
+- a ForeignKey / OneToOne not loaded with select_related()
+      {{ post.author.name }}         -> SELECT * FROM user WHERE id = ...
+- a reverse FK / many-to-many manager evaluated without prefetch_related()
+      {{ project.collaborators.count }}
+- a field left out by only()/defer()
+      Post.objects.only('id').first().content
+
+SETTINGS:
+    STRICT_LOADING = None      # off (default)
+    STRICT_LOADING = 'log'     # warning with the stack trace (dev)
+    STRICT_LOADING = 'raise'   # StrictLoadingError (tests)
+
+StrictLoadingMiddleware turns the check on per request, for views defined
+in `core` only (the admin is left alone). Code that loads a relation lazily
+on purpose, e.g. once per request, wraps it in `allow_lazy()`.
+
+The checks are patched into Django's descriptors and QuerySet at startup
+(install(), from CoreConfig.ready); outside a strict request they cost one
+context variable lookup on the paths that would run a query anyway.
+"""
+import contextvars
+import logging
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db.models import query
+from django.db.models.fields.related_descriptors import (
+    ForwardManyToOneDescriptor, ReverseOneToOneDescriptor,
+    ReverseManyToOneDescriptor,
+)
+from django.db.models.query_utils import DeferredAttribute
+
+logger = logging.getLogger(__name__)
+
+# 'log' / 'raise' while a strict request runs, else None
+_mode = contextvars.ContextVar('strict_loading', default=None)
+# Set while prefetch_related() runs its own queries
+_prefetching = contextvars.ContextVar('strict_prefetching', default=False)
+
+# Query hint carried by querysets of a related manager that wasn't prefetched
+LAZY_HINT = 'strict_lazy_relation'
+
+
+class StrictLoadingError(Exception):
+    """Raised for a lazy relation load when STRICT_LOADING = 'raise'"""
+
+
+def violation(what):
+    mode = _mode.get()
+    message = f'Lazy load of {what}; use select_related()/prefetch_related()/only() in the view'
+    if mode == 'raise':
+        raise StrictLoadingError(message)
+    logger.warning(message, stack_info=True)
+
+
+@contextmanager
+def strict(mode='raise'):
+    """Run a block with strict loading (tests, shell sessions)"""
+    token = _mode.set(mode)
+    try:
+        yield
+    finally:
+        _mode.reset(token)
+
+
+@contextmanager
+def allow_lazy():
+    """Allow lazy loads inside the block"""
+    token = _mode.set(None)
+    try:
+        yield
+    finally:
+        _mode.reset(token)
+
+
+class StrictLoadingMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        token = _mode.set(None)
+        try:
+            return self.get_response(request)
+        finally:
+            _mode.reset(token)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        mode = getattr(settings, 'STRICT_LOADING', None)
+        if mode and view_func.__module__.startswith('core.'):
+            _mode.set(mode)
+
+
+# ==============================================================================
+# PATCHES
+# ==============================================================================
+
+def _forward_get(original):
+    # post.author when post_id is set but the author wasn't select_related()
+    def __get__(self, instance, cls=None):
+        if (instance is not None and _mode.get() and not self.field.is_cached(instance)
+                and None not in self.field.get_local_related_value(instance)):
+            violation(f'{type(instance).__name__}.{self.field.name}')
+        return original(self, instance, cls)
+    return __get__
+
+
+def _reverse_one_get(original):
+    # subfield.subfieldrollup
+    def __get__(self, instance, cls=None):
+        if (instance is not None and _mode.get() and not self.related.is_cached(instance)
+                and instance.pk is not None):
+            violation(f'{type(instance).__name__}.{self.related.get_accessor_name()}')
+        return original(self, instance, cls)
+    return __get__
+
+
+def _manager_get(original):
+    # project.collaborators / user.posts: tag the manager unless prefetched
+    def __get__(self, instance, cls=None):
+        manager = original(self, instance, cls)
+        if instance is not None and _mode.get():
+            # Many-to-many managers name their prefetch cache; reverse FK ones use the relation's
+            cache_name = getattr(manager, 'prefetch_cache_name', None) or self.rel.cache_name
+            if cache_name not in getattr(instance, '_prefetched_objects_cache', {}):
+                name = self.field.name if getattr(self, 'reverse', True) is False else self.rel.get_accessor_name()
+                label = f'{type(instance).__name__}.{name}'
+                manager._hints = {**manager._hints, LAZY_HINT: label}
+                # Many-to-many count()/exists() query the join table directly,
+                # without the manager's queryset
+                for method in ('count', 'exists'):
+                    setattr(manager, method, _flagged(getattr(manager, method), label))
+        return manager
+    return __get__
+
+
+def _flagged(method, label):
+    def flagged(*args, **kwargs):
+        if _mode.get() and not _prefetching.get():
+            violation(label)
+        return method(*args, **kwargs)
+    return flagged
+
+
+def _deferred_get(original):
+    # A field left out by only()/defer(): refresh_from_db() per instance
+    def __get__(self, instance, cls=None):
+        if (instance is not None and _mode.get() and self.field.attname not in instance.__dict__
+                and not self.field.primary_key):
+            violation(f'deferred field {type(instance).__name__}.{self.field.attname}')
+        return original(self, instance, cls)
+    return __get__
+
+
+def _checked(original):
+    # QuerySet methods that run a query; flagged for tagged related-manager querysets
+    def method(self, *args, **kwargs):
+        if (self._result_cache is None and LAZY_HINT in self._hints
+                and _mode.get() and not _prefetching.get()):
+            violation(self._hints[LAZY_HINT])
+        return original(self, *args, **kwargs)
+    return method
+
+
+def _prefetch_one_level(original):
+    def prefetch_one_level(*args, **kwargs):
+        token = _prefetching.set(True)
+        try:
+            return original(*args, **kwargs)
+        finally:
+            _prefetching.reset(token)
+    return prefetch_one_level
+
+
+_installed = False
+
+
+def install():
+    """Patch the checks into Django (once per process)"""
+    global _installed
+    if _installed:
+        return
+    _installed = True
+    # ForwardOneToOneDescriptor and ManyToManyDescriptor inherit these
+    ForwardManyToOneDescriptor.__get__ = _forward_get(ForwardManyToOneDescriptor.__get__)
+    ReverseOneToOneDescriptor.__get__ = _reverse_one_get(ReverseOneToOneDescriptor.__get__)
+    ReverseManyToOneDescriptor.__get__ = _manager_get(ReverseManyToOneDescriptor.__get__)
+    DeferredAttribute.__get__ = _deferred_get(DeferredAttribute.__get__)
+    for name in ('_fetch_all', 'count', 'exists', 'aggregate'):
+        setattr(query.QuerySet, name, _checked(getattr(query.QuerySet, name)))
+    query.prefetch_one_level = _prefetch_one_level(query.prefetch_one_level)
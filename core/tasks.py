@@ -0,0 +1,168 @@
+"""
+BACKGROUND TASK QUEUE
+=====================
+A small database-backed queue for work that doesn't have to finish before
+the user gets their response. No broker needed: tasks are rows in the
+`task` table and `manage.py run_worker` executes them.
+
+USAGE:
+    @task('flush_counters', batch=True)
+    def flush_counters(payloads): ...
+
+    enqueue('flush_counters', counts={'core.Post': {'view_count': {'7': 3}}})
+
+- enqueue() defers the INSERT with transaction.on_commit, so a write that
+  rolls back never leaves a task behind.
+- batch=True handlers receive every claimed payload of that task name at
+  once, so N similar tasks cost one handler call. If the batch fails, its
+  tasks are run again one at a time, so one bad payload can't fail the
+  others.
+- Failed tasks are retried with exponential backoff up to
+  TASK_QUEUE_MAX_ATTEMPTS, then kept with status 'failed'.
+- atomic=False handlers run outside the worker's transaction, for long
+  jobs that commit their own batches.
+- TASK_QUEUE_EAGER = True runs tasks in-process right after commit instead
+  (set in the dev and bench settings, so they need no worker).
+
+Only side effects belong here (counters, rollups, caches, cleanup): a
+write the user asked for is made in the request.
+"""
+import logging
+import traceback
+from contextlib import nullcontext
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .models import Task
+
+logger = logging.getLogger(__name__)
+
+# name -> (handler, batch, atomic)
+REGISTRY = {}
+
+# A 'running' task whose worker died is handed out again after this long
+LOCK_TIMEOUT = timedelta(minutes=10)
+
+
+def task(name, batch=False, atomic=True):
+    """Register a task handler under the given name"""
+    def decorator(func):
+        REGISTRY[name] = (func, batch, atomic)
+        return func
+    return decorator
+
+
+def enqueue(name, **payload):
+    """Queue a task to run after the current transaction commits"""
+    if name not in REGISTRY:
+        raise KeyError(f'Unknown task: {name}')
+
+    if getattr(settings, 'TASK_QUEUE_EAGER', False):
+        transaction.on_commit(lambda: run_handler(name, [payload]), robust=True)
+    else:
+        # SQL: INSERT INTO task (name, payload, status, attempts, run_after, created_at)
+        #      VALUES (<name>, <payload>, 'queued', 0, NOW(), NOW());
+        transaction.on_commit(lambda: Task.objects.create(name=name, payload=payload))
+
+
+def run_handler(name, payloads):
+    """Call the handler for a list of payloads (one call per payload unless batched)"""
+    handler, batch, _ = REGISTRY[name]
+    if batch:
+        handler(payloads)
+    else:
+        for payload in payloads:
+            handler(**payload)
+
+
+# ==============================================================================
+# WORKER
+# ==============================================================================
+
+def claim(limit):
+    """Atomically mark up to `limit` due tasks as running and return them"""
+    # SQL: SELECT * FROM task
+    #      WHERE (status = 'queued' AND run_after <= NOW())
+    #         OR (status = 'running' AND locked_at < NOW() - <LOCK_TIMEOUT>)
+    #      ORDER BY id LIMIT <limit>
+    #      FOR UPDATE SKIP LOCKED;
+    # SQL: UPDATE task SET status = 'running', locked_at = NOW(), attempts = attempts + 1
+    #      WHERE id IN (<claimed ids>);
+    now = timezone.now()
+    with transaction.atomic():
+        due = Task.objects.filter(status='queued', run_after__lte=now)
+        stale = Task.objects.filter(status='running', locked_at__lt=now - LOCK_TIMEOUT)
+        tasks = list(
+            (due | stale).select_for_update(skip_locked=True).order_by('id')[:limit]
+        )
+        for claimed in tasks:
+            claimed.status = 'running'
+            claimed.locked_at = now
+            claimed.attempts += 1
+        Task.objects.bulk_update(tasks, ['status', 'locked_at', 'attempts'])
+    return tasks
+
+
+def process(tasks):
+    """Run claimed tasks grouped by name; returns (succeeded, failed) counts"""
+    groups = {}
+    for claimed in tasks:
+        groups.setdefault(claimed.name, []).append(claimed)
+
+    succeeded = failed = 0
+    for name, group in groups.items():
+        if len(group) > 1:
+            try:
+                run_group(name, group)
+            except Exception:
+                # Run each task on its own: only the payloads that fail by
+                # themselves are retried (their batch was rolled back)
+                logger.warning('Task %s failed as a batch of %d, running them one by one', name, len(group), exc_info=True)
+            else:
+                succeeded += len(group)
+                continue
+        for claimed in group:
+            try:
+                run_group(name, [claimed])
+            except Exception:
+                logger.exception('Task %s failed (id %s)', name, claimed.id)
+                retry_or_fail(claimed, traceback.format_exc())
+                failed += 1
+            else:
+                succeeded += 1
+    return succeeded, failed
+
+
+def run_group(name, group):
+    """Run claimed tasks of one name (in one transaction unless atomic=False), then delete them"""
+    if name not in REGISTRY:
+        raise KeyError(f'Unknown task: {name}')
+    atomic = REGISTRY[name][2]
+    with transaction.atomic() if atomic else nullcontext():
+        run_handler(name, [claimed.payload for claimed in group])
+    # SQL: DELETE FROM task WHERE id IN (<finished ids>);
+    Task.objects.filter(id__in=[claimed.id for claimed in group]).delete()
+
+
+def retry_or_fail(claimed, error):
+    max_attempts = getattr(settings, 'TASK_QUEUE_MAX_ATTEMPTS', 5)
+    claimed.last_error = error
+    claimed.locked_at = None
+    if claimed.attempts >= max_attempts:
+        claimed.status = 'failed'
+    else:
+        claimed.status = 'queued'
+        claimed.run_after = timezone.now() + timedelta(seconds=2 ** claimed.attempts)
+    claimed.save(update_fields=['status', 'run_after', 'locked_at', 'last_error'])
+
+
+def run_once(limit=100):
+    """Claim and run one batch; returns the number of tasks processed"""
+    tasks = claim(limit)
+    if tasks:
+        process(tasks)
+    return len(tasks)
+
@@ -0,0 +1,40 @@
+"""
+TEMPLATE WARM-UP
+================
+With the cached template loader (see research_fb/settings/prod.py) every
+template is read and compiled once per process and then reused. The first
+request to each page would still pay for parsing, so when TEMPLATE_WARMUP
+is on, the web entry points (research_fb/wsgi.py, asgi.py) compile every
+core/*.html template at startup and no request ever parses a template.
+Management commands and the worker render no pages and skip it.
+"""
+from pathlib import Path
+
+from django.conf import settings
+from django.template import engines
+
+TEMPLATE_DIR = Path(__file__).resolve().parent / 'templates'
+
+
+def core_template_names():
+    """'core/feed.html', 'core/base.html', ... for every template of the app"""
+    return sorted(
+        path.relative_to(TEMPLATE_DIR).as_posix()
+        for path in (TEMPLATE_DIR / 'core').glob('*.html')
+    )
+
+
+def warm_templates():
+    """Load (and, with the cached loader, keep) every core template; returns the count"""
+    names = core_template_names()
+    for engine in engines.all():
+        for name in names:
+            engine.get_template(name)
+    return len(names)
+
+
+def warm_up():
+    """warm_templates() if TEMPLATE_WARMUP is on; returns the count (0 when off)"""
+    if not getattr(settings, 'TEMPLATE_WARMUP', False):
+        return 0
+    return warm_templates()
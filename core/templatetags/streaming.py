@@ -0,0 +1,12 @@
+from django import template
+from django.utils.safestring import mark_safe
+
+from core.streaming import SLOT_MARKER
+
+register = template.Library()
+
+
+@register.simple_tag
+def stream_slot(name):
+    """Where the rows of the streamed list `name` go (see core/streaming.py)"""
+    return mark_safe(SLOT_MARKER.format(name))
@@ -1,3 +1,1304 @@
-from django.test import TestCase
+import csv
+import gzip
+import importlib
+import io
+import json
+import re
+import os
+import shutil
+import tempfile
+import threading
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+from django.apps import apps as django_apps
+from django.contrib.auth.models import User as StaffUser
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection, connections, transaction
+from django.db.models import Count
+from django.template.loader import render_to_string
+from django.test import Client, TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .api import encode_cursor
+from . import api, counters, facets, querycache, ratelimit, routers
+from .archive import archive_resolved
+from .deletion import purge
+from .exports import ExportError, export_stream
+from .imports import run_import
+from .models import (
+    User, Field, Subfield, Problem, Project, Post, CollaborationRequest, ArchivedCollaborationRequest,
+    PostBand, SubfieldRollup, InstitutionRollup, ProfileCapture, ResourceVersion, Task,
+)
+from .rollups import rebuild_all
+from .strict import StrictLoadingError, allow_lazy, strict
+from .streaming import ERROR_NOTICE, SLOT_MARKER
+from .tasks import REGISTRY, claim, process, task
+from .views import OPEN_PROJECTS_PER_PAGE, PROBLEMS_PER_PAGE
+
+
+def make_user(name, **kwargs):
+    values = {'institution': 'MIT', 'country': 'USA', 'field': 'Computer Science', **kwargs}
+    return User.objects.create(name=name, email=f'{name.lower()}@example.com', **values)
+
+
+# ==============================================================================
+# PROJECT DETAIL
+# ==============================================================================
+
+# View counts are flushed in the background (core/counters.py), not by the page
+@override_settings(COUNTER_FLUSH_SECONDS=3600)
+class ProjectDetailQueryTests(TestCase):
+    """The project page costs a fixed number of queries, whatever its size"""
+
+    @classmethod
+    def setUpTestData(cls):
+        field = Field.objects.create(name='Computer Science')
+        cls.subfield = Subfield.objects.create(name='Databases', field=field)
+        cls.owner = make_user('Owner')
+        cls.visitor = make_user('Visitor')
+        cls.project = Project.objects.create(
+            title='Query planner', description='Cost-based optimizer',
+            owner=cls.owner, field=field, subfield=cls.subfield,
+        )
+
+    def login(self, user):
+        self.client.post(reverse('login'), {'user_id': user.id})
+
+    def grow(self, count):
+        """Add `count` collaborators, pending requests and problems"""
+        start = User.objects.count()
+        for i in range(start, start + count):
+            user = make_user(f'Member{i}')
+            self.project.collaborators.add(user)
+            CollaborationRequest.objects.create(
+                sender=user, receiver=self.owner, project=self.project, status='pending',
+            )
+            Problem.objects.create(name=f'Problem {i}', description='...', subfield=self.subfield)
+
+    def get_page(self, queries):
+        # 1 session + project (with owner, field, subfield) + collaborators + problems
+        # (+ pending requests for the owner)
+        with self.assertNumQueries(queries):
+            response = self.client.get(reverse('project_detail', args=[self.project.id]))
+        self.assertEqual(response.status_code, 200)
+        return response
+
+    def test_owner_page_is_constant(self):
+        self.login(self.owner)
+        self.get_page(5)
+        self.grow(1)
+        self.get_page(5)
+        self.grow(15)
+        response = self.get_page(5)
+        self.assertEqual(len(response.context['collaborators']), 16)
+        self.assertEqual(len(response.context['pending_requests']), 16)
+        self.assertEqual(len(response.context['related_problems']), 10)
+
+    def test_visitor_page_is_constant(self):
+        self.login(self.visitor)
+        self.get_page(4)
+        self.grow(20)
+        response = self.get_page(4)
+        self.assertEqual(response.context['pending_requests'], [])
+        self.assertContains(response, 'Collaborate')
+
+
+# ==============================================================================
+# STRICT LOADING
+# ==============================================================================
+
+class StrictLoadingTests(TestCase):
+    """The checks themselves, outside any request"""
+
+    @classmethod
+    def setUpTestData(cls):
+        field = Field.objects.create(name='Physics')
+        cls.subfield = Subfield.objects.create(name='Optics', field=field)
+        cls.user = make_user('Author')
+        cls.post = Post.objects.create(author=cls.user, content='Looking for a co-author')
+
+    def test_lazy_foreign_key_raises(self):
+        post = Post.objects.get(id=self.post.id)
+        with strict(), self.assertRaises(StrictLoadingError):
+            post.author
+
+    def test_select_related_passes(self):
+        post = Post.objects.select_related('author').get(id=self.post.id)
+        with strict():
+            self.assertEqual(post.author.name, 'Author')
+
+    def test_unprefetched_manager_raises(self):
+        user = User.objects.get(id=self.user.id)
+        with strict(), self.assertRaises(StrictLoadingError):
+            user.posts.count()
+
+    def test_prefetched_manager_passes(self):
+        user = User.objects.prefetch_related('posts').get(id=self.user.id)
+        with strict():
+            self.assertEqual(user.posts.count(), 1)
+            self.assertEqual(len(user.posts.all()), 1)
+
+    def test_deferred_field_raises(self):
+        post = Post.objects.only('id').get(id=self.post.id)
+        with strict(), self.assertRaises(StrictLoadingError):
+            post.content
+
+    def test_allow_lazy(self):
+        post = Post.objects.get(id=self.post.id)
+        with strict(), allow_lazy():
+            self.assertEqual(post.author.name, 'Author')
+
+    def test_off_by_default(self):
+        post = Post.objects.get(id=self.post.id)
+        self.assertEqual(post.author.name, 'Author')
+
+
+# ==============================================================================
+# TASK QUEUE
+# ==============================================================================
+
+class TaskQueueTests(TestCase):
+    """A failing payload is retried on its own; the rest of its batch runs"""
+
+    def test_bad_payload_fails_alone(self):
+        def handler(payloads):
+            for payload in payloads:
+                if payload['n'] < 0:
+                    raise ValueError('bad payload')
+        task('test_batch', batch=True)(handler)
+        self.addCleanup(REGISTRY.pop, 'test_batch')
+        for n in (1, -1, 2):
+            Task.objects.create(name='test_batch', payload={'n': n})
+
+        with self.assertLogs('core.tasks', 'WARNING'):
+            self.assertEqual(process(claim(10)), (2, 1))
+        failed = Task.objects.get()
+        self.assertEqual((failed.payload, failed.status, failed.attempts), ({'n': -1}, 'queued', 1))
+        self.assertIn('bad payload', failed.last_error)
+
+
+# ==============================================================================
+# ENGAGEMENT COUNTERS
+# ==============================================================================
+
+@override_settings(TASK_QUEUE_EAGER=False)
+class CounterTests(TestCase):
+    """Increments queued by several flushes add up in one batch and refresh the pages showing them"""
+
+    @classmethod
+    def setUpTestData(cls):
+        field = Field.objects.create(name='Biology')
+        subfield = Subfield.objects.create(name='Genetics', field=field)
+        cls.owner = make_user('Owner')
+        cls.post = Post.objects.create(author=cls.owner, content='Looking for a co-author')
+        cls.project = Project.objects.create(
+            title='P', description='...', owner=cls.owner, field=field, subfield=subfield,
+        )
+
+    def versions(self):
+        keys = ('feed', f'profile:{self.owner.id}')
+        rows = dict(ResourceVersion.objects.filter(key__in=keys).values_list('key', 'version'))
+        return [rows.get(key, 0) for key in keys]
+
+    def test_batch_flush_adds_increments(self):
+        # Whatever earlier tests left in this process's buffer goes first
+        with self.captureOnCommitCallbacks(execute=True):
+            counters.flush()
+        Task.objects.all().delete()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            counters.incr(Post, 'view_count', self.post.id, amount=3)
+            counters.incr(Project, 'view_count', self.project.id)
+            counters.flush()
+            counters.incr(Post, 'view_count', self.post.id)
+            counters.incr(Post, 'interest_count', self.post.id)
+            counters.incr(Project, 'interest_count', self.project.id, amount=2)
+            counters.flush()
+        self.assertEqual(Task.objects.filter(name='flush_counters').count(), 2)
+
+        before = self.versions()
+        self.assertEqual(process(claim(10)), (2, 0))
+        self.post.refresh_from_db()
+        self.project.refresh_from_db()
+        self.assertEqual((self.post.view_count, self.post.interest_count), (4, 1))
+        self.assertEqual((self.project.view_count, self.project.interest_count), (1, 2))
+        # One chunk per table: 'feed' for the post, the owner's profile for the project
+        self.assertEqual(self.versions(), [before[0] + 1, before[1] + 1])
+
+
+# ==============================================================================
+# ARCHIVED REQUESTS
+# ==============================================================================
+
+class ArchiveTests(TestCase):
+    """Archived requests still count as sent; archiving only deletes what it copied"""
+
+    @classmethod
+    def setUpTestData(cls):
+        field = Field.objects.create(name='Biology')
+        subfield = Subfield.objects.create(name='Genetics', field=field)
+        cls.owner = make_user('Owner')
+        cls.sender = make_user('Sender')
+        cls.project = Project.objects.create(
+            title='P', description='...', owner=cls.owner, field=field, subfield=subfield,
+        )
+        cls.request = CollaborationRequest.objects.create(
+            sender=cls.sender, receiver=cls.owner, project=cls.project, status='rejected',
+        )
+        CollaborationRequest.objects.filter(id=cls.request.id).update(created_at=timezone.now() - timedelta(days=200))
+
+    def test_archived_request_blocks_a_new_one(self):
+        self.assertEqual(archive_resolved(older_than_days=90), 1)
+        self.client.post(reverse('login'), {'user_id': self.sender.id})
+        self.client.get(reverse('collaborate_project', args=[self.project.id]))
+        self.assertFalse(CollaborationRequest.objects.exists())
+
+    def test_id_already_archived_is_kept(self):
+        ArchivedCollaborationRequest.objects.create(
+            id=self.request.id, sender=self.owner, receiver=self.sender, status='accepted', created_at=timezone.now(),
+        )
+        with self.assertLogs('core.archive', 'WARNING'):
+            self.assertEqual(archive_resolved(older_than_days=90), 0)
+        self.assertTrue(CollaborationRequest.objects.filter(id=self.request.id).exists())
+
+
+# ==============================================================================
+# ANALYTICS ROLLUPS
+# ==============================================================================
+
+class RollupTests(TestCase):
+    """Writes move rollup counts themselves and end up where a rebuild would"""
+
+    def snapshot(self):
+        subfields = list(SubfieldRollup.objects.order_by('subfield_id').values(
+            'subfield_id', 'field_id', 'open_projects', 'closed_projects',
+            'high_problems', 'medium_problems', 'low_problems',
+        ))
+        # Writes leave the rows of institutions nobody is in any more; rebuilds drop them
+        institutions = [
+            row for row in InstitutionRollup.objects.order_by('institution').values(
+                'institution', 'pending_requests', 'accepted_requests', 'rejected_requests')
+            if any(row[column] for column in ('pending_requests', 'accepted_requests', 'rejected_requests'))
+        ]
+        return subfields, institutions
+
+    @override_settings(TASK_QUEUE_EAGER=False)
+    def test_deltas_match_rebuild(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            biology = Field.objects.create(name='Biology')
+            physics = Field.objects.create(name='Physics')
+            genetics = Subfield.objects.create(name='Genetics', field=biology)
+            optics = Subfield.objects.create(name='Optics', field=physics)
+            owner = make_user('Owner')
+            receiver = make_user('Receiver', institution='Oxford')
+            sender = make_user('Sender', institution='ETH')
+            project = Project.objects.create(
+                title='P', description='...', owner=owner, field=biology, subfield=genetics, vacancy_status=True,
+            )
+            problem = Problem.objects.create(name='X', description='...', severity='high', subfield=genetics)
+            Problem.objects.create(name='Y', description='...', severity='medium', subfield=optics)
+            request = CollaborationRequest.objects.create(sender=owner, receiver=receiver, project=project)
+            CollaborationRequest.objects.create(sender=sender, receiver=receiver, project=project, status='rejected')
+            ArchivedCollaborationRequest.objects.create(
+                id=1000, sender=sender, receiver=receiver, project=project, status='accepted', created_at=timezone.now(),
+            )
+
+            project.subfield, project.field, project.vacancy_status = optics, physics, False
+            project.save()
+            problem.severity = 'low'
+            problem.save()
+            problem.subfield = optics
+            problem.save(update_fields=['subfield'])
+            request.status = 'accepted'
+            request.save()
+            receiver.institution = 'MIT'
+            receiver.save()
+            genetics.field = physics
+            genetics.save()
+            sender.delete()
+
+        self.assertFalse(Task.objects.filter(name='refresh_rollups').exists())
+        written = self.snapshot()
+        rebuild_all()
+        self.assertEqual(written, self.snapshot())
+
+
+# ==============================================================================
+# RESOURCE VERSIONS
+# ==============================================================================
+
+class VersionTests(TestCase):
+    """Writes bump every page key they leave stale"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.field = Field.objects.create(name='Biology')
+        cls.genetics = Subfield.objects.create(name='Genetics', field=cls.field)
+        cls.optics = Subfield.objects.create(name='Optics', field=cls.field)
+        cls.owner = make_user('Owner')
+        cls.other = make_user('Other')
+        cls.project = Project.objects.create(
+            title='P', description='...', owner=cls.owner, field=cls.field, subfield=cls.genetics,
+        )
+
+    def versions(self, *keys):
+        return dict(ResourceVersion.objects.filter(key__in=keys).values_list('key', 'version'))
+
+    def test_moved_project_bumps_old_keys(self):
+        keys = (f'profile:{self.owner.id}', f'subfield:{self.genetics.id}')
+        before = self.versions(*keys)
+        self.project.owner, self.project.subfield = self.other, self.optics
+        self.project.save()
+        after = self.versions(*keys)
+        for key in keys:
+            self.assertEqual(after[key], before[key] + 1)
+
+    def test_profile_revalidates_after_taxonomy_change(self):
+        self.client.post(reverse('login'), {'user_id': self.owner.id})
+        url = reverse('profile', args=[self.owner.id])
+        etag = self.client.get(url)['ETag']
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        self.genetics.name = 'Genomics'
+        self.genetics.save()
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+
+# ==============================================================================
+# READ-REPLICA ROUTING
+# ==============================================================================
+
+@override_settings(REPLICA_DATABASES=['replica'])
+class ReplicaRoutingTests(TestCase):
+    """Routed reads hit a second SQLite database standing in for the replica; everything else the primary"""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        # Added after the test databases were set up (the runner only knows
+        # DATABASES): a temporary file holding the tables the tests read,
+        # whose class-wide rows are committed and test changes rolled back
+        cls.databases = {*cls.databases, 'replica'}
+        cls.replica_dir = tempfile.TemporaryDirectory()
+        connections.settings['replica'] = dict(
+            connections.settings['default'],
+            ENGINE='django.db.backends.sqlite3',
+            NAME=os.path.join(cls.replica_dir.name, 'replica.sqlite3'),
+            OPTIONS={},
+        )
+        with connections['replica'].schema_editor() as editor:
+            for model in (Field, Subfield, Problem, User):
+                editor.create_model(model)
+        cls.create_problem('replica', 'On replica')
+        User.objects.using('replica').bulk_create([
+            User(name='On replica', email='replica@example.com', country='Chile'),
+        ])
+
+    @classmethod
+    def tearDownClass(cls):
+        connections['replica'].close()
+        del connections['replica']
+        del connections.settings['replica']
+        cls.replica_dir.cleanup()
+        cls.databases = cls.databases - {'replica'}
+        super().tearDownClass()
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.create_problem('default', 'On primary')
+        cls.user = make_user('Reader')
+
+    @staticmethod
+    def create_problem(alias, name):
+        # The name tells which database answered. bulk_create sends no
+        # signals, whose receivers would write to the primary
+        field = Field.objects.using(alias).bulk_create([Field(name='Biology')])[0]
+        subfield = Subfield.objects.using(alias).bulk_create([Subfield(name='Genetics', field=field)])[0]
+        Problem.objects.using(alias).bulk_create([
+            Problem(name=name, description='...', severity='high', subfield=subfield),
+        ])
+
+    def setUp(self):
+        routers._lag_cache.clear()
+        self.client.post(reverse('login'), {'user_id': self.user.id})
+
+    def problem_names(self):
+        response = self.client.get(reverse('api_list', args=['problems']))
+        return [item['name'] for item in response.json()['data']]
+
+    def test_reads_go_to_replica(self):
+        del self.client.cookies[routers.STICKY_COOKIE]
+        self.assertEqual(self.problem_names(), ['On replica'])
+
+    def test_writes_go_to_primary(self):
+        token = routers._read_alias.set('replica')
+        try:
+            self.assertEqual(list(Problem.objects.values_list('name', flat=True)), ['On replica'])
+            Field.objects.create(name='Physics')
+        finally:
+            routers._read_alias.reset(token)
+        self.assertTrue(Field.objects.using('default').filter(name='Physics').exists())
+        self.assertFalse(Field.objects.using('replica').filter(name='Physics').exists())
+
+    def test_reads_after_a_write_stay_on_primary(self):
+        # The login POST set the sticky cookie
+        self.assertIn(routers.STICKY_COOKIE, self.client.cookies)
+        self.assertEqual(self.problem_names(), ['On primary'])
+
+    def test_lagging_replica_falls_back_to_primary(self):
+        del self.client.cookies[routers.STICKY_COOKIE]
+        with mock.patch.object(routers, 'replica_lag', return_value=60):
+            self.assertEqual(self.problem_names(), ['On primary'])
+
+    def test_export_reads_the_chosen_database(self):
+        def names(**kwargs):
+            lines = b''.join(export_stream('problems', **kwargs)).decode().splitlines()
+            return [line.split(',')[1] for line in lines[1:]]
+
+        self.assertEqual(names(), ['On primary'])
+        self.assertEqual(names(using='replica'), ['On replica'])
+        # The view passes the replica its request was routed to
+        StaffUser.objects.create_user('staff', password='pw', is_staff=True)
+        self.client.login(username='staff', password='pw')
+        del self.client.cookies[routers.STICKY_COOKIE]
+        response = self.client.get(reverse('export_data', args=['problems']))
+        self.assertIn(b'On replica', b''.join(response.streaming_content))
+
+    def test_streamed_rows_read_and_timed_on_replica(self):
+        make_user('On primary', country='Chile')
+        del self.client.cookies[routers.STICKY_COOKIE]
+        response = self.client.get(reverse('search_researchers'), {'country': 'Chile'})
+        timed = routers.metrics()['replica']['queries']
+        body = b''.join(response.streaming_content)
+        self.assertIn(b'On replica', body)
+        self.assertNotIn(b'On primary', body)
+        # The rows were read after the view returned, still routed and timed
+        self.assertGreater(routers.metrics()['replica']['queries'], timed)
+
+    def test_metrics_count_routed_views_only(self):
+        before = routers.metrics()
+        self.client.get(reverse('login'))
+        self.assertEqual(routers.metrics(), before)
+        self.problem_names()
+        self.assertGreater(routers.metrics()['default']['queries'], before.get('default', {}).get('queries', 0))
+
+
+# ==============================================================================
+# QUERY-RESULT CACHE
+# ==============================================================================
+
+class QueryCacheTests(TransactionTestCase):
+    """Every kind of write invalidates cached rows; a finished transaction stops bypassing the cache"""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        # A cache shared between processes (the query cache stays off with LocMemCache)
+        location = tempfile.mkdtemp()
+        cls.addClassCleanup(shutil.rmtree, location)
+        cls.enterClassContext(override_settings(CACHES={
+            'default': {'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache', 'LOCATION': location},
+        }))
+
+    def setUp(self):
+        self.field = Field.objects.create(name='Biology')
+
+    def names(self):
+        # Field.objects is cached by default
+        return list(Field.objects.order_by('name').values_list('name', flat=True))
+
+    def field_hits(self):
+        return querycache.stats()['queries'].get('core.Field', {}).get('hits', 0)
+
+    def test_update(self):
+        self.assertEqual(self.names(), ['Biology'])
+        Field.objects.filter(id=self.field.id).update(name='Physics')
+        self.assertEqual(self.names(), ['Physics'])
+
+    def test_bulk_create(self):
+        self.assertEqual(self.names(), ['Biology'])
+        Field.objects.bulk_create([Field(name='Chemistry')])
+        self.assertEqual(self.names(), ['Biology', 'Chemistry'])
+
+    def test_m2m_add(self):
+        owner, member = make_user('Owner'), make_user('Member')
+        subfield = Subfield.objects.create(name='Genetics', field=self.field)
+        project = Project.objects.create(
+            title='P', description='...', owner=owner, field=self.field, subfield=subfield,
+        )
+        collaborators = User.objects.filter(collaborated_projects=project).cache().values_list('name', flat=True)
+        self.assertEqual(list(collaborators.all()), [])
+        project.collaborators.add(member)
+        self.assertEqual(list(collaborators.all()), ['Member'])
+
+    def test_raw_delete(self):
+        self.assertEqual(self.names(), ['Biology'])
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {Field._meta.db_table} WHERE id = %s', [self.field.id])
+        self.assertEqual(self.names(), [])
+
+    def test_write_from_another_process(self):
+        # Another thread has its own database connection and cache client,
+        # like another worker sharing the same cache server
+        self.assertEqual(self.names(), ['Biology'])
+
+        def write():
+            try:
+                Field.objects.filter(id=self.field.id).update(name='Physics')
+            finally:
+                connections.close_all()
+
+        writer = threading.Thread(target=write)
+        writer.start()
+        writer.join()
+        self.assertEqual(self.names(), ['Physics'])
+
+    def test_off_with_a_per_process_cache(self):
+        self.assertTrue(querycache.enabled())
+        with override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}):
+            self.assertFalse(querycache.enabled())
+
+    def test_cache_used_again_after_rollback(self):
+        with self.assertRaises(ValueError), transaction.atomic():
+            Field.objects.create(name='Physics')
+            raise ValueError
+        with transaction.atomic():
+            self.assertEqual(self.names(), ['Biology'])
+            hits = self.field_hits()
+            self.names()
+            self.assertEqual(self.field_hits(), hits + 1)
+
+
+# ==============================================================================
+# NEAR-DUPLICATE POSTS
+# ==============================================================================
+
+class DedupTests(TestCase):
+    """Near-copies point at the original, unrelated posts don't, and only originals are indexed"""
+
+    TEXT = (
+        'Looking for collaborators on a machine learning project about protein folding '
+        'with experience in PyTorch and structural biology, remote work is fine'
+    )
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = make_user('Author')
+        cls.original = Post.objects.create(author=cls.author, content=cls.TEXT)
+        # Differs in punctuation only, then by an extra word
+        cls.copy = Post.objects.create(author=cls.author, content=cls.TEXT.upper() + '!!')
+        cls.near_copy = Post.objects.create(author=cls.author, content=cls.TEXT + ' thanks')
+        cls.unrelated = Post.objects.create(
+            author=cls.author, content='Our lab just published a survey of graphene batteries, comments welcome',
+        )
+
+    def flags(self):
+        return dict(Post.objects.values_list('id', 'duplicate_of_id'))
+
+    def test_similar_posts_flagged(self):
+        self.assertEqual(self.flags(), {
+            self.original.id: None,
+            self.copy.id: self.original.id,
+            self.near_copy.id: self.original.id,
+            self.unrelated.id: None,
+        })
+
+    def test_only_originals_indexed(self):
+        self.assertEqual(
+            set(PostBand.objects.values_list('post_id', flat=True)), {self.original.id, self.unrelated.id},
+        )
+
+    def test_rebuild(self):
+        expected, bands = self.flags(), PostBand.objects.count()
+        call_command('dedup_posts', '--rebuild', stdout=io.StringIO())
+        self.assertEqual(self.flags(), expected)
+        self.assertEqual(PostBand.objects.count(), bands)
+
+
+# ==============================================================================
+# RESEARCHER FACETS
+# ==============================================================================
+
+class FacetIndexTests(TestCase):
+    """Bitmap counts and totals match GROUP BY / filter over `user`"""
+
+    @classmethod
+    def setUpTestData(cls):
+        # Skewed values, plus one-user labs, so the index holds both bitmaps
+        # and sparse id arrays
+        countries = ['USA'] * 12 + ['India'] * 6 + ['Chile', 'Ghana']
+        institutions = ['MIT'] * 9 + ['IISc'] * 5 + ['Oxford'] * 3 + ['ETH', 'UCT', 'Uni Chile']
+        fields = ['Biology'] * 7 + ['Physics'] * 7 + ['Mathematics'] * 5 + ['Computer Science']
+        User.objects.bulk_create([
+            User(
+                name=f'User {i}', email=f'user{i}@example.com',
+                country=countries[i % 20], field=fields[i * 3 % 20],
+                institution=f'Lab {i}' if i % 97 == 0 else institutions[i * 7 % 20],
+                user_type='funding_agency' if i % 5 == 0 else 'researcher',
+            )
+            for i in range(600)
+        ])
+
+    def assertMatchesSql(self, index, filters):
+        users = User.objects.filter(**filters)
+        total, counts, page = index.search(filters, limit=100, page_size=25)
+        self.assertEqual(total, users.count())
+        self.assertEqual(page, list(users.order_by('id').values_list('id', flat=True)[:25]))
+        for facet in facets.FACETS:
+            # SQL: SELECT <facet>, COUNT(id) FROM user WHERE <filters> GROUP BY <facet>;
+            expected = dict(users.values_list(facet).annotate(count=Count('id')).order_by())
+            self.assertEqual(dict(counts[facet]), expected, (filters, facet))
+
+    def test_counts_match_sql(self):
+        index = facets.FacetIndex.build()
+        self.assertTrue(index.dense['country'] and index.sparse['institution'])
+        for filters in [
+            {},
+            {'country': 'USA'},                                      # one bitmap
+            {'country': 'India', 'user_type': 'funding_agency'},     # bitmaps ANDed
+            {'institution': 'ETH'},
+            {'institution': 'Lab 97'},                                # sparse ids
+            {'institution': 'Lab 194', 'country': 'India'},          # sparse ids filtered by a bitmap
+            {'institution': 'Lab 291', 'country': 'USA'},
+            {'country': 'Chile', 'field': 'Mathematics'},
+            {'country': 'Atlantis'},                                  # no such value
+        ]:
+            self.assertMatchesSql(index, filters)
+
+    def test_writes_applied(self):
+        index = facets.FacetIndex.build()
+        moved = User.objects.filter(country='USA').first()
+        moved.country = 'Ghana'
+        moved.save()
+        index.set(moved.id, facets.facet_values(moved))
+        make_user('Newcomer', country='Chile', institution='Lab 97')
+        index.add_new_users()
+        for filters in [{}, {'country': 'USA'}, {'country': 'Ghana'}, {'institution': 'Lab 97'}]:
+            self.assertMatchesSql(index, filters)
+
+    def test_warm_up(self):
+        self.addCleanup(setattr, facets, '_index', facets._index)
+        facets._index = None
+        with override_settings(FACET_INDEX_WARMUP=False):
+            self.assertIsNone(facets.warm_up())
+        self.assertIsNone(facets._index)
+        with override_settings(FACET_INDEX_WARMUP=True):
+            index = facets.warm_up()
+        self.assertIs(facets._index, index)
+        self.assertMatchesSql(index, {'country': 'India'})
+
+
+# ==============================================================================
+# STREAMED PAGES
+# ==============================================================================
+
+@override_settings(STREAM_CHUNK_SIZE=3, STREAM_FLUSH_ROWS=2, COUNTER_FLUSH_SECONDS=3600)
+class StreamedPageTests(TestCase):
+    """A streamed page is the page render() would give; an error mid-stream ends it with a notice"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.reader = make_user('Reader')
+        author = make_user('Author')
+        posts = Post.objects.bulk_create([Post(author=author, content=f'Streamed post {i}') for i in range(8)])
+        # Equal created_at across a chunk boundary: the keyset goes on by id
+        Post.objects.filter(id__in=[post.id for post in posts[2:6]]).update(created_at=posts[2].created_at)
+
+    def setUp(self):
+        self.client.post(reverse('login'), {'user_id': self.reader.id})
+
+    def without_csrf(self, html):
+        # The form's token is masked differently on every render
+        return re.sub(r'name="csrfmiddlewaretoken" value="[^"]*"', '', html)
+
+    def test_feed_matches_plain_render(self):
+        response = self.client.get(reverse('feed'))
+        self.assertTrue(response.streaming)
+        chunks = list(response.streaming_content)
+        # Head, four flushes of two posts, tail
+        self.assertEqual(len(chunks), 6)
+
+        request = response.wsgi_request
+        posts = Post.objects.select_related('author').order_by('-created_at', '-id')
+        rows = ''.join(render_to_string('core/_post.html', {'post': post, 'request': request}) for post in posts)
+        page = render_to_string('core/feed.html', {'pending_requests_count': 0}, request)
+        expected = page.replace(SLOT_MARKER.format('posts'), rows)
+        self.assertEqual(self.without_csrf(b''.join(chunks).decode()), self.without_csrf(expected))
+
+    def test_error_mid_stream(self):
+        def failing(rows, ordering):
+            yield Post.objects.select_related('author').first()
+            raise RuntimeError('connection lost')
+
+        with mock.patch('core.views.keyset_rows', failing):
+            response = self.client.get(reverse('feed'))
+            with self.assertLogs('core.streaming', 'ERROR'):
+                body = b''.join(response.streaming_content).decode()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(body.count('class="card mb-3'), 1)
+        self.assertTrue(body.endswith(ERROR_NOTICE))
+
+
+# ==============================================================================
+# JSON API
+# ==============================================================================
+
+class ApiTests(TestCase):
+    """Sparse fields, cursor pages that cover every row once, no private columns"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.me = make_user('Me')
+        cls.other = make_user('Other', institution='Oxford')
+        posts = Post.objects.bulk_create([Post(author=cls.other, content=f'Post {i}') for i in range(11)])
+        # Equal created_at across a page boundary: the cursor goes on by id
+        Post.objects.filter(id__in=[post.id for post in posts[3:8]]).update(created_at=posts[3].created_at)
+
+        resolved = timezone.now() - timedelta(days=200)
+        for i in range(5):
+            CollaborationRequest.objects.create(
+                sender=cls.other, receiver=cls.me, post=posts[i], status='accepted' if i % 2 else 'pending',
+            )
+        CollaborationRequest.objects.filter(status='accepted').update(created_at=resolved)
+        CollaborationRequest.objects.create(sender=cls.me, receiver=cls.other, post=posts[0], status='pending')
+
+    def setUp(self):
+        self.client.post(reverse('login'), {'user_id': self.me.id})
+
+    def get(self, url, params=None, status=200):
+        response = self.client.get(url, params)
+        self.assertEqual(response.status_code, status, response.content)
+        return response.json()
+
+    def walk(self, resource, **params):
+        """Every item of a list, following `next` to the end"""
+        page = self.get(reverse('api_list', args=[resource]), params)
+        items = page['data']
+        while page['next']:
+            page = self.get(page['next'])
+            items += page['data']
+        return items
+
+    def test_sparse_fields(self):
+        data = self.get(reverse('api_list', args=['posts']), {'fields': 'id,author.name', 'limit': 2})['data']
+        self.assertEqual(data[0], {'id': data[0]['id'], 'author': {'name': 'Other'}})
+        self.assertEqual(list(data[0]), ['id', 'author'])
+        detail = self.get(reverse('api_detail', args=['users', self.other.id]), {'fields': 'name,institution'})
+        self.assertEqual(detail['data'], {'name': 'Other', 'institution': 'Oxford'})
+        for resource, fields in [('posts', 'id,author.email'), ('users', 'nickname'), ('projects', 'collaborators.email')]:
+            error = self.get(reverse('api_list', args=[resource]), {'fields': fields}, status=400)
+            self.assertTrue(error['error'].startswith('Unknown field: '))
+
+    def test_cursor_walks_every_row_once(self):
+        items = self.walk('posts', limit=3, fields='id')
+        self.assertEqual(
+            [item['id'] for item in items],
+            list(Post.objects.order_by('-created_at', '-id').values_list('id', flat=True)),
+        )
+        self.assertEqual(len(self.walk('posts', limit=100)), 11)
+
+    def test_email_never_exposed(self):
+        responses = [
+            self.client.get(reverse('api_list', args=['users']), {'fields': ','.join(api.RESOURCES['users'].fields)}),
+            self.client.get(reverse('api_detail', args=['users', self.me.id])),
+            self.client.get(reverse('api_list', args=['users']), {'fields': 'id,email'}),
+        ] + [
+            self.client.get(reverse('api_list', args=[name]), {'fields': ','.join(resource.fields)})
+            for name, resource in api.RESOURCES.items()
+        ]
+        for response in responses:
+            self.assertNotIn(b'@example.com', response.content)
+            self.assertNotIn(b'"email"', response.content)
+
+    def test_notifications_include_archive(self):
+        self.assertEqual(archive_resolved(older_than_days=90), 2)
+        items = self.walk('notifications', limit=2)
+        expected = sorted(
+            [*CollaborationRequest.objects.filter(receiver=self.me), *ArchivedCollaborationRequest.objects.all()],
+            key=lambda request: (request.created_at, request.id), reverse=True,
+        )
+        self.assertEqual([item['id'] for item in items], [request.id for request in expected])
+        self.assertEqual([item['status'] for item in items], ['pending'] * 3 + ['accepted'] * 2)
+        self.assertEqual(
+            [item['id'] for item in self.walk('notifications', status='accepted')],
+            [request.id for request in expected[3:]],
+        )
+        archived = expected[-1]
+        detail = self.get(reverse('api_detail', args=['notifications', archived.id]), {'fields': 'id,sender.name'})
+        self.assertEqual(detail['data'], {'id': archived.id, 'sender': {'name': 'Other'}})
+
+
+# ==============================================================================
+# PROBLEM SEARCH
+# ==============================================================================
+
+class ProblemSeverityTests(TestCase):
+    """severity_rank follows severity on every write path; search pages by (severity_rank, id)"""
+
+    SEVERITIES = ['low', 'high', 'medium', 'high', 'low', 'medium', 'medium']
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.field = Field.objects.create(name='Biology')
+        cls.genetics = Subfield.objects.create(name='Genetics', field=cls.field)
+        cls.ecology = Subfield.objects.create(name='Ecology', field=cls.field)
+        cls.user = make_user('Searcher')
+
+    def assertRanksInSync(self):
+        rows = list(Problem.objects.values_list('severity', 'severity_rank'))
+        self.assertTrue(rows)
+        self.assertEqual([rank for severity, rank in rows], [Problem.rank_of(severity) for severity, rank in rows])
+
+    def test_rank_follows_severity(self):
+        problem = Problem.objects.create(name='Drift', description='...', severity='low', subfield=self.genetics)
+        self.assertEqual(problem.severity_rank, 2)
+        problem.severity = 'high'
+        problem.save(update_fields=['severity'])
+        self.assertRanksInSync()
+
+        problems = Problem.objects.bulk_create([
+            Problem(name=f'Bulk {i}', description='...', severity=severity, subfield=self.ecology)
+            for i, severity in enumerate(self.SEVERITIES)
+        ])
+        self.assertRanksInSync()
+        for problem, severity in zip(problems, reversed(self.SEVERITIES)):
+            problem.severity = severity
+        Problem.objects.bulk_update(problems, ['severity'])
+        self.assertRanksInSync()
+        Problem.objects.filter(subfield=self.ecology, severity='low').update(severity='high')
+        self.assertRanksInSync()
+
+        # Import: one new problem, one existing one whose severity changes
+        csv_text = 'name,description,severity,subfield\nDrift,...,low,Genetics\nBloom,...,high,Genetics\n'
+        report = run_import('problems', io.StringIO(csv_text), 'csv')
+        self.assertEqual((report.upserted, report.invalid), (2, 0))
+        self.assertEqual(Problem.objects.get(name='Drift').severity_rank, 2)
+        self.assertRanksInSync()
+
+    def test_keyset_pages(self):
+        Problem.objects.bulk_create([
+            Problem(name=f'Problem {i}', description='...', severity=self.SEVERITIES[i % 7],
+                    subfield=self.genetics if i % 3 else self.ecology)
+            for i in range(2 * PROBLEMS_PER_PAGE + 7)
+        ])
+        self.client.post(reverse('login'), {'user_id': self.user.id})
+        shown, pages, params = [], 0, {'field': 'Biology'}
+        while True:
+            response = self.client.get(reverse('search_problems'), params)
+            self.assertEqual(response.status_code, 200)
+            shown += [problem.id for problem in response.context['problems']]
+            pages += 1
+            if not response.context['next_after']:
+                break
+            params['after'] = response.context['next_after']
+        self.assertEqual(pages, 3)
+        self.assertEqual(shown, list(Problem.objects.order_by('severity_rank', 'id').values_list('id', flat=True)))
+
+
+# ==============================================================================
+# BULK IMPORT
+# ==============================================================================
+
+class ImportTests(TestCase):
+    """Upserts by natural key in batches; bad rows are reported, not written"""
+
+    HEADER = 'name,email,user_type,institution,country,field,rating\n'
+
+    def run_csv(self, lines, **kwargs):
+        return run_import('users', io.StringIO(self.HEADER + ''.join(lines)), 'csv', **kwargs)
+
+    def test_insert_and_update_in_one_batch(self):
+        alice = make_user('Alice', rating=3)
+        report = self.run_csv([
+            'Alice Liddell,alice@example.com,researcher,Oxford,UK,Logic,4.5\n',
+            'Bob,bob@example.com,funding_agency,ETH,Switzerland,Physics,\n',
+        ])
+        self.assertEqual((report.rows, report.upserted, report.invalid, report.batches), (2, 2, 0, 1))
+        alice.refresh_from_db()
+        self.assertEqual((alice.name, alice.institution, str(alice.rating)), ('Alice Liddell', 'Oxford', '4.5'))
+        self.assertEqual(User.objects.get(email='bob@example.com').user_type, 'funding_agency')
+        self.assertEqual(User.objects.count(), 2)
+
+    def test_row_errors_reported(self):
+        report = self.run_csv([
+            'Carol,carol@example.com,researcher,MIT,USA,Biology,\n',
+            'Dan,,researcher,MIT,USA,Biology,\n',
+            'Erin,not-an-email,researcher,MIT,USA,Biology,\n',
+            'Frank,frank@example.com,astronaut,MIT,USA,Biology,\n',
+        ])
+        self.assertEqual((report.rows, report.upserted, report.invalid), (4, 1, 3))
+        self.assertEqual([line for line, message in report.errors], [3, 4, 5])
+        self.assertEqual(report.errors[0][1], 'Missing email')
+        self.assertIn('email', report.errors[1][1])
+        self.assertIn('user_type', report.errors[2][1])
+        self.assertEqual(list(User.objects.values_list('email', flat=True)), ['carol@example.com'])
+
+        jsonl = '{"name": "Gus", "email": "gus@example.com", "institution": "MIT", "country": "USA", "field": "Biology"}\n{oops\n[1]\n'
+        report = run_import('users', io.StringIO(jsonl), 'jsonl')
+        self.assertEqual((report.upserted, [line for line, message in report.errors]), (1, [2, 3]))
+
+    def test_email_case(self):
+        user = User.objects.create(name='Foo', email='Foo@Example.org')
+        self.assertEqual(user.email, 'foo@example.org')
+        twin = make_user('Bar')
+        # Rows written before emails were lowercased; Bar's lowercase is taken
+        User.objects.filter(id=user.id).update(email='Foo@Example.org')
+        legacy = make_user('Legacy')
+        User.objects.filter(id=legacy.id).update(email='Bar@Example.com')
+        migration = importlib.import_module('core.migrations.0018_lowercase_user_emails')
+        migration.lowercase_emails(django_apps, None)
+
+        report = self.run_csv([
+            'Foo Bar,FOO@example.org,researcher,MIT,USA,Biology,\n',
+            'Bar,BAR@example.com,researcher,MIT,USA,Biology,\n',
+        ])
+        self.assertEqual(report.upserted, 2)
+        self.assertEqual(
+            sorted(User.objects.values_list('id', 'email', 'name')),
+            [(user.id, 'foo@example.org', 'Foo Bar'), (twin.id, 'bar@example.com', 'Bar'),
+             (legacy.id, 'Bar@Example.com', 'Legacy')],
+        )
+
+
+# ==============================================================================
+# STREAMING DATA EXPORT
+# ==============================================================================
+
+class ExportTests(TestCase):
+    """Header and every row, in keyset chunks, as CSV or JSON Lines"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.users = [make_user(f'Exported{i}', rating='4.5') for i in range(5)]
+        cls.post = Post.objects.create(author=cls.users[0], content='Exported post')
+
+    def export(self, name, **kwargs):
+        return b''.join(export_stream(name, chunk_size=2, **kwargs))
+
+    def test_csv(self):
+        rows = list(csv.reader(io.StringIO(self.export('users').decode())))
+        self.assertEqual(rows[0], ['id', 'name', 'email', 'user_type', 'institution', 'country', 'field', 'rating'])
+        self.assertEqual([row[0] for row in rows[1:]], [str(user.id) for user in self.users])
+        self.assertEqual(rows[1][1:3], ['Exported0', 'exported0@example.com'])
+        self.assertEqual(gzip.decompress(self.export('users', gzip=True)), self.export('users'))
+        self.assertEqual(len(self.export('users', filters={'field': 'Physics'}).splitlines()), 1)
+
+    def test_jsonl(self):
+        rows = [json.loads(line) for line in self.export('users', fmt='jsonl').splitlines()]
+        self.assertEqual([row['id'] for row in rows], [user.id for user in self.users])
+        self.assertEqual(rows[0]['rating'], '4.5')
+        [post] = [json.loads(line) for line in self.export('posts', fmt='jsonl').splitlines()]
+        # ISO 8601, to the millisecond
+        self.assertRegex(post['created_at'], r'^\d{4}-\d\d-\d\dT\d\d:\d\d:\d\d(\.\d{3})?(Z|[+-]\d\d:\d\d)$')
+        created_at = self.post.created_at
+        self.assertEqual(parse_datetime(post['created_at']), created_at.replace(microsecond=created_at.microsecond // 1000 * 1000))
+
+    def test_bad_requests(self):
+        for name, kwargs in [('payroll', {}), ('users', {'fmt': 'xml'}),
+                             ('users', {'filters': {'since': '2026-01-01'}}),
+                             ('posts', {'filters': {'since': 'yesterday'}})]:
+            with self.assertRaises(ExportError):
+                export_stream(name, **kwargs)
+
+
+# ==============================================================================
+# RATE LIMITING
+# ==============================================================================
+
+@override_settings(RATE_LIMITS={'create_post': {'burst': 2, 'per_minute': 6}})
+class RateLimitTests(TestCase):
+    """Token buckets per (endpoint, user): 2 posts at once, then one every 10 seconds"""
+
+    def setUp(self):
+        self.clock = mock.patch.object(ratelimit, 'time').start()
+        self.clock.monotonic.return_value = self.clock.time.return_value = 1000.0
+        mock.patch.dict(ratelimit._backends, {
+            'memory': ratelimit.MemoryBackend(), 'cache': ratelimit.CacheBackend(),
+        }).start()
+        self.addCleanup(mock.patch.stopall)
+        self.addCleanup(cache.clear)
+        self.alice = self.client_for(make_user('Alice'))
+        self.bob = self.client_for(make_user('Bob'))
+
+    def client_for(self, user):
+        client = Client()
+        client.post(reverse('login'), {'user_id': user.id})
+        return client
+
+    def wait(self, seconds):
+        self.clock.monotonic.return_value += seconds
+        self.clock.time.return_value += seconds
+
+    def post(self, client):
+        return client.post(reverse('create_post'), {'content': f'Post at {self.clock.time.return_value}'})
+
+    def test_throttled_once_exhausted(self):
+        self.assertEqual([self.post(self.alice).status_code for _ in range(2)], [302, 302])
+        response = self.post(self.alice)
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response['Retry-After'], '10')
+        self.assertEqual(Post.objects.count(), 2)
+        # Only POST is limited
+        self.assertEqual(self.alice.get(reverse('create_post')).status_code, 302)
+
+    def test_refill(self):
+        for _ in range(2):
+            self.post(self.alice)
+        self.wait(9)
+        response = self.post(self.alice)
+        self.assertEqual((response.status_code, response['Retry-After']), (429, '1'))
+        self.wait(1)
+        self.assertEqual(self.post(self.alice).status_code, 302)
+        self.assertEqual(self.post(self.alice).status_code, 429)
+        # An idle bucket refills to `burst`, no further
+        self.wait(600)
+        self.assertEqual([self.post(self.alice).status_code for _ in range(3)], [302, 302, 429])
+
+    def test_bucket_per_user(self):
+        self.assertEqual([self.post(self.alice).status_code for _ in range(3)], [302, 302, 429])
+        self.assertEqual([self.post(self.bob).status_code for _ in range(3)], [302, 302, 429])
+
+
+@override_settings(RATE_LIMIT_BACKEND='cache')
+class CacheRateLimitTests(RateLimitTests):
+    """Same budgets with the buckets in the shared cache"""
+
+
+# ==============================================================================
+# BATCHED DELETION
+# ==============================================================================
+
+class PurgeTests(TestCase):
+    """purge() deletes what user.delete() would, a few rows at a time"""
+
+    @classmethod
+    def setUpTestData(cls):
+        field = Field.objects.create(name='Physics')
+        subfield = Subfield.objects.create(name='Optics', field=field)
+        cls.gone = make_user('Gone')
+        cls.kept = make_user('Kept')
+        for i in range(5):
+            project = Project.objects.create(
+                title=f'Lens {i}', description='...', owner=cls.gone, field=field, subfield=subfield,
+            )
+            project.collaborators.add(cls.kept)
+            CollaborationRequest.objects.create(sender=cls.kept, receiver=cls.gone, project=project)
+        cls.kept_project = Project.objects.create(
+            title='Prism', description='...', owner=cls.kept, field=field, subfield=subfield,
+        )
+        cls.kept_project.collaborators.add(cls.gone, cls.kept)
+        original = Post.objects.create(author=cls.gone, content='Original post about lenses and light')
+        cls.repost = Post.objects.create(author=cls.kept, content='Reposted', duplicate_of=original)
+
+    def assertPurged(self):
+        self.assertFalse(User.objects.filter(id=self.gone.id).exists())
+        self.assertFalse(Project.objects.filter(owner=self.gone).exists())
+        self.assertFalse(Post.objects.filter(author=self.gone).exists())
+        self.assertFalse(CollaborationRequest.objects.exists())
+        self.assertEqual(list(self.kept_project.collaborators.all()), [self.kept])
+        self.assertIsNone(Post.objects.get(id=self.repost.id).duplicate_of_id)
+
+    def test_purge_user(self):
+        job = purge(User, [self.gone.id], batch_size=2)
+        self.assertTrue(job.finished)
+        self.assertEqual(job.deleted['core.Project'], 5)
+        self.assertPurged()
+
+    def test_resumes_after_max_batches(self):
+        self.assertFalse(purge(User, [self.gone.id], batch_size=2, max_batches=3).finished)
+        self.assertTrue(User.objects.filter(id=self.gone.id).exists())
+        self.assertTrue(purge(User, [self.gone.id], batch_size=2).finished)
+        self.assertPurged()
+
+
+@override_settings(STRICT_LOADING='raise')
+class StrictViewTests(TestCase):
+    """Every page renders without a lazy relation load"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.field = Field.objects.create(name='Biology')
+        cls.subfield = Subfield.objects.create(name='Genetics', field=cls.field)
+        cls.me = make_user('Me')
+        cls.other = make_user('Other', institution='Oxford')
+        cls.third = make_user('Third')
+        cls.staff = StaffUser.objects.create_superuser('staff', 'staff@example.com', 'pw')
+
+        cls.problem = Problem.objects.create(name='Gene drift', description='...', severity='high', subfield=cls.subfield)
+        cls.my_project = Project.objects.create(
+            title='Mine', description='...', owner=cls.me, field=cls.field, subfield=cls.subfield,
+        )
+        cls.my_project.collaborators.add(cls.third)
+        cls.other_project = Project.objects.create(
+            title='Theirs', description='...', owner=cls.other, field=cls.field, subfield=cls.subfield,
+        )
+        cls.other_project.collaborators.add(cls.me, cls.third)
+        cls.my_post = Post.objects.create(author=cls.me, content='My post about genes')
+        cls.other_post = Post.objects.create(author=cls.other, content='Their post about cells')
+
+        # Requests of every kind and status, so each branch of the templates renders
+        cls.project_request = CollaborationRequest.objects.create(
+            sender=cls.other, receiver=cls.me, project=cls.my_project, status='pending',
+        )
+        cls.post_request = CollaborationRequest.objects.create(
+            sender=cls.third, receiver=cls.me, post=cls.my_post, status='pending',
+        )
+        CollaborationRequest.objects.create(sender=cls.third, receiver=cls.me, project=cls.my_project, status='accepted')
+        CollaborationRequest.objects.create(sender=cls.other, receiver=cls.me, post=cls.my_post, status='rejected')
+
+    def setUp(self):
+        self.client.post(reverse('login'), {'user_id': self.me.id})
+
+    def assertStatus(self, response, status=200):
+        self.assertEqual(response.status_code, status)
+        if response.streaming:
+            # Streamed pages render their lists only while being read
+            b''.join(response.streaming_content)
+
+    def test_login_and_logout(self):
+        self.assertStatus(self.client.get(reverse('login')))
+        self.assertStatus(self.client.get(reverse('logout')), 302)
+
+    def test_feed(self):
+        self.assertStatus(self.client.get(reverse('feed')))
+
+    def test_create_post(self):
+        self.assertStatus(self.client.post(reverse('create_post'), {'content': 'A brand new idea'}), 302)
+
+    def test_collaborate_post(self):
+        self.assertStatus(self.client.get(reverse('collaborate_post', args=[self.other_post.id])), 302)
+        self.assertTrue(CollaborationRequest.objects.filter(
+            sender=self.me, receiver=self.other, post=self.other_post).exists())
+
+    def test_profile(self):
+        self.assertStatus(self.client.get(reverse('profile', args=[self.me.id])))
+        self.assertStatus(self.client.get(reverse('profile', args=[self.other.id])))
+
+    def test_search_researchers(self):
+        self.assertStatus(self.client.get(reverse('search_researchers')))
+        self.assertStatus(self.client.get(reverse('search_researchers'), {'field': 'Computer', 'country': 'USA'}))
+        self.assertStatus(self.client.get(reverse('browse_researchers')))
+        self.assertStatus(self.client.get(reverse('browse_researchers'), {'country': 'USA', 'user_type': 'researcher'}))
+
+    def test_search_problems(self):
+        self.assertStatus(self.client.get(reverse('search_problems')))
+        self.assertStatus(self.client.get(reverse('search_problems'), {'field': 'Biology'}))
+        self.assertStatus(self.client.get(reverse('search_problems'), {'field': 'Biology', 'subfield': self.subfield.id}))
+
+    def test_problem_detail(self):
+        self.assertStatus(self.client.get(reverse('problem_detail', args=[self.problem.id])))
+
+    def test_open_projects(self):
+        response = self.client.get(reverse('open_projects'), {'field': 'Biology', 'subfield': self.subfield.id})
+        self.assertStatus(response)
+        counts = {project.id: project.collaborator_count for project in response.context['projects']}
+        self.assertEqual(counts, {self.other_project.id: 2, self.my_project.id: 1})
+
+    def test_open_projects_pages(self):
+        Project.objects.bulk_create([
+            Project(title=f'Open {n}', description='...', owner=self.other, field=self.field,
+                    subfield=self.subfield, vacancy_status=True)
+            for n in range(OPEN_PROJECTS_PER_PAGE)
+        ])
+        first = self.client.get(reverse('open_projects'))
+        self.assertStatus(first)
+        self.assertEqual(len(first.context['projects']), OPEN_PROJECTS_PER_PAGE)
+        second = self.client.get(f"{reverse('open_projects')}?{first.context['next_query']}")
+        self.assertStatus(second)
+        shown = [project.id for project in first.context['projects'] + second.context['projects']]
+        self.assertEqual(shown, list(Project.objects.filter(Project.OPEN).order_by('-created_at', '-id').values_list('id', flat=True)))
+        self.assertIsNone(second.context['next_query'])
+
+        # A cursor that doesn't decode to (datetime, id) shows the first page
+        for after in ('garbage', encode_cursor(['x', 1]), encode_cursor([5, 1]),
+                      encode_cursor(['2020-01-01T00:00:00', 'abc'])):
+            response = self.client.get(reverse('open_projects'), {'after': after})
+            self.assertStatus(response)
+            self.assertEqual(response.context['projects'], first.context['projects'])
+
+    @override_settings(TASK_QUEUE_EAGER=False)
+    def test_create_project(self):
+        self.assertStatus(self.client.get(reverse('create_project')))
+        response = self.client.post(reverse('create_project'), {
+            'title': 'New', 'description': '...', 'field': 'Biology',
+            'subfield': self.subfield.id, 'vacancy_status': 'true', 'collaborators': [self.third.id],
+        })
+        self.assertStatus(response, 302)
+        # Made in the request, not left to the task queue
+        self.assertEqual(list(Project.objects.get(title='New').collaborators.all()), [self.third])
+
+    def test_create_project_bad_collaborator(self):
+        response = self.client.post(reverse('create_project'), {
+            'title': 'Tampered', 'description': '...', 'field': 'Biology',
+            'subfield': self.subfield.id, 'vacancy_status': 'true', 'collaborators': [self.third.id, 'abc'],
+        })
+        self.assertStatus(response, 400)
+        self.assertContains(response, 'Choose collaborators from the list.', status_code=400)
+        self.assertContains(response, 'value="Tampered"', status_code=400)
+        self.assertFalse(Project.objects.filter(title='Tampered').exists())
+
+    def test_project_detail(self):
+        self.assertStatus(self.client.get(reverse('project_detail', args=[self.my_project.id])))
+        self.assertStatus(self.client.get(reverse('project_detail', args=[self.other_project.id])))
+
+    def test_collaborate_project(self):
+        self.assertStatus(self.client.get(reverse('collaborate_project', args=[self.other_project.id])), 302)
+
+    def test_notifications(self):
+        self.assertStatus(self.client.get(reverse('notifications')))
+
+    @override_settings(TASK_QUEUE_EAGER=False)
+    def test_accept_and_reject(self):
+        self.assertStatus(self.client.get(reverse('accept_collaboration', args=[self.project_request.id])), 302)
+        self.assertTrue(self.my_project.collaborators.filter(id=self.other.id).exists())
+        self.assertStatus(self.client.get(reverse('reject_collaboration', args=[self.post_request.id])), 302)
+
+    def test_analytics(self):
+        self.assertStatus(self.client.get(reverse('analytics')))
+
+    def test_operations(self):
+        self.client.login(username='staff', password='pw')
+        self.assertStatus(self.client.get(reverse('db_metrics')))
+        self.assertStatus(self.client.get(reverse('rate_limit_metrics')))
+        self.assertStatus(self.client.get(reverse('counter_stats')))
+        for dataset in ('users', 'projects', 'problems', 'posts', 'collaborations'):
+            self.assertStatus(self.client.get(reverse('export_data', args=[dataset])))
+
+    def test_profiler(self):
+        # The trigger is ignored for anyone but staff
+        response = self.client.get(reverse('notifications'), {'_profile': 'sample'})
+        self.assertNotIn('X-Profile-Id', response)
+        self.client.login(username='staff', password='pw')
+        for mode in ('cprofile', 'sample'):
+            response = self.client.get(reverse('notifications'), {'_profile': mode})
+            self.assertStatus(response)
+            capture = ProfileCapture.objects.get(id=response['X-Profile-Id'])
+            self.assertEqual(capture.mode, mode)
+            self.assertEqual(len(capture.summary['queries']), capture.query_count)
+            self.assertIn('core/notifications.html', [template['name'] for template in capture.summary['templates']])
+            self.assertStatus(self.client.get(reverse('admin:core_profilecapture_change', args=[capture.id])))
+            self.assertStatus(self.client.get(reverse('admin:core_profilecapture_download', args=[capture.id, 'collapsed'])))
+        self.assertStatus(self.client.get(reverse('admin:core_profilecapture_download', args=[capture.id - 1, 'pstats'])))
+
+    def test_api(self):
+        for resource in ('posts', 'projects', 'open-projects', 'problems', 'users', 'notifications'):
+            self.assertStatus(self.client.get(reverse('api_list', args=[resource])))
+        self.assertStatus(self.client.get(
+            reverse('api_list', args=['projects']), {'fields': 'id,title,owner.name,collaborators.name'}))
+        self.assertStatus(self.client.get(reverse('api_detail', args=['problems', self.problem.id])))
+
+    def test_api_rejects_bad_input(self):
+        bad = [
+            ('posts', {'cursor': 'not a cursor'}),
+            ('posts', {'cursor': encode_cursor(['yesterday', 1])}),
+            ('posts', {'cursor': encode_cursor([5, 1])}),
+            ('posts', {'cursor': encode_cursor(['2020-01-01T00:00:00', 'abc'])}),
+            ('posts', {'author': 'abc'}),
+            ('problems', {'subfield': 'abc'}),
+            ('users', {'fields': 'id,email'}),
+        ]
+        for resource, params in bad:
+            self.assertStatus(self.client.get(reverse('api_list', args=[resource]), params), 400)
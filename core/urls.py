@@ -1,5 +1,5 @@
 from django.urls import path
-from . import views
+from . import views, api
 
 urlpatterns = [
     path('', views.login_view, name='login'),
@@ -9,12 +9,26 @@ urlpatterns = [
     path('post/<int:post_id>/collaborate/', views.collaborate_post_view, name='collaborate_post'),
     path('profile/<int:user_id>/', views.profile_view, name='profile'),
     path('researchers/', views.search_researchers_view, name='search_researchers'),
+    path('researchers/browse/', views.browse_researchers_view, name='browse_researchers'),
     path('problems/', views.search_problems_view, name='search_problems'),
     path('problem/<int:problem_id>/', views.problem_detail_view, name='problem_detail'),
+    path('projects/open/', views.open_projects_view, name='open_projects'),
     path('project/create/', views.create_project_view, name='create_project'),
     path('project/<int:project_id>/', views.project_detail_view, name='project_detail'),
     path('project/<int:project_id>/collaborate/', views.collaborate_project_view, name='collaborate_project'),
     path('notifications/', views.notifications_view, name='notifications'),
     path('collaboration/<int:request_id>/accept/', views.accept_collaboration_view, name='accept_collaboration'),  # ADD THIS
     path('collaboration/<int:request_id>/reject/', views.reject_collaboration_view, name='reject_collaboration'),  # ADD THIS
+    path('analytics/', views.analytics_view, name='analytics'),
+
+    # Operations (staff only)
+    path('ops/db-metrics/', views.db_metrics_view, name='db_metrics'),
+    path('ops/export/<str:dataset>/', views.export_view, name='export_data'),
+    path('ops/rate-limits/', views.rate_limit_metrics_view, name='rate_limit_metrics'),
+    path('ops/query-cache/', views.query_cache_stats_view, name='query_cache_stats'),
+    path('ops/counters/', views.counter_stats_view, name='counter_stats'),
+
+    # Read-only JSON API
+    path('api/v1/<str:resource_name>/', api.api_list_view, name='api_list'),
+    path('api/v1/<str:resource_name>/<int:pk>/', api.api_detail_view, name='api_detail'),
 ]
\ No newline at end of file
@@ -0,0 +1,144 @@
+"""
+RESOURCE VERSION STAMPS & CONDITIONAL GET
+=========================================
+Each page depends on a small set of version keys:
+
+- feed page     -> 'feed', 'users', 'inbox:<viewer>'
+- profile page  -> 'profile:<user_id>', 'users', 'taxonomy'
+- problem page  -> 'problem:<id>', 'subfield:<subfield_id>', 'users', 'taxonomy'
+
+Writes bump the keys they affect (see core/signals.py; engagement counts
+bump theirs once per flush, core/counters.py). The ETag of a page is
+a hash of its key versions plus the viewer, and Last-Modified is the newest
+updated_at among them. When the browser revalidates with If-None-Match /
+If-Modified-Since and nothing changed, the view returns 304 without running
+its querysets or rendering the template.
+"""
+import hashlib
+from functools import wraps
+
+from django.conf import settings
+from django.db import router
+from django.db.models import F
+from django.utils import timezone
+from django.utils.cache import patch_cache_control
+from django.views.decorators.http import condition
+
+from .models import ResourceVersion, Problem
+
+
+# ==============================================================================
+# WRITING: BUMP VERSIONS
+# ==============================================================================
+
+def bump(*keys):
+    """Increment the version of every given key (creating missing keys)"""
+    # SQL: UPDATE resource_version SET version = version + 1, updated_at = NOW()
+    #      WHERE key IN (<keys>);
+    # SQL: SELECT key FROM resource_version WHERE key IN (<keys>);
+    #      -- only if the UPDATE matched fewer rows than keys
+    # SQL: INSERT INTO resource_version (key, version, updated_at)
+    #      VALUES (<missing key>, 1, NOW()), ... ON CONFLICT DO NOTHING;
+    # Three statements at most however many keys (a batch of deleted
+    # requests names one inbox per receiver)
+    keys = set(keys)
+    if not keys:
+        return
+    now = timezone.now()
+    # The SELECT reads back what the UPDATE wrote: same database, even when
+    # a write happens during a replica-routed request
+    versions = ResourceVersion.objects.using(router.db_for_write(ResourceVersion))
+    updated = versions.filter(key__in=keys).update(
+        version=F('version') + 1,
+        updated_at=now,
+    )
+    if updated < len(keys):
+        existing = set(versions.filter(key__in=keys).values_list('key', flat=True))
+        versions.bulk_create(
+            [ResourceVersion(key=key, version=1, updated_at=now) for key in keys - existing],
+            ignore_conflicts=True,
+        )
+
+
+# ==============================================================================
+# READING: PAGE KEYS & STAMPS
+# ==============================================================================
+
+def feed_keys(request):
+    return ['feed', 'users', f"inbox:{request.session.get('user_id')}"]
+
+
+def profile_keys(request, user_id):
+    # Project cards show their field and subfield names
+    return ['users', 'taxonomy', f'profile:{user_id}']
+
+
+def problem_keys(request, problem_id):
+    # SQL: SELECT subfield_id FROM problem WHERE id = <problem_id>;
+    subfield_id = Problem.objects.filter(id=problem_id).values_list('subfield_id', flat=True).first()
+    return ['users', 'taxonomy', f'problem:{problem_id}', f'subfield:{subfield_id}']
+
+
+def page_stamp(request, keys):
+    """
+    Return (etag, last_modified) for a page built from the given keys.
+
+    The viewer's id/name and CSRF cookie are part of the ETag because the
+    navbar, the "Collaborate" buttons and the form tokens depend on them.
+    Cached on the request so the ETag and Last-Modified callbacks share one
+    query.
+    """
+    cached = getattr(request, '_page_stamp', None)
+    if cached is not None:
+        return cached
+
+    # SQL: SELECT key, version, updated_at FROM resource_version WHERE key IN (<keys>);
+    rows = {
+        key: (version, updated_at)
+        for key, version, updated_at in ResourceVersion.objects.filter(
+            key__in=keys
+        ).values_list('key', 'version', 'updated_at')
+    }
+
+    parts = [f"{key}={rows.get(key, (0, None))[0]}" for key in sorted(keys)]
+    parts.append(f"viewer={request.session.get('user_id')}:{request.session.get('user_name')}")
+    parts.append(f"csrf={request.COOKIES.get(settings.CSRF_COOKIE_NAME, '')}")
+    etag = hashlib.md5('|'.join(parts).encode()).hexdigest()
+
+    # Without a row for every key we can't tell when the page last changed,
+    # so only the ETag is used until each key has been written once
+    last_modified = None
+    if rows and len(rows) == len(set(keys)):
+        last_modified = max(updated_at for _, updated_at in rows.values())
+
+    request._page_stamp = (etag, last_modified)
+    return request._page_stamp
+
+
+def versioned_page(keys_func):
+    """
+    Decorator: answer GET/HEAD with 304 when the page's versions are unchanged.
+
+    keys_func(request, *view_args, **view_kwargs) returns the version keys the
+    page depends on. Anonymous requests skip the check (they get redirected to
+    login anyway).
+    """
+    def decorator(view):
+        def etag_func(request, *args, **kwargs):
+            return page_stamp(request, keys_func(request, *args, **kwargs))[0]
+
+        def last_modified_func(request, *args, **kwargs):
+            return page_stamp(request, keys_func(request, *args, **kwargs))[1]
+
+        conditional_view = condition(etag_func=etag_func, last_modified_func=last_modified_func)(view)
+
+        @wraps(view)
+        def wrapped(request, *args, **kwargs):
+            if not request.session.get('user_id'):
+                return view(request, *args, **kwargs)
+            response = conditional_view(request, *args, **kwargs)
+            # Always revalidate: the browser must ask, we answer 304 cheaply
+            patch_cache_control(response, private=True, no_cache=True)
+            return response
+        return wrapped
+    return decorator
@@ -1,6 +1,20 @@
+from urllib.parse import urlencode
+
 from django.shortcuts import render, redirect, get_object_or_404
+from django.contrib.admin.views.decorators import staff_member_required
+from django.http import JsonResponse, StreamingHttpResponse
+from django.conf import settings
 from django.db import models
-from .models import User, Post, Project, Problem, Field, Subfield, CollaborationRequest
+from django.db.models.functions import Coalesce
+from .models import (
+    User, Post, Project, Problem, Field, Subfield, CollaborationRequest, SubfieldRollup, InstitutionRollup,
+    FacetCount,
+)
+from . import api, archive, counters, exports, facets, querycache, ratelimit, routers
+from .ratelimit import rate_limited
+from .routers import replica_reads
+from .streaming import Slot, keyset_rows, render_streamed
+from .versions import versioned_page, feed_keys, profile_keys, problem_keys
 
 # ==============================================================================
 # FEATURE 1: LOGIN SYSTEM
@@ -39,12 +53,17 @@ def logout_view(request):
 # FEATURE 4: WORLD FEED
 # ==============================================================================
 
+@replica_reads
+@versioned_page(feed_keys)
 def feed_view(request):
     """Display world feed with all posts"""
-    # SQL: SELECT post.*, user.id, user.name, user.institution 
+    # SQL: SELECT post.*, user.id, user.name, user.institution,
+    #             (SELECT COUNT(*) FROM post d WHERE d.duplicate_of_id = post.id) AS similar_count
     #      FROM post 
     #      JOIN user ON post.author_id = user.id 
-    #      ORDER BY post.created_at DESC;
+    #      WHERE post.duplicate_of_id IS NULL
+    #      ORDER BY post.created_at DESC, post.id DESC
+    #      LIMIT <STREAM_CHUNK_SIZE>;   -- repeated per chunk while the page streams
     
     # SQL: SELECT COUNT(*) FROM collaboration_request 
     #      WHERE receiver_id = <current_user> AND status = 'pending';
@@ -53,8 +72,13 @@ def feed_view(request):
     if not request.session.get('user_id'):
         return redirect('login')
     
-    # Get all posts
-    posts = Post.objects.all().select_related('author')
+    # Get all posts; near-duplicates (core/dedup.py) collapse into their original
+    similar_count = Post.objects.filter(
+        duplicate_of=models.OuterRef('pk')
+    ).order_by().values('duplicate_of').annotate(count=models.Count('id')).values('count')
+    posts = Post.objects.filter(duplicate_of__isnull=True).select_related('author').annotate(
+        similar_count=Coalesce(models.Subquery(similar_count), 0)
+    )
     
     # Get pending collaboration requests count for current user
     user_id = request.session.get('user_id')
@@ -64,17 +88,26 @@ def feed_view(request):
     ).count()
     
     context = {
-        'posts': posts,
         'pending_requests_count': pending_requests_count,
     }
-    return render(request, 'core/feed.html', context)
-
-
+    # The posts are read and sent in chunks after the page head (core/streaming.py);
+    # each one sent counts as a view unless it is the viewer's own (core/counters.py)
+    rows = counters.counted(
+        keyset_rows(posts, ['-created_at', '-id']), 'view_count',
+        unless=lambda post: post.author_id == user_id,
+    )
+    return render_streamed(request, 'core/feed.html', context, {
+        'posts': Slot(rows, 'core/_post.html', 'post'),
+    })
+
+
+@rate_limited('create_post', methods=('POST',))
 def create_post_view(request):
     """Create a new post"""
     # SQL: SELECT * FROM user WHERE id = <current_user_id>;
     # SQL: INSERT INTO post (author_id, content, created_at) 
     #      VALUES (<user_id>, <content>, NOW());
+    # SQL: (near-duplicate check and LSH index insert, see core/dedup.py)
     
     if not request.session.get('user_id'):
         return redirect('login')
@@ -92,15 +125,18 @@ def create_post_view(request):
     return redirect('feed')
 
 
+@rate_limited('collaborate_post')
 def collaborate_post_view(request, post_id):
     """Send collaboration request for a post"""
     # SQL: SELECT * FROM post WHERE id = <post_id>;
     # SQL: SELECT * FROM user WHERE id = <current_user_id>;
-    # SQL: SELECT * FROM collaboration_request 
-    #      WHERE sender_id = <sender_id> AND receiver_id = <receiver_id> AND post_id = <post_id> 
+    # SQL: SELECT 1 FROM collaboration_request
+    #      WHERE sender_id = <sender_id> AND receiver_id = <receiver_id> AND post_id = <post_id>
     #      LIMIT 1;
+    # SQL: (Same query on collaboration_request_archive, if none)
     # SQL: INSERT INTO collaboration_request (sender_id, receiver_id, post_id, project_id, status, created_at)
     #      VALUES (<sender_id>, <receiver_id>, <post_id>, NULL, 'pending', NOW());
+    # SQL: (post.interest_count + 1, buffered and batched by core/counters.py)
     
     if not request.session.get('user_id'):
         return redirect('login')
@@ -110,21 +146,22 @@ def collaborate_post_view(request, post_id):
     sender = get_object_or_404(User, id=sender_id)
     
     # Don't send request to yourself
-    if sender.id != post.author.id:
-        # Check if request already exists
-        existing = CollaborationRequest.objects.filter(
+    if sender.id != post.author_id:
+        # Check if request already exists (archived ones included)
+        existing = archive.already_requested(
             sender=sender,
-            receiver=post.author,
+            receiver_id=post.author_id,
             post=post
-        ).first()
+        )
         
         if not existing:
             CollaborationRequest.objects.create(
                 sender=sender,
-                receiver=post.author,
+                receiver_id=post.author_id,
                 post=post,
                 status='pending'
             )
+            counters.incr(Post, 'interest_count', post.id)
     
     return redirect('feed')
 
@@ -133,21 +170,30 @@ def collaborate_post_view(request, post_id):
 # FEATURE 2: USER PROFILE & SEARCH RESEARCHERS
 # ==============================================================================
 
+@replica_reads
+@versioned_page(profile_keys)
 def profile_view(request, user_id):
     """Display user profile with their projects"""
     # SQL: SELECT * FROM user WHERE id = <user_id>;
-    # SQL: SELECT project.*, field.name AS field_name, subfield.name AS subfield_name
+    # SQL: SELECT project.*, field.name AS field_name, subfield.name AS subfield_name,
+    #             COUNT(core_project_collaborators.user_id) AS collaborator_count
     #      FROM project
-    #      JOIN field ON project.field_id = field.name
+    #      JOIN field ON project.field_id = field.id
     #      JOIN subfield ON project.subfield_id = subfield.id
+    #      LEFT JOIN core_project_collaborators ON project.id = core_project_collaborators.project_id
     #      WHERE project.owner_id = <user_id>
+    #      GROUP BY project.id
     #      ORDER BY project.created_at DESC;
     
     if not request.session.get('user_id'):
         return redirect('login')
     
     profile_user = get_object_or_404(User, id=user_id)
-    projects = Project.objects.filter(owner=profile_user).select_related('field', 'subfield')
+    projects = (
+        Project.objects.filter(owner=profile_user)
+        .select_related('field', 'subfield')
+        .annotate(collaborator_count=models.Count('collaborators'))
+    )
     
     context = {
         'profile_user': profile_user,
@@ -156,15 +202,17 @@ def profile_view(request, user_id):
     return render(request, 'core/profile.html', context)
 
 
+@replica_reads
 def search_researchers_view(request):
     """Search and filter researchers"""
-    # SQL: SELECT name FROM field ORDER BY name;
+    # SQL: SELECT id, name FROM field ORDER BY name;
     # SQL: SELECT * FROM user 
     #      WHERE user_type = 'researcher'
     #      AND field LIKE '%<field_filter>%'
     #      AND country LIKE '%<country_filter>%'
     #      AND institution LIKE '%<institution_filter>%'
-    #      ORDER BY name;
+    #      ORDER BY name, id LIMIT <STREAM_CHUNK_SIZE>;   -- repeated per chunk
+    # SQL: SELECT COUNT(*) FROM user WHERE ... (same filters);
     
     if not request.session.get('user_id'):
         return redirect('login')
@@ -172,8 +220,8 @@ def search_researchers_view(request):
     # Get all fields for dropdown
     fields = Field.objects.all()
     
-    # Start with all researchers
-    researchers = User.objects.filter(user_type='researcher')
+    # Start with all researchers (the same few lists are asked for by everyone)
+    researchers = User.objects.filter(user_type='researcher').cache()
     
     # Check if search was performed
     searched = False
@@ -200,18 +248,167 @@ def search_researchers_view(request):
         'researchers': researchers,
         'searched': searched,
     }
-    return render(request, 'core/search_researchers.html', context)
+    return render_streamed(request, 'core/search_researchers.html', context, {
+        'researchers': Slot(keyset_rows(researchers, ['name', 'id']), 'core/_researcher.html', 'researcher'),
+    })
+
 
+FACET_VALUES_SHOWN = 10
+DIRECTORY_PAGE_SIZE = 50
 
+@replica_reads
+def browse_researchers_view(request):
+    """Faceted directory: user counts per country, institution, field and type, narrowed by clicking"""
+    # Without filters:
+    # SQL: SELECT value, count FROM facet_count
+    #      WHERE facet = <facet> AND count > 0 ORDER BY count DESC LIMIT 10;   -- per facet
+    # SQL: SELECT * FROM user WHERE id > <after> ORDER BY id LIMIT 51;
+    # With filters (counts from the in-memory bitmaps, see core/facets.py):
+    # SQL: SELECT id, country, institution, field, user_type FROM user WHERE id > <last indexed id>;
+    # SQL: SELECT * FROM user WHERE id IN (<page of matching ids>) AND country = ... ORDER BY id;
+    
+    if not request.session.get('user_id'):
+        return redirect('login')
+    
+    filters = {facet: request.GET[facet] for facet in facets.FACETS if request.GET.get(facet)}
+    try:
+        after = max(0, int(request.GET.get('after', 0)))
+    except ValueError:
+        after = 0
+    
+    if filters:
+        total, counts, page_ids = facets.get_index().search(
+            filters, FACET_VALUES_SHOWN, after, DIRECTORY_PAGE_SIZE + 1,
+        )
+        users = list(User.objects.filter(id__in=page_ids[:DIRECTORY_PAGE_SIZE], **filters).order_by('id'))
+        next_after = page_ids[DIRECTORY_PAGE_SIZE - 1] if len(page_ids) > DIRECTORY_PAGE_SIZE else None
+    else:
+        counts = {facet: facets.top_values(facet, FACET_VALUES_SHOWN) for facet in facets.FACETS}
+        total = sum(count for _, count in counts['user_type'])
+        users = list(User.objects.filter(id__gt=after).order_by('id')[:DIRECTORY_PAGE_SIZE + 1])
+        next_after = users[DIRECTORY_PAGE_SIZE - 1].id if len(users) > DIRECTORY_PAGE_SIZE else None
+        users = users[:DIRECTORY_PAGE_SIZE]
+    
+    # Each value links to the current filters with that value toggled
+    type_labels = dict(User.USER_TYPE_CHOICES)
+    facet_groups = []
+    for facet, label in FacetCount.FACET_CHOICES:
+        values = counts[facet]
+        if facet in filters and filters[facet] not in dict(values):
+            values = [(filters[facet], total)] + values
+        options = []
+        for value, count in values:
+            selected = filters.get(facet) == value
+            params = {name: chosen for name, chosen in filters.items() if name != facet}
+            if not selected:
+                params[facet] = value
+            options.append({
+                'value': value,
+                'label': type_labels.get(value, value) if facet == 'user_type' else value,
+                'count': count,
+                'selected': selected,
+                'query': urlencode(params),
+            })
+        facet_groups.append({'label': label, 'options': options})
+    
+    context = {
+        'facet_groups': facet_groups,
+        'filters': filters,
+        'total': total,
+        'users': users,
+        'next_query': urlencode({**filters, 'after': next_after}) if next_after else None,
+    }
+    return render(request, 'core/browse_researchers.html', context)
+
+
+OPEN_PROJECTS_PER_PAGE = 20
+
+@replica_reads
+def open_projects_view(request):
+    """Projects accepting collaborators, newest first, by field and subfield"""
+    # SQL: SELECT id, name FROM field ORDER BY name;                     (query cache)
+    # SQL: SELECT * FROM subfield WHERE field_id = <field_id> ORDER BY name;   (query cache)
+    # SQL: SELECT id FROM project
+    #      WHERE vacancy_status IN (TRUE)
+    #      AND subfield_id = <subfield_id> (or field_id = <field_id>)
+    #      AND (created_at, id) < (<after_created_at>, <after_id>)
+    #      ORDER BY created_at DESC, id DESC
+    #      LIMIT <OPEN_PROJECTS_PER_PAGE + 1>;
+    #      -- from project_open_subfield_idx (or _field_idx / _recent_idx) alone
+    # SQL: SELECT project.*, user.*, field.*, subfield.*,
+    #             (SELECT COUNT(*) FROM core_project_collaborators
+    #              WHERE project_id = project.id) AS collaborator_count
+    #      FROM project
+    #      JOIN user ON project.owner_id = user.id
+    #      JOIN field ON project.field_id = field.id
+    #      JOIN subfield ON project.subfield_id = subfield.id
+    #      WHERE project.id IN (<page ids>)
+    #      ORDER BY project.created_at DESC, project.id DESC;
+    # Paging the ids apart from the JOINs keeps the planner on the index at
+    # any depth; the counts run for the page's rows only
+    
+    if not request.session.get('user_id'):
+        return redirect('login')
+    
+    fields = list(Field.objects.all())
+    field = next((f for f in fields if f.name == request.GET.get('field')), None)
+    subfields = list(Subfield.objects.filter(field=field)) if field else []
+    subfield = next((s for s in subfields if str(s.id) == request.GET.get('subfield')), None)
+    
+    page = Project.objects.filter(Project.OPEN)
+    if subfield:
+        page = page.filter(subfield_id=subfield.id)
+    elif field:
+        page = page.filter(field_id=field.id)
+    
+    # Keyset pagination: ?after=<cursor> of the last project shown (see core/api.py);
+    # decode_cursor checks the value types, so any cursor it can't read shows page 1
+    try:
+        after = api.decode_cursor(request.GET['after'], ['created_at', 'id'])
+    except (KeyError, api.ApiError):
+        pass
+    else:
+        page = api.seek(page, ['created_at', 'id'], after)
+    
+    ids = list(page.order_by('-created_at', '-id').values_list('id', flat=True)[:OPEN_PROJECTS_PER_PAGE + 1])
+    projects = list(
+        Project.objects.filter(id__in=ids[:OPEN_PROJECTS_PER_PAGE])
+        .select_related('owner', 'field', 'subfield')
+        .annotate(collaborator_count=Project.collaborator_count())
+        .order_by('-created_at', '-id')
+    )
+    next_query = None
+    if len(ids) > OPEN_PROJECTS_PER_PAGE and projects:
+        last = projects[-1]
+        params = {'field': field.name} if field else {}
+        if subfield:
+            params['subfield'] = subfield.id
+        params['after'] = api.encode_cursor([last.created_at, last.id])
+        next_query = urlencode(params)
+    
+    context = {
+        'fields': fields,
+        'subfields': subfields,
+        'selected_field': field,
+        'selected_subfield': subfield,
+        'projects': projects,
+        'next_query': next_query,
+    }
+    return render(request, 'core/open_projects.html', context)
+
+
+@rate_limited('collaborate_project')
 def collaborate_project_view(request, project_id):
     """Send collaboration request for a project"""
     # SQL: SELECT * FROM project WHERE id = <project_id>;
     # SQL: SELECT * FROM user WHERE id = <current_user_id>;
-    # SQL: SELECT * FROM collaboration_request 
+    # SQL: SELECT 1 FROM collaboration_request
     #      WHERE sender_id = <sender_id> AND receiver_id = <receiver_id> AND project_id = <project_id>
     #      LIMIT 1;
+    # SQL: (Same query on collaboration_request_archive, if none)
     # SQL: INSERT INTO collaboration_request (sender_id, receiver_id, project_id, post_id, status, created_at)
     #      VALUES (<sender_id>, <receiver_id>, <project_id>, NULL, 'pending', NOW());
+    # SQL: (project.interest_count + 1, buffered and batched by core/counters.py)
     
     if not request.session.get('user_id'):
         return redirect('login')
@@ -221,58 +418,117 @@ def collaborate_project_view(request, project_id):
     sender = get_object_or_404(User, id=sender_id)
     
     # Don't send request to yourself
-    if sender.id != project.owner.id:
-        # Check if request already exists
-        existing = CollaborationRequest.objects.filter(
+    if sender.id != project.owner_id:
+        # Check if request already exists (archived ones included)
+        existing = archive.already_requested(
             sender=sender,
-            receiver=project.owner,
+            receiver_id=project.owner_id,
             project=project
-        ).first()
+        )
         
         if not existing:
             CollaborationRequest.objects.create(
                 sender=sender,
-                receiver=project.owner,
+                receiver_id=project.owner_id,
                 project=project,
                 status='pending'
             )
+            counters.incr(Project, 'interest_count', project.id)
     
-    return redirect('profile', user_id=project.owner.id)
+    return redirect('profile', user_id=project.owner_id)
+
 
+RELATED_PROBLEMS_LIMIT = 10
 
+@replica_reads
 def project_detail_view(request, project_id):
-    """Project details - placeholder for now"""
-    # SQL: SELECT * FROM project WHERE id = <project_id>;
-    
+    """Project details: owner, collaborators, subfield problems, pending requests (owner only)"""
+    # SQL: SELECT project.*, user.*, field.*, subfield.*
+    #      FROM project
+    #      JOIN user ON project.owner_id = user.id
+    #      JOIN field ON project.field_id = field.id
+    #      JOIN subfield ON project.subfield_id = subfield.id
+    #      WHERE project.id = <project_id>;
+    # SQL: SELECT user.*, core_project_collaborators.project_id
+    #      FROM user
+    #      JOIN core_project_collaborators ON user.id = core_project_collaborators.user_id
+    #      WHERE core_project_collaborators.project_id = <project_id>
+    #      ORDER BY user.name;
+    # SQL: SELECT * FROM (
+    #        SELECT problem.*, ROW_NUMBER() OVER (PARTITION BY subfield_id ORDER BY severity_rank, id) AS n
+    #        FROM problem WHERE subfield_id = <project_subfield_id>
+    #      ) WHERE n <= <RELATED_PROBLEMS_LIMIT>;
+    # SQL: SELECT collaboration_request.*, user.*
+    #      FROM collaboration_request
+    #      JOIN user ON collaboration_request.sender_id = user.id
+    #      WHERE collaboration_request.project_id = <project_id> AND status = 'pending'
+    #      ORDER BY collaboration_request.created_at DESC;
+    #      -- only when the owner is viewing
+    # 3 queries (4 for the owner), however many collaborators, problems or requests;
+    # the view count is buffered in memory (core/counters.py)
+
     if not request.session.get('user_id'):
         return redirect('login')
-    
-    project = get_object_or_404(Project, id=project_id)
-    return redirect('profile', user_id=project.owner.id)
+
+    project = get_object_or_404(
+        Project.objects.select_related('owner', 'field', 'subfield'),
+        id=project_id,
+    )
+    is_owner = project.owner_id == request.session.get('user_id')
+    if not is_owner:
+        counters.incr(Project, 'view_count', project.id)
+
+    prefetches = [
+        models.Prefetch('collaborators', queryset=User.objects.order_by('name'), to_attr='collaborator_list'),
+        models.Prefetch(
+            'subfield__problems',
+            queryset=Problem.objects.order_by('severity_rank', 'id')[:RELATED_PROBLEMS_LIMIT],
+            to_attr='top_problems',
+        ),
+    ]
+    if is_owner:
+        prefetches.append(models.Prefetch(
+            'collaborationrequest_set',
+            queryset=CollaborationRequest.objects.filter(status='pending').select_related('sender'),
+            to_attr='pending_requests',
+        ))
+    models.prefetch_related_objects([project], *prefetches)
+
+    context = {
+        'project': project,
+        'collaborators': project.collaborator_list,
+        'related_problems': project.subfield.top_problems,
+        'pending_requests': project.pending_requests if is_owner else [],
+        'is_owner': is_owner,
+        'is_collaborator': any(user.id == request.session.get('user_id') for user in project.collaborator_list),
+    }
+    return render(request, 'core/project_detail.html', context)
 
 
 # ==============================================================================
 # FEATURE 3: PROBLEM SEARCH
 # ==============================================================================
 
+PROBLEMS_PER_PAGE = 20
+
+@replica_reads
 def search_problems_view(request):
     """Search problems by field and subfield"""
-    # SQL: SELECT name FROM field ORDER BY name;
+    # SQL: SELECT id, name FROM field ORDER BY name;
     # SQL: SELECT subfield.id, subfield.name, field.name AS field_name
     #      FROM subfield 
-    #      JOIN field ON subfield.field_id = field.name
+    #      JOIN field ON subfield.field_id = field.id
     #      WHERE field.name = <field_filter>
     #      ORDER BY subfield.name;
     # SQL: SELECT problem.*, subfield.name AS subfield_name, field.name AS field_name
     #      FROM problem
     #      JOIN subfield ON problem.subfield_id = subfield.id
-    #      JOIN field ON subfield.field_id = field.name
-    #      WHERE subfield.id = <subfield_id> (or field.name = <field_name>)
-    #      ORDER BY CASE 
-    #          WHEN problem.severity = 'high' THEN 0
-    #          WHEN problem.severity = 'medium' THEN 1
-    #          WHEN problem.severity = 'low' THEN 2
-    #      END;
+    #      JOIN field ON subfield.field_id = field.id
+    #      WHERE problem.subfield_id = <subfield_id> (or problem.subfield_id IN (<field's subfields>))
+    #      AND (problem.severity_rank, problem.id) > (<after_rank>, <after_id>)
+    #      ORDER BY problem.severity_rank, problem.id
+    #      LIMIT <PROBLEMS_PER_PAGE + 1>;
+    #      -- index range scan on problem_subfield_rank_idx (subfield_id, severity_rank)
     
     if not request.session.get('user_id'):
         return redirect('login')
@@ -284,11 +540,12 @@ def search_problems_view(request):
     subfields = []
     field_filter = request.GET.get('field')
     if field_filter:
-        subfields = Subfield.objects.filter(field__name=field_filter)
+        subfields = list(Subfield.objects.filter(field__name=field_filter))
     
-    # Start with empty queryset
-    problems = Problem.objects.none()
+    # Start with empty list
+    problems = []
     searched = False
+    next_after = None
     
     # Apply filters if provided
     subfield_filter = request.GET.get('subfield')
@@ -300,33 +557,56 @@ def search_problems_view(request):
             # Filter by specific subfield
             problems = Problem.objects.filter(subfield_id=subfield_filter)
         else:
-            # Filter by field (all subfields in that field)
-            problems = Problem.objects.filter(subfield__field__name=field_filter)
+            # Filter by field: the subfield ids are already loaded for the
+            # dropdown, so use them directly instead of joining field
+            problems = Problem.objects.filter(subfield_id__in=[subfield.id for subfield in subfields])
         
-        # Order by severity: high -> medium -> low
-        problems = problems.select_related('subfield', 'subfield__field').order_by(
-            models.Case(
-                models.When(severity='high', then=0),
-                models.When(severity='medium', then=1),
-                models.When(severity='low', then=2),
+        # Keyset pagination: ?after=<severity_rank>-<id> of the last problem shown
+        after = parse_problem_cursor(request.GET.get('after'))
+        if after:
+            after_rank, after_id = after
+            problems = problems.filter(
+                models.Q(severity_rank__gt=after_rank) |
+                models.Q(severity_rank=after_rank, id__gt=after_id)
             )
+        
+        # Order by severity: high -> medium -> low
+        problems = list(
+            problems.select_related('subfield', 'subfield__field')
+            .order_by('severity_rank', 'id')
+            .cache()[:PROBLEMS_PER_PAGE + 1]
         )
+        if len(problems) > PROBLEMS_PER_PAGE:
+            problems = problems[:PROBLEMS_PER_PAGE]
+            next_after = f"{problems[-1].severity_rank}-{problems[-1].id}"
     
     context = {
         'fields': fields,
         'subfields': subfields,
         'problems': problems,
         'searched': searched,
+        'next_after': next_after,
     }
     return render(request, 'core/search_problems.html', context)
 
 
+def parse_problem_cursor(value):
+    """Parse '<severity_rank>-<id>' into a tuple, or None if missing/invalid"""
+    try:
+        rank, problem_id = value.split('-')
+        return int(rank), int(problem_id)
+    except (AttributeError, ValueError):
+        return None
+
+
+@replica_reads
+@versioned_page(problem_keys)
 def problem_detail_view(request, problem_id):
     """Display problem details with researchers working on it"""
     # SQL: SELECT problem.*, subfield.name AS subfield_name, field.name AS field_name
     #      FROM problem
     #      JOIN subfield ON problem.subfield_id = subfield.id
-    #      JOIN field ON subfield.field_id = field.name
+    #      JOIN field ON subfield.field_id = field.id
     #      WHERE problem.id = <problem_id>;
     # SQL: SELECT project.*, user.name AS owner_name, user.institution
     #      FROM project
@@ -342,16 +622,16 @@ def problem_detail_view(request, problem_id):
     if not request.session.get('user_id'):
         return redirect('login')
     
-    problem = get_object_or_404(Problem, id=problem_id)
+    problem = get_object_or_404(Problem.objects.select_related('subfield__field'), id=problem_id)
     
     # Find researchers working on this problem
     # (researchers who have projects in the same subfield)
     related_projects = Project.objects.filter(
-        subfield=problem.subfield
+        subfield_id=problem.subfield_id
     ).select_related('owner')
     
     working_researchers = User.objects.filter(
-        owned_projects__subfield=problem.subfield
+        owned_projects__subfield_id=problem.subfield_id
     ).distinct()
     
     context = {
@@ -368,10 +648,10 @@ def problem_detail_view(request, problem_id):
 
 def create_project_view(request):
     """Create a new project"""
-    # SQL: SELECT name FROM field ORDER BY name;
+    # SQL: SELECT id, name FROM field ORDER BY name;
     # SQL: SELECT subfield.id, subfield.name, field.name AS field_name
     #      FROM subfield
-    #      JOIN field ON subfield.field_id = field.name
+    #      JOIN field ON subfield.field_id = field.id
     #      ORDER BY field.name, subfield.name;
     # SQL: SELECT * FROM user WHERE user_type = 'researcher' AND id != <current_user_id>;
     # SQL: SELECT * FROM user WHERE id = <current_user_id>;
@@ -380,7 +660,7 @@ def create_project_view(request):
     # SQL: INSERT INTO project (title, description, owner_id, field_id, subfield_id, vacancy_status, created_at)
     #      VALUES (<title>, <description>, <owner_id>, <field_id>, <subfield_id>, <vacancy_status>, NOW());
     # SQL: INSERT INTO core_project_collaborators (project_id, user_id)
-    #      VALUES (<project_id>, <collaborator_id>); -- for each selected collaborator
+    #      SELECT <project_id>, id FROM user WHERE id IN (<collaborator_ids>);
     
     if not request.session.get('user_id'):
         return redirect('login')
@@ -391,7 +671,10 @@ def create_project_view(request):
         field_name = request.POST.get('field')
         subfield_id = request.POST.get('subfield')
         vacancy_status = request.POST.get('vacancy_status') == 'true'
-        collaborator_ids = request.POST.getlist('collaborators')
+        try:
+            collaborator_ids = [int(collab_id) for collab_id in request.POST.getlist('collaborators') if collab_id]
+        except ValueError:
+            return project_form(request, error='Choose collaborators from the list.', status=400)
         
         user_id = request.session.get('user_id')
         user = get_object_or_404(User, id=user_id)
@@ -407,17 +690,19 @@ def create_project_view(request):
             vacancy_status=vacancy_status
         )
         
-        # Add selected collaborators to the project
+        # Add selected collaborators to the project (one INSERT, unknown ids skipped)
         if collaborator_ids:
-            for collab_id in collaborator_ids:
-                if collab_id:
-                    collaborator = User.objects.get(id=collab_id)
-                    project.collaborators.add(collaborator)
+            project.collaborators.add(*User.objects.filter(id__in=collaborator_ids).values_list('id', flat=True))
         
         # Redirect to the user's profile to see the new project
         return redirect('profile', user_id=user.id)
     
     # GET request - show form
+    return project_form(request)
+
+
+def project_form(request, error=None, status=200):
+    """The create-project form, with what was posted and an error if it was rejected"""
     fields = Field.objects.all()
     subfields = Subfield.objects.all().select_related('field')
     all_users = User.objects.filter(user_type='researcher').exclude(id=request.session.get('user_id'))
@@ -426,14 +711,17 @@ def create_project_view(request):
         'fields': fields,
         'subfields': subfields,
         'all_users': all_users,
+        'error': error,
+        'posted': request.POST,
     }
-    return render(request, 'core/create_project.html', context)
+    return render(request, 'core/create_project.html', context, status=status)
 
 
 # ==============================================================================
 # FEATURE 6: NOTIFICATIONS & COLLABORATION REQUESTS
 # ==============================================================================
 
+@replica_reads
 def notifications_view(request):
     """Display all collaboration requests"""
     # SQL: SELECT cr.*, sender.name AS sender_name, sender.institution, 
@@ -443,9 +731,11 @@ def notifications_view(request):
     #      LEFT JOIN project ON cr.project_id = project.id
     #      LEFT JOIN post ON cr.post_id = post.id
     #      WHERE cr.receiver_id = <current_user_id> AND cr.status = 'pending'
-    #      ORDER BY cr.created_at DESC;
-    # SQL: (Same query with status = 'accepted')
-    # SQL: (Same query with status = 'rejected')
+    #      ORDER BY cr.created_at DESC, cr.id DESC
+    #      LIMIT <STREAM_CHUNK_SIZE>;   -- repeated per chunk while the page streams
+    # SQL: (Same query with status = 'accepted', on collaboration_request
+    #       and on collaboration_request_archive)
+    # SQL: (Same query with status = 'rejected', on both tables)
     
     if not request.session.get('user_id'):
         return redirect('login')
@@ -456,24 +746,17 @@ def notifications_view(request):
     pending_requests = CollaborationRequest.objects.filter(
         receiver_id=user_id,
         status='pending'
-    ).select_related('sender', 'project', 'post').order_by('-created_at')
+    ).select_related('sender', 'project', 'post')
     
-    accepted_requests = CollaborationRequest.objects.filter(
-        receiver_id=user_id,
-        status='accepted'
-    ).select_related('sender', 'project', 'post').order_by('-created_at')
-    
-    rejected_requests = CollaborationRequest.objects.filter(
-        receiver_id=user_id,
-        status='rejected'
-    ).select_related('sender', 'project', 'post').order_by('-created_at')
-    
-    context = {
-        'pending_requests': pending_requests,
-        'accepted_requests': accepted_requests,
-        'rejected_requests': rejected_requests,
-    }
-    return render(request, 'core/notifications.html', context)
+    # History comes from the hot table and the archive (see core/archive.py);
+    # each list is read lazily, in chunks, as its section is sent
+    return render_streamed(request, 'core/notifications.html', {}, {
+        'pending': Slot(
+            keyset_rows(pending_requests, ['-created_at', '-id']), 'core/_pending_request.html', 'request',
+        ),
+        'accepted': Slot(archive.iter_history(user_id, 'accepted'), 'core/_accepted_request.html', 'request'),
+        'rejected': Slot(archive.iter_history(user_id, 'rejected'), 'core/_rejected_request.html', 'request'),
+    })
 
 
 def accept_collaboration_view(request, request_id):
@@ -486,7 +769,7 @@ def accept_collaboration_view(request, request_id):
     if not request.session.get('user_id'):
         return redirect('login')
     
-    collab_request = get_object_or_404(CollaborationRequest, id=request_id)
+    collab_request = get_object_or_404(CollaborationRequest.objects.select_related('project'), id=request_id)
     
     # Update status
     collab_request.status = 'accepted'
@@ -494,7 +777,7 @@ def accept_collaboration_view(request, request_id):
     
     # If it's a project collaboration, add sender as collaborator
     if collab_request.project:
-        collab_request.project.collaborators.add(collab_request.sender)
+        collab_request.project.collaborators.add(collab_request.sender_id)
     
     return redirect('notifications')
 
@@ -513,4 +796,125 @@ def reject_collaboration_view(request, request_id):
     collab_request.status = 'rejected'
     collab_request.save()
     
-    return redirect('notifications')
\ No newline at end of file
+    return redirect('notifications')
+
+
+# ==============================================================================
+# FEATURE 7: ANALYTICS
+# ==============================================================================
+
+INSTITUTIONS_ON_DASHBOARD = 50
+
+
+@replica_reads
+def analytics_view(request):
+    """Dashboard of platform-wide counts, read only from the rollup tables"""
+    # SQL: SELECT r.*, subfield.name, field.name FROM subfield_rollup r
+    #      JOIN subfield ON r.subfield_id = subfield.id
+    #      JOIN field ON r.field_id = field.id
+    #      ORDER BY field.name, subfield.name;
+    # SQL: SELECT * FROM institution_rollup
+    #      ORDER BY accepted_requests + rejected_requests DESC LIMIT 50;
+    # (core/rollups.py keeps both tables up to date)
+    
+    if not request.session.get('user_id'):
+        return redirect('login')
+    
+    subfield_rollups = list(
+        SubfieldRollup.objects.select_related('subfield', 'field').order_by('field__name', 'subfield__name')
+    )
+    
+    # Per-field totals: a handful of subfields per field, summed in Python
+    fields = {}
+    for rollup in subfield_rollups:
+        totals = fields.setdefault(rollup.field.name, {
+            'name': rollup.field.name, 'open_projects': 0, 'high_problems': 0,
+            'medium_problems': 0, 'low_problems': 0,
+        })
+        for key in ('open_projects', 'high_problems', 'medium_problems', 'low_problems'):
+            totals[key] += getattr(rollup, key)
+    
+    institution_rollups = InstitutionRollup.objects.annotate(
+        resolved=models.F('accepted_requests') + models.F('rejected_requests')
+    ).order_by('-resolved', 'institution')[:INSTITUTIONS_ON_DASHBOARD]
+    
+    context = {
+        'subfield_rollups': subfield_rollups,
+        'field_totals': list(fields.values()),
+        'institution_rollups': institution_rollups,
+    }
+    return render(request, 'core/analytics.html', context)
+
+
+# ==============================================================================
+# FEATURE 8: OPERATIONS (staff only)
+# ==============================================================================
+
+@staff_member_required
+def db_metrics_view(request):
+    """Per-database query counts/time and replica health for this process"""
+    # No SQL of its own - reads in-memory counters kept by ReplicaRoutingMiddleware
+    replicas = {
+        alias: routers.is_healthy(alias)
+        for alias in getattr(settings, 'REPLICA_DATABASES', [])
+    }
+    return JsonResponse({'databases': routers.metrics(), 'replicas_healthy': replicas})
+
+
+@staff_member_required
+@replica_reads
+def export_view(request, dataset):
+    """Stream a full dataset as CSV or JSON Lines (?format=, ?gzip=1, filters)"""
+    # SQL: see core/exports.py - keyset-chunked SELECTs over the whole table
+    fmt = request.GET.get('format', 'csv')
+    gzip = request.GET.get('gzip') == '1'
+    filters = {key: request.GET.get(key) for key in ('field', 'subfield', 'since', 'until')}
+    try:
+        # The querysets name their database: the replica picked for this
+        # request, or default (the export command has no request)
+        stream = exports.export_stream(
+            dataset, fmt, filters, gzip=gzip,
+            using=getattr(request, 'read_alias', None) or 'default',
+        )
+    except exports.ExportError as error:
+        return JsonResponse({'error': str(error)}, status=400)
+
+    response = StreamingHttpResponse(
+        stream,
+        content_type='application/gzip' if gzip else exports.FORMATS[fmt],
+    )
+    response['Content-Disposition'] = f'attachment; filename="{exports.filename(dataset, fmt, gzip)}"'
+    return response
+
+
+@staff_member_required
+def rate_limit_metrics_view(request):
+    """Allowed/throttled requests per rate-limited endpoint, for this process"""
+    # No SQL - in-memory counters kept by core/ratelimit.py
+    return JsonResponse({
+        'backend': getattr(settings, 'RATE_LIMIT_BACKEND', 'memory'),
+        'limits': getattr(settings, 'RATE_LIMITS', {}),
+        'endpoints': ratelimit.metrics(),
+    })
+
+
+@staff_member_required
+def query_cache_stats_view(request):
+    """Query-cache hits, misses and invalidations per model/table, for this process"""
+    # No SQL - in-memory counters kept by core/querycache.py
+    return JsonResponse({
+        'enabled': querycache.enabled(),
+        'timeout': getattr(settings, 'QUERY_CACHE_TIMEOUT', 300),
+        'stats': querycache.stats(),
+    })
+
+
+@staff_member_required
+def counter_stats_view(request):
+    """Engagement counter increments buffered and flushed, for this process"""
+    # No SQL - in-memory counters kept by core/counters.py
+    return JsonResponse({
+        'flush_seconds': counters.flush_seconds(),
+        'max_pending': counters.max_pending(),
+        'stats': counters.stats(),
+    })
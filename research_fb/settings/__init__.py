@@ -0,0 +1,27 @@
+"""
+Settings profiles for research_fb, selected by the DJANGO_ENV environment
+variable:
+
+    DJANGO_ENV=dev    (default) DEBUG on, local MySQL         -> dev.py
+    DJANGO_ENV=prod   persistent connections, caches, gzip,
+                      hashed static files; config from env    -> prod.py
+    DJANGO_ENV=bench  SQLite, production-like otherwise,
+                      for load tests on any machine           -> bench.py
+
+A profile can also be chosen directly, e.g.
+DJANGO_SETTINGS_MODULE=research_fb.settings.prod.
+"""
+import os
+
+from django.core.exceptions import ImproperlyConfigured
+
+DJANGO_ENV = os.environ.get('DJANGO_ENV', 'dev')
+
+if DJANGO_ENV == 'dev':
+    from .dev import *  # noqa: F401,F403
+elif DJANGO_ENV == 'prod':
+    from .prod import *  # noqa: F401,F403
+elif DJANGO_ENV == 'bench':
+    from .bench import *  # noqa: F401,F403
+else:
+    raise ImproperlyConfigured(f'Unknown DJANGO_ENV {DJANGO_ENV!r} (expected dev, prod or bench)')
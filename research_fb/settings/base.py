@@ -0,0 +1,246 @@
+"""
+Django settings for research_fb project - shared by every profile.
+
+Generated by 'django-admin startproject' using Django 6.0. The profiles in
+this package (dev, prod, bench) import everything from here and override
+what differs; research_fb/settings/__init__.py picks one from DJANGO_ENV.
+
+For more information on this file, see
+https://docs.djangoproject.com/en/6.0/topics/settings/
+
+For the full list of settings and their values, see
+https://docs.djangoproject.com/en/6.0/ref/settings/
+"""
+
+import copy
+from pathlib import Path
+
+# Build paths inside the project like this: BASE_DIR / 'subdir'.
+BASE_DIR = Path(__file__).resolve().parent.parent.parent
+
+
+# Quick-start development settings - unsuitable for production
+# See https://docs.djangoproject.com/en/6.0/howto/deployment/checklist/
+
+# SECURITY WARNING: keep the secret key used in production secret!
+SECRET_KEY = 'django-insecure-av4$12^va#x*#!hpgnr!70af!++()w@3$wet9e-6-b)gp+*rcz'
+
+# SECURITY WARNING: don't run with debug turned on in production!
+DEBUG = False
+
+ALLOWED_HOSTS = []
+
+
+# Application definition
+
+INSTALLED_APPS = [
+    'core',
+    'django.contrib.admin',
+    'django.contrib.auth',
+    'django.contrib.contenttypes',
+    'django.contrib.sessions',
+    'django.contrib.messages',
+    'django.contrib.staticfiles',
+]
+
+MIDDLEWARE = [
+    'django.middleware.security.SecurityMiddleware',
+    'core.assets.StaticAssetMiddleware',
+    'core.routers.ReplicaRoutingMiddleware',
+    'django.contrib.sessions.middleware.SessionMiddleware',
+    'django.middleware.common.CommonMiddleware',
+    'django.middleware.csrf.CsrfViewMiddleware',
+    'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'core.profiling.ProfilingMiddleware',
+    'django.contrib.messages.middleware.MessageMiddleware',
+    'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'core.strict.StrictLoadingMiddleware',
+]
+
+ROOT_URLCONF = 'research_fb.urls'
+
+TEMPLATES = [
+    {
+        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        'DIRS': [],
+        'APP_DIRS': True,
+        'OPTIONS': {
+            'context_processors': [
+                'django.template.context_processors.request',
+                'django.contrib.auth.context_processors.auth',
+                'django.contrib.messages.context_processors.messages',
+            ],
+        },
+    },
+]
+
+
+def with_cached_loaders(templates):
+    """Copy of TEMPLATES whose Django engine keeps compiled templates (cached loader)"""
+    templates = copy.deepcopy(templates)
+    templates[0]['APP_DIRS'] = False
+    templates[0]['OPTIONS']['loaders'] = [
+        ('django.template.loaders.cached.Loader', [
+            'django.template.loaders.filesystem.Loader',
+            'django.template.loaders.app_directories.Loader',
+        ]),
+    ]
+    return templates
+
+
+WSGI_APPLICATION = 'research_fb.wsgi.application'
+
+
+# Database
+# https://docs.djangoproject.com/en/6.0/ref/settings/#databases
+# DATABASES is set by each profile (dev.py, prod.py, bench.py)
+
+# Read replicas
+# Add each replica to DATABASES (e.g. 'replica': {... 'HOST': 'replica-1' ...})
+# and list its alias here. Read-only views then read from a replica, except
+# for a few seconds after a browser writes (see core/routers.py).
+# To try it locally, point 'default' and 'replica' at two SQLite files.
+
+DATABASE_ROUTERS = ['core.routers.PrimaryReplicaRouter']
+
+REPLICA_DATABASES = []
+
+REPLICA_STICKY_SECONDS = 5
+
+REPLICA_MAX_LAG_SECONDS = 2
+
+# Password validation
+# https://docs.djangoproject.com/en/6.0/ref/settings/#auth-password-validators
+
+AUTH_PASSWORD_VALIDATORS = [
+    {
+        'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator',
+    },
+    {
+        'NAME': 'django.contrib.auth.password_validation.MinimumLengthValidator',
+    },
+    {
+        'NAME': 'django.contrib.auth.password_validation.CommonPasswordValidator',
+    },
+    {
+        'NAME': 'django.contrib.auth.password_validation.NumericPasswordValidator',
+    },
+]
+
+
+# Internationalization
+# https://docs.djangoproject.com/en/6.0/topics/i18n/
+
+LANGUAGE_CODE = 'en-us'
+
+TIME_ZONE = 'UTC'
+
+USE_I18N = True
+
+USE_TZ = True
+
+
+# Static files (CSS, JavaScript, Images)
+# https://docs.djangoproject.com/en/6.0/howto/static-files/
+
+STATIC_URL = 'static/'
+
+# `manage.py collectstatic` target; served by core.assets.StaticAssetMiddleware
+# when DEBUG is off
+STATIC_ROOT = BASE_DIR / 'staticfiles'
+
+
+# Default primary key field type
+# https://docs.djangoproject.com/en/6.0/ref/settings/#default-auto-field
+
+DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
+
+
+# Background tasks (core/tasks.py), run by `manage.py run_worker`. Eager mode
+# (dev and bench profiles) runs them in-process right after the request's
+# transaction commits instead.
+
+TASK_QUEUE_EAGER = False
+
+TASK_QUEUE_MAX_ATTEMPTS = 5
+
+
+# Resolved collaboration requests older than this move to the archive table
+# (`manage.py archive_requests`, see core/archive.py)
+
+COLLABORATION_ARCHIVE_AFTER_DAYS = 90
+
+
+# Rows per keyset chunk when streaming exports (core/exports.py)
+
+EXPORT_CHUNK_SIZE = 2000
+
+
+# Posts at least this similar (Jaccard of word 3-grams) to an earlier post
+# are flagged as near-duplicates and collapsed in the feed (core/dedup.py)
+
+DEDUP_THRESHOLD = 0.8
+
+
+# Write rate limits per user (core/ratelimit.py): bursts of up to `burst`
+# requests, refilled at `per_minute`. 'memory' keeps buckets per process;
+# 'cache' shares them through CACHES['default'] across workers.
+
+RATE_LIMITS = {
+    'create_post': {'burst': 5, 'per_minute': 10},
+    'collaborate_post': {'burst': 10, 'per_minute': 20},
+    'collaborate_project': {'burst': 10, 'per_minute': 20},
+}
+
+RATE_LIMIT_BACKEND = 'memory'
+
+
+# Lazy relation loads (N+1 queries) in core views and templates
+# (core/strict.py): None = off, 'log' = warning with stack trace, 'raise' = error
+
+STRICT_LOADING = None
+
+
+# Query-result cache (core/querycache.py): rows of repeated ORM queries kept
+# in CACHES[QUERY_CACHE_ALIAS], invalidated by any write to the tables read.
+# Stays off while that cache is per-process (LocMemCache, as in dev/bench)
+
+QUERY_CACHE_ENABLED = True
+QUERY_CACHE_TIMEOUT = 300
+QUERY_CACHE_ALIAS = 'default'
+
+
+# Streamed list pages (core/streaming.py): rows read per keyset query, and
+# rows rendered between two flushes to the client
+
+STREAM_CHUNK_SIZE = 200
+STREAM_FLUSH_ROWS = 20
+
+
+# Engagement counters (core/counters.py): view/interest increments kept in
+# process memory and queued for one batched UPDATE per table once this many
+# seconds have passed or this many rows are waiting (bounds what a crash loses)
+
+COUNTER_FLUSH_SECONDS = 10
+COUNTER_MAX_PENDING = 1000
+
+
+# Faceted researcher directory (core/facets.py): seconds before a process
+# rebuilds its in-memory facet bitmaps (new users are added on every read).
+# prod and bench build them at startup (FACET_INDEX_WARMUP)
+
+FACET_INDEX_MAX_AGE = 300
+
+
+# Batched deletion (core/deletion.py): rows per SELECT / DELETE batch when
+# users, projects or posts are purged with everything that cascades from them
+
+PURGE_BATCH_SIZE = 500
+
+
+# Request profiler (core/profiling.py): captures kept (newest first), seconds
+# between two stack samples, and queries listed in a capture's SQL timeline
+
+PROFILER_KEEP = 20
+PROFILER_SAMPLE_INTERVAL = 0.005
+PROFILER_MAX_QUERIES = 1000
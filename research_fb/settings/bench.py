@@ -0,0 +1,38 @@
+"""
+Benchmark settings: production-like (DEBUG off, cached templates) but on
+SQLite, so load tests and benchmarks run on any machine without MySQL.
+
+    DJANGO_ENV=bench python manage.py migrate
+    DJANGO_ENV=bench python manage.py generate_data
+"""
+import os
+
+from .base import *  # noqa: F401,F403
+from .base import BASE_DIR, TEMPLATES, with_cached_loaders
+
+# DEBUG off so Django doesn't keep every query in memory and skew timings
+DEBUG = False
+
+ALLOWED_HOSTS = ['*']
+
+DATABASES = {
+    'default': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': os.environ.get('BENCH_DATABASE', BASE_DIR / 'bench.sqlite3'),
+    }
+}
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    }
+}
+
+TEMPLATES = with_cached_loaders(TEMPLATES)
+
+TEMPLATE_WARMUP = True
+
+FACET_INDEX_WARMUP = True
+
+# No worker in a benchmark run: tasks run in-process after commit
+TASK_QUEUE_EAGER = True
@@ -0,0 +1,35 @@
+"""
+Development settings: DEBUG on, local MySQL, tasks run in-process.
+"""
+from .base import *  # noqa: F401,F403
+
+# SECURITY WARNING: don't run with debug turned on in production!
+# (DEBUG also keeps every executed query in memory, see connection.queries)
+DEBUG = True
+
+ALLOWED_HOSTS = []
+
+# Log every lazy relation load in core views with its stack trace
+STRICT_LOADING = 'log'
+
+# Run background tasks in-process after commit: no worker needed locally
+TASK_QUEUE_EAGER = True
+
+
+# Database
+# Update the password to match your local MySQL installation
+
+DATABASES = {
+       'default': {
+           'ENGINE': 'django.db.backends.mysql',
+           'NAME': 'research_db',
+           'USER': 'root',
+           'PASSWORD': 'Your_password', 
+           'HOST': 'localhost',
+           'PORT': '3306',
+           'OPTIONS': {
+               'init_command': "SET sql_mode='STRICT_TRANS_TABLES'",
+               'charset': 'utf8mb4',
+           },
+       }
+   }
@@ -0,0 +1,100 @@
+"""
+Production settings. Everything from base.py, plus the overrides below.
+
+Configuration comes from the environment:
+    DJANGO_SECRET_KEY       (required)
+    DJANGO_ALLOWED_HOSTS    comma-separated host names
+    DB_NAME, DB_USER, DB_PASSWORD, DB_HOST, DB_PORT
+    REDIS_URL               (required) cache shared by every worker
+"""
+import os
+
+from .base import *  # noqa: F401,F403
+from .base import MIDDLEWARE, TEMPLATES, with_cached_loaders
+
+DEBUG = False
+
+SECRET_KEY = os.environ['DJANGO_SECRET_KEY']
+
+ALLOWED_HOSTS = [host for host in os.environ.get('DJANGO_ALLOWED_HOSTS', '').split(',') if host]
+
+
+# Database
+# Persistent connections: reuse each worker's connection for up to
+# CONN_MAX_AGE seconds instead of reconnecting on every request
+
+DATABASES = {
+    'default': {
+        'ENGINE': 'django.db.backends.mysql',
+        'NAME': os.environ.get('DB_NAME', 'research_db'),
+        'USER': os.environ.get('DB_USER', 'root'),
+        'PASSWORD': os.environ.get('DB_PASSWORD', ''),
+        'HOST': os.environ.get('DB_HOST', 'localhost'),
+        'PORT': os.environ.get('DB_PORT', '3306'),
+        'CONN_MAX_AGE': 60,
+        'CONN_HEALTH_CHECKS': True,
+        'OPTIONS': {
+            'init_command': "SET sql_mode='STRICT_TRANS_TABLES'",
+            'charset': 'utf8mb4',
+        },
+    }
+}
+
+
+# Cache
+# Required: sessions, rate-limit buckets and query-cache generations must be
+# the same for every worker. A per-process cache would keep serving a
+# session another worker logged out, and split each rate limit by the
+# number of workers
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': os.environ['REDIS_URL'],
+    }
+}
+
+# Several workers per host: share rate-limit buckets through the cache
+RATE_LIMIT_BACKEND = 'cache'
+
+# Sessions are read on every request: serve them from the cache, keep the
+# database as the durable copy
+SESSION_ENGINE = 'django.contrib.sessions.backends.cached_db'
+
+
+# Compression
+# GZipMiddleware must come before anything that reads or changes the body
+
+MIDDLEWARE = ['django.middleware.gzip.GZipMiddleware', *MIDDLEWARE]
+
+
+# Templates
+# Compile each template once per process and keep it (cached loader), and
+# compile all core templates when a web process starts (see
+# core/template_cache.py; management commands skip it)
+
+TEMPLATES = with_cached_loaders(TEMPLATES)
+
+TEMPLATE_WARMUP = True
+
+FACET_INDEX_WARMUP = True
+
+
+# Static files
+# `manage.py collectstatic` writes content-hashed copies (app.3f2a1b.css)
+# plus .gz/.br variants; they are served with immutable cache headers
+# (see core/assets.py)
+
+STORAGES = {
+    'default': {
+        'BACKEND': 'django.core.files.storage.FileSystemStorage',
+    },
+    'staticfiles': {
+        'BACKEND': 'core.assets.CompressedManifestStaticFilesStorage',
+    },
+}
+
+
+# Background tasks run in `manage.py run_worker`, not in the web process
+
+TASK_QUEUE_EAGER = False
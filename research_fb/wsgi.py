@@ -14,3 +14,13 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'research_fb.settings')
 
 application = get_wsgi_application()
+
+# Web processes only: flush buffered view counts in the background and at
+# exit (core/counters.py), and compile the templates and build the facet
+# index before the first request when TEMPLATE_WARMUP / FACET_INDEX_WARMUP
+# are on (core/template_cache.py, core/facets.py)
+from core import counters, facets, template_cache  # noqa: E402
+
+counters.flush_in_background()
+template_cache.warm_up()
+facets.warm_up()